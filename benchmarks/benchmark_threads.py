@@ -0,0 +1,33 @@
+import os
+import sys
+from os import path
+from subprocess import run
+
+import matplotlib.pyplot as plt
+from cpuinfo import get_cpu_info
+
+N_ITERATIONS = 64
+
+
+def measure_threads(image, n_threads, n_iterations) -> float:
+    measure_file = path.join(path.dirname(path.abspath(__file__)), "measure_threads.py")
+    cmd = f"{sys.executable} {measure_file} {n_threads} {n_iterations} {image}".split()
+    result = run(cmd, check=True, capture_output=True)
+    return float(result.stdout.decode(encoding="utf-8").strip())
+
+
+if __name__ == "__main__":
+    # run with the free-threaded and with the usual Python builds to compare them
+    gil = "GIL" if getattr(sys, "_is_gil_enabled", lambda: True)() else "no-GIL"
+    tests_images_path = path.join(path.dirname(path.dirname(path.abspath(__file__))), "tests/images/heif_other")
+    threads = [1, 2, 4, 8, 16, 32]
+    threads = [i for i in threads if i <= 2 * (os.cpu_count() or 1)]
+    fig, ax = plt.subplots()
+    for image in ("cat.hif", "pug.heic"):
+        results = [measure_threads(path.join(tests_images_path, image), i, N_ITERATIONS) for i in threads]
+        print(image, dict(zip(threads, results)))
+        ax.plot(threads, results, label=image)
+    plt.ylabel("open and save operations per second")
+    plt.xlabel(f"threads, Python {sys.version_info[0]}.{sys.version_info[1]} {gil} - {get_cpu_info()['brand_raw']}")
+    ax.legend()
+    plt.savefig(f"results_threads_{gil.lower()}.png", dpi=200)
@@ -0,0 +1,25 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from time import perf_counter
+
+import pillow_heif
+
+
+def open_save(data: bytes) -> None:
+    heif_file = pillow_heif.open_heif(data)
+    _ = heif_file.info["exif"], heif_file.info.get("icc_profile")
+    heif_file.save(BytesIO(), quality=50)
+
+
+if __name__ == "__main__":  # argv: number of threads, number of iterations, image path
+    n_threads, n_iterations = int(sys.argv[1]), int(sys.argv[2])
+    image_data = Path(sys.argv[3]).read_bytes()
+    start_time = perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        for _ in executor.map(open_save, [image_data] * n_iterations):
+            pass
+    total_time = perf_counter() - start_time
+    print(n_iterations / total_time)
+    sys.exit(0)
@@ -15,15 +15,25 @@ from .constants import (
     HeifMatrixCoefficients,
     HeifTransferCharacteristics,
 )
+from .executor import HeifExecutor, aopen_heif, decode_many
 from .heif import (
-    HeifDepthImage,
     HeifFile,
-    HeifImage,
+    HeifProbe,
+    HeifProbeImage,
     encode,
+    encode_tiles,
     from_bytes,
     from_pillow,
     is_supported,
     open_heif,
+    probe,
     read_heif,
 )
-from .misc import get_file_mimetype, load_libheif_plugin, set_orientation
+from .image import HeifDepthImage, HeifImage, HeifThumbnailImage
+from .misc import (
+    RangeReader,
+    get_file_mimetype,
+    load_libheif_plugin,
+    set_orientation,
+    threads_usage,
+)
@@ -0,0 +1,239 @@
+"""Scheduling of decoding and encoding tasks with priorities and the bookkeeping of decoded images."""
+
+import asyncio
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+from heapq import heappop, heappush
+from itertools import count
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from .misc import _THREADS_BUDGET
+
+
+class _PriorityExecutor:
+    """Pool of threads that executes tasks in the order of their priority, see :py:class:`~pillow_heif.HeifExecutor`.
+
+    :param workers: number of tasks running at the same time. Default = number of CPU cores.
+    """
+
+    PRIORITIES = ("high", "normal", "low")
+    """Priority classes, from the highest to the lowest."""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        if self.workers <= 0:
+            raise ValueError("`workers` must be a positive integer.")
+        self._condition = threading.Condition()
+        self._queue: List[tuple] = []
+        self._sequence = count()
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self._stats = {
+            i: {"queued": 0, "running": 0, "completed": 0, "cancelled": 0, "total_wait_time": 0.0, "max_wait_time": 0.0}
+            for i in self.PRIORITIES
+        }
+
+    def submit(self, fn, *args, priority: str = "normal", **kwargs) -> Future:
+        """Schedules ``fn(*args, **kwargs)`` to be executed with the given priority.
+
+        :returns: :py:class:`concurrent.futures.Future` with the result of the call.
+        """
+        if priority not in self._stats:
+            raise ValueError(f"priority must be one of {self.PRIORITIES}.")
+        future: Future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            heappush(
+                self._queue,
+                (self.PRIORITIES.index(priority), next(self._sequence), perf_counter(), future, fn, args, kwargs),
+            )
+            self._stats[priority]["queued"] += 1
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._condition.notify_all()
+        return future
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns the statistics of the tasks per priority class.
+
+        :returns: dictionary with a dictionary for each priority class: ``queued`` and ``running`` - number of
+            the waiting and running tasks, ``completed`` - number of finished tasks, ``cancelled`` - number of
+            tasks cancelled before they started, ``mean_wait_time`` and ``max_wait_time`` - time in seconds that
+            started tasks waited in the queue.
+        """
+        with self._condition:
+            return {
+                priority: {
+                    "queued": i["queued"],
+                    "running": i["running"],
+                    "completed": i["completed"],
+                    "cancelled": i["cancelled"],
+                    "mean_wait_time": i["total_wait_time"] / max(1, i["running"] + i["completed"]),
+                    "max_wait_time": i["max_wait_time"],
+                }
+                for priority, i in self._stats.items()
+            }
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:  # pylint: disable=redefined-outer-name
+        """Stops accepting new tasks, the already queued tasks are executed, unless ``cancel_futures`` is set."""
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                for task in self._queue:
+                    stats = self._stats[self.PRIORITIES[task[0]]]
+                    stats["queued"] -= 1
+                    stats["cancelled"] += 1
+                    task[3].cancel()
+                self._queue = []
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                task = self._pop_task()
+                while task is None:
+                    if self._shutdown and not self._queue:
+                        return
+                    self._condition.wait()
+                    task = self._pop_task()
+            priority = self.PRIORITIES[task[0]]
+            future, fn, args, kwargs = task[3:]
+            threads_limit = 0
+            if priority == "normal":
+                threads_limit = max(1, _THREADS_BUDGET.budget() // self.workers)
+            elif priority == "low":
+                threads_limit = 1
+            try:
+                with _THREADS_BUDGET.limit(threads_limit):
+                    result = fn(*args, **kwargs)
+            except BaseException as exc:  # pylint: disable=broad-exception-caught
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            with self._condition:
+                self._stats[priority]["running"] -= 1
+                self._stats[priority]["completed"] += 1
+                self._condition.notify_all()
+
+    def _pop_task(self) -> Optional[tuple]:
+        """Takes the task with the highest priority from the queue, must be called with the lock held.
+
+        The task is marked as running, tasks that were cancelled while waiting in the queue are dropped.
+        """
+        while self._queue:
+            low_priority = self._queue[0][0] == self.PRIORITIES.index("low")
+            if low_priority and self.workers > 1 and self._stats["low"]["running"] >= self.workers - 1:
+                return None
+            task = heappop(self._queue)
+            stats = self._stats[self.PRIORITIES[task[0]]]
+            stats["queued"] -= 1
+            if task[3].set_running_or_notify_cancel():
+                break
+            stats["cancelled"] += 1
+        else:
+            return None
+        wait_time = perf_counter() - task[2]
+        stats["running"] += 1
+        stats["total_wait_time"] += wait_time
+        stats["max_wait_time"] = max(stats["max_wait_time"], wait_time)
+        return task
+
+
+_ASYNC_EXECUTOR: Optional[_PriorityExecutor] = None
+_ASYNC_EXECUTOR_LOCK = threading.Lock()
+# event loop -> executor -> priority -> semaphore that bounds the tasks submitted by the loop
+_ASYNC_LIMITS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+async def _run_async(executor, priority: str, fn, *args, **kwargs) -> Any:
+    global _ASYNC_EXECUTOR  # pylint: disable=global-statement
+    if executor is None:
+        with _ASYNC_EXECUTOR_LOCK:
+            if _ASYNC_EXECUTOR is None:
+                _ASYNC_EXECUTOR = _PriorityExecutor()
+            executor = _ASYNC_EXECUTOR
+    async with _get_async_limit(executor, priority):
+        if isinstance(executor, _PriorityExecutor):
+            future = executor.submit(fn, *args, priority=priority, **kwargs)
+        else:
+            future = executor.submit(partial(fn, *args, **kwargs))
+        return await asyncio.wrap_future(future)
+
+
+def _get_async_limit(executor, priority: str) -> asyncio.Semaphore:
+    """Returns the semaphore that bounds the number of unfinished tasks of the running event loop in ``executor``.
+
+    Each priority class of :py:class:`_PriorityExecutor` has its own limit equal to the number of workers,
+    so the tasks with a higher priority are not waiting behind the tasks with a lower one.
+    """
+    if not isinstance(executor, _PriorityExecutor):
+        priority = ""
+    with _ASYNC_EXECUTOR_LOCK:
+        limits = _ASYNC_LIMITS.setdefault(asyncio.get_running_loop(), weakref.WeakKeyDictionary())
+        limits = limits.setdefault(executor, {})
+        if priority not in limits:
+            workers = getattr(executor, "workers", None) or getattr(executor, "_max_workers", None)
+            limits[priority] = asyncio.Semaphore(workers or os.cpu_count() or 1)
+        return limits[priority]
+
+
+class _DecodedImages:  # pylint: disable=too-few-public-methods
+    """Least recently used decoded images of one file, with the bounded number or size of them."""
+
+    def __init__(self, max_images: int, max_bytes: int, heif_file: Optional[weakref.ref]):
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.heif_file = heif_file
+        self._images: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, image) -> None:
+        """Marks the image as the most recently used one and unloads images above the limits."""
+        with self._lock:
+            key = id(image)
+            if key in self._images:
+                self._images.move_to_end(key)
+            else:
+                self._images[key] = weakref.ref(image)
+            evicted = []
+            total_bytes = sum(len(i._data) for i in self._alive_images())  # pylint: disable=protected-access
+            while len(self._images) > 1 and (
+                (self.max_images and len(self._images) > self.max_images)
+                or (self.max_bytes and total_bytes > self.max_bytes)
+            ):
+                old_image = self._images.popitem(last=False)[1]()
+                if old_image is not None and old_image._data:  # pylint: disable=protected-access
+                    total_bytes -= len(old_image._data)  # pylint: disable=protected-access
+                    evicted.append(old_image)
+        for old_image in evicted:
+            old_image.unload()
+        heif_file = self.heif_file() if self.heif_file else None
+        if heif_file is not None:
+            heif_file._drop_file_if_decoded()  # pylint: disable=protected-access
+
+    def _alive_images(self) -> list:
+        images = []
+        for key, image_ref in list(self._images.items()):
+            image = image_ref()
+            if image is None or not image._data:  # pylint: disable=protected-access
+                del self._images[key]
+            else:
+                images.append(image)
+        return images
@@ -1,5 +1,7 @@
 """Functions to get versions of underlying libraries."""
 
+from functools import lru_cache
+
 try:
     import _pillow_heif
 except ImportError as ex:
@@ -8,9 +10,15 @@ except ImportError as ex:
     _pillow_heif = DeferredError(ex)
 
 
+@lru_cache(maxsize=None)
+def _get_lib_info() -> dict:
+    """Cached ``get_lib_info``, the set of encoders and decoders changes only when plugins are loaded."""
+    return _pillow_heif.get_lib_info()
+
+
 def libheif_version() -> str:
     """Returns ``libheif`` version."""
-    return _pillow_heif.get_lib_info()["libheif"]
+    return _get_lib_info()["libheif"]
 
 
 def libheif_info() -> dict:
@@ -33,4 +41,4 @@ def libheif_info() -> dict:
         },
     }
     """
-    return _pillow_heif.get_lib_info()
+    return {k: dict(v) if isinstance(v, dict) else v for k, v in _get_lib_info().items()}
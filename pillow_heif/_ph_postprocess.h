@@ -98,8 +98,9 @@ void postprocess__bgr__word(int width, int height, uint16_t* data, int stride, i
     }
 }
 
-void postprocess__bgr_stride__byte(int width, int height, uint8_t* data, int stride_in, int stride_out, int channels) {
-    uint8_t *data_in = data, *data_out = data, tmp;
+void postprocess__bgr_stride__byte(int width, int height, uint8_t* data_in, uint8_t* data_out,
+                                   int stride_in, int stride_out, int channels) {
+    uint8_t tmp;
     if (channels == 3) {
         for (int i = 0; i < height; i++) {
             for (int i2 = 0; i2 < width; i2++) {
@@ -127,9 +128,9 @@ void postprocess__bgr_stride__byte(int width, int height, uint8_t* data, int str
     }
 }
 
-void postprocess__bgr_stride__word(int width, int height, uint16_t* data, int stride_in, int stride_out,
-                                   int channels, int shift_size) {
-    uint16_t *data_in = data, *data_out = data, tmp;
+void postprocess__bgr_stride__word(int width, int height, uint16_t* data_in, uint16_t* data_out,
+                                   int stride_in, int stride_out, int channels, int shift_size) {
+    uint16_t tmp;
     if (channels == 3) {
         if (shift_size == 4) {
             for (int i = 0; i < height; i++) {
@@ -278,21 +279,20 @@ void postprocess__word(int width, int height, uint16_t* data, int stride_element
     }
 }
 
-void postprocess__stride__byte(int width, int height, uint8_t* data, int stride_in, int stride_out) {
-    uint8_t *data_in = data, *data_out = data;
+void postprocess__stride__byte(int width, int height, uint8_t* data_in, uint8_t* data_out,
+                               int stride_in, int stride_out, int channels) {
     for (int i = 0; i < height; i++) {
-        memmove(data_out, data_in, stride_out); // possible will change to memcpy and set -D_FORTIFY_SOURCE=0
+        memmove(data_out, data_in, width * channels); // possible will change to memcpy and set -D_FORTIFY_SOURCE=0
         data_in += stride_in;
         data_out += stride_out;
     }
 }
 
-void postprocess__stride__word(int width, int height, uint16_t* data, int stride_in, int stride_out,
-                               int channels, int shift_size) {
-    uint16_t *data_in = data, *data_out = data;
+void postprocess__stride__word(int width, int height, uint16_t* data_in, uint16_t* data_out,
+                               int stride_in, int stride_out, int channels, int shift_size) {
     if (shift_size == 0) {
         for (int i = 0; i < height; i++) {
-            memmove(data_out, data_in, stride_out); // possible will change to memcpy and set -D_FORTIFY_SOURCE=0
+            memmove(data_out, data_in, width * channels * 2); // possible will change to memcpy and set -D_FORTIFY_SOURCE=0
             data_in += stride_in / 2;
             data_out += stride_out / 2;
         }
@@ -371,6 +371,88 @@ void postprocess__stride__word(int width, int height, uint16_t* data, int stride
     }
 }
 
+// Box Reduce Functions
+
+void postprocess__reduce__byte(int width, int height, uint8_t* data, int stride_in, int stride_out,
+                               int channels, int factor, int alpha_weighted) {
+    int out_width = (width + factor - 1) / factor;
+    int out_height = (height + factor - 1) / factor;
+    uint64_t sum[4];
+    for (int i = 0; i < out_height; i++) {
+        int rows = (i * factor + factor <= height) ? factor : height - i * factor;
+        uint8_t *data_in = data + i * factor * stride_in;
+        uint8_t *data_out = data + i * stride_out;
+        for (int i2 = 0; i2 < out_width; i2++) {
+            int cols = (i2 * factor + factor <= width) ? factor : width - i2 * factor;
+            uint64_t count = rows * cols;
+            for (int c = 0; c < channels; c++)
+                sum[c] = 0;
+            for (int y = 0; y < rows; y++) {
+                uint8_t *pixel = data_in + y * stride_in + i2 * factor * channels;
+                if (alpha_weighted)
+                    for (int x = 0; x < cols; x++, pixel += 4) {
+                        sum[0] += (uint64_t)pixel[0] * pixel[3];
+                        sum[1] += (uint64_t)pixel[1] * pixel[3];
+                        sum[2] += (uint64_t)pixel[2] * pixel[3];
+                        sum[3] += pixel[3];
+                    }
+                else
+                    for (int x = 0; x < cols; x++, pixel += channels)
+                        for (int c = 0; c < channels; c++)
+                            sum[c] += pixel[c];
+            }
+            if (alpha_weighted) {
+                for (int c = 0; c < 3; c++)
+                    data_out[i2 * 4 + c] = sum[3] ? (uint8_t)((sum[c] + sum[3] / 2) / sum[3]) : 0;
+                data_out[i2 * 4 + 3] = (uint8_t)((sum[3] + count / 2) / count);
+            }
+            else
+                for (int c = 0; c < channels; c++)
+                    data_out[i2 * channels + c] = (uint8_t)((sum[c] + count / 2) / count);
+        }
+    }
+}
+
+void postprocess__reduce__word(int width, int height, uint16_t* data, int stride_in, int stride_out,
+                               int channels, int factor, int alpha_weighted) {
+    int out_width = (width + factor - 1) / factor;
+    int out_height = (height + factor - 1) / factor;
+    uint64_t sum[4];
+    for (int i = 0; i < out_height; i++) {
+        int rows = (i * factor + factor <= height) ? factor : height - i * factor;
+        uint16_t *data_in = data + i * factor * (stride_in / 2);
+        uint16_t *data_out = data + i * (stride_out / 2);
+        for (int i2 = 0; i2 < out_width; i2++) {
+            int cols = (i2 * factor + factor <= width) ? factor : width - i2 * factor;
+            uint64_t count = rows * cols;
+            for (int c = 0; c < channels; c++)
+                sum[c] = 0;
+            for (int y = 0; y < rows; y++) {
+                uint16_t *pixel = data_in + y * (stride_in / 2) + i2 * factor * channels;
+                if (alpha_weighted)
+                    for (int x = 0; x < cols; x++, pixel += 4) {
+                        sum[0] += (uint64_t)pixel[0] * pixel[3];
+                        sum[1] += (uint64_t)pixel[1] * pixel[3];
+                        sum[2] += (uint64_t)pixel[2] * pixel[3];
+                        sum[3] += pixel[3];
+                    }
+                else
+                    for (int x = 0; x < cols; x++, pixel += channels)
+                        for (int c = 0; c < channels; c++)
+                            sum[c] += pixel[c];
+            }
+            if (alpha_weighted) {
+                for (int c = 0; c < 3; c++)
+                    data_out[i2 * 4 + c] = sum[3] ? (uint16_t)((sum[c] + sum[3] / 2) / sum[3]) : 0;
+                data_out[i2 * 4 + 3] = (uint16_t)((sum[3] + count / 2) / count);
+            }
+            else
+                for (int c = 0; c < channels; c++)
+                    data_out[i2 * channels + c] = (uint16_t)((sum[c] + count / 2) / count);
+        }
+    }
+}
+
 // Top Level Postprocess Functions
 
 void postprocess__bgr(int width, int height, void* data, int stride,
@@ -383,13 +465,16 @@ void postprocess__bgr(int width, int height, void* data, int stride,
     Py_END_ALLOW_THREADS
 }
 
-void postprocess__bgr_stride(int width, int height, void* data, int stride_in, int stride_out,
+// `data_out` can be the same as `data_in` when `stride_out` is not bigger than `stride_in`.
+void postprocess__bgr_stride(int width, int height, void* data_in, void* data_out, int stride_in, int stride_out,
                              int bytes_in_cc, int channels, int shift_size) {
     Py_BEGIN_ALLOW_THREADS
     if (bytes_in_cc == 1)
-        postprocess__bgr_stride__byte(width, height, (uint8_t*)data, stride_in, stride_out, channels);
+        postprocess__bgr_stride__byte(width, height, (uint8_t*)data_in, (uint8_t*)data_out,
+                                      stride_in, stride_out, channels);
     else
-        postprocess__bgr_stride__word(width, height, (uint16_t*)data, stride_in, stride_out, channels, shift_size);
+        postprocess__bgr_stride__word(width, height, (uint16_t*)data_in, (uint16_t*)data_out,
+                                      stride_in, stride_out, channels, shift_size);
     Py_END_ALLOW_THREADS
 }
 
@@ -402,12 +487,31 @@ void postprocess(int width, int height, void* data, int stride,
     Py_END_ALLOW_THREADS
 }
 
-void postprocess__stride(int width, int height, void* data, int stride_in, int stride_out,
+// `data_out` can be the same as `data_in` when `stride_out` is not bigger than `stride_in`.
+void postprocess__stride(int width, int height, void* data_in, void* data_out, int stride_in, int stride_out,
                          int bytes_in_cc, int channels, int shift_size) {
    Py_BEGIN_ALLOW_THREADS
     if (bytes_in_cc == 1)
-        postprocess__stride__byte(width, height, (uint8_t*)data, stride_in, stride_out);
+        postprocess__stride__byte(width, height, (uint8_t*)data_in, (uint8_t*)data_out,
+                                  stride_in, stride_out, channels);
+    else
+        postprocess__stride__word(width, height, (uint16_t*)data_in, (uint16_t*)data_out,
+                                  stride_in, stride_out, channels, shift_size);
+    Py_END_ALLOW_THREADS
+}
+
+// Box reduce is done in place: output has `ceil(width / factor)` x `ceil(height / factor)` pixels,
+// each one is the average of the `factor` x `factor` block(or of its part on the right and bottom edges).
+// For not premultiplied alpha, color values are weighted by alpha, so fully transparent pixels do not bleed.
+void postprocess__reduce(int width, int height, void* data, int stride_in, int stride_out,
+                         int bytes_in_cc, int channels, int factor, int premultiplied_alpha) {
+    int alpha_weighted = ((channels == 4) && (!premultiplied_alpha));
+    Py_BEGIN_ALLOW_THREADS
+    if (bytes_in_cc == 1)
+        postprocess__reduce__byte(width, height, (uint8_t*)data, stride_in, stride_out,
+                                  channels, factor, alpha_weighted);
     else
-        postprocess__stride__word(width, height, (uint16_t*)data, stride_in, stride_out, channels, shift_size);
+        postprocess__reduce__word(width, height, (uint16_t*)data, stride_in, stride_out,
+                                  channels, factor, alpha_weighted);
     Py_END_ALLOW_THREADS
 }
@@ -47,9 +47,109 @@ int __PyDict_SetItemString(PyObject *p, const char *key, PyObject *val) {
 
 enum ph_image_type {
     PhHeifImage = 0,
+    PhHeifThumbnailImage = 1,
     PhHeifDepthImage = 2,
 };
 
+#if LIBHEIF_HAVE_VERSION(1,18,0)
+// These functions of the item and property API appeared in libheif 1.18 in `heif_items.h` and `heif_properties.h`.
+// The bundled `heif.h` is the only libheif header in this repository and it does not include them, so they are
+// declared here with the signatures of libheif 1.18.
+size_t heif_context_get_item_references(const struct heif_context* ctx, heif_item_id from_item_id, int index,
+                                        uint32_t* out_reference_type_4cc, heif_item_id** out_references_to);
+void heif_release_item_references(const struct heif_context* ctx, heif_item_id** references);
+int heif_item_get_transformation_properties(const struct heif_context* context, heif_item_id id,
+                                            uint32_t* out_list, int count);
+int heif_item_get_property_type(const struct heif_context* context, heif_item_id id, uint32_t property_id);
+int heif_item_get_property_transform_rotation_ccw(const struct heif_context* context, heif_item_id id,
+                                                  uint32_t property_id);
+void heif_item_get_property_transform_crop_borders(const struct heif_context* context, heif_item_id id,
+                                                   uint32_t property_id, int image_width, int image_height,
+                                                   int* left, int* top, int* right, int* bottom);
+struct heif_error heif_item_add_raw_property(const struct heif_context* context, heif_item_id id,
+                                             uint32_t short_type, const uint8_t* uuid_type,
+                                             const uint8_t* data, size_t size,
+                                             int is_essential, uint32_t* out_property_id);
+#endif
+#if LIBHEIF_HAVE_VERSION(1,19,0)
+// libheif 1.18 has it as `heif_context_get_item_type` without C linkage, so it can not be used there.
+uint32_t heif_item_get_item_type(const struct heif_context* ctx, heif_item_id item_id);
+#endif
+
+/* =========== Reader ======== */
+
+// `userdata` is a Python object with file-like `tell`, `seek`, `read` methods and a `wait_for_file_size` method.
+// libheif can call these functions from `decode_image` too, where the GIL is released, so we always acquire it.
+// `PyGILState_Ensure` works only with the main interpreter, that is why readers are not supported in sub-interpreters.
+
+static int64_t reader_get_position(void* userdata) {
+    int64_t position = -1;
+    PyGILState_STATE gil_state = PyGILState_Ensure();
+    PyObject* result = PyObject_CallMethod((PyObject*)userdata, "tell", NULL);
+    if (result) {
+        position = PyLong_AsLongLong(result);
+        Py_DECREF(result);
+    }
+    if (PyErr_Occurred())
+        PyErr_Clear();
+    PyGILState_Release(gil_state);
+    return position;
+}
+
+static int reader_read(void* data, size_t size, void* userdata) {
+    int ret = 1;
+    PyGILState_STATE gil_state = PyGILState_Ensure();
+    PyObject* result = PyObject_CallMethod((PyObject*)userdata, "read", "n", (Py_ssize_t)size);
+    if (result) {
+        if ((PyBytes_Check(result)) && ((size_t)PyBytes_GET_SIZE(result) == size)) {
+            memcpy(data, PyBytes_AS_STRING(result), size);
+            ret = 0;
+        }
+        Py_DECREF(result);
+    }
+    if (PyErr_Occurred())
+        PyErr_Clear();
+    PyGILState_Release(gil_state);
+    return ret;
+}
+
+static int reader_seek(int64_t position, void* userdata) {
+    int ret = 1;
+    PyGILState_STATE gil_state = PyGILState_Ensure();
+    PyObject* result = PyObject_CallMethod((PyObject*)userdata, "seek", "L", (long long)position);
+    if (result) {
+        ret = 0;
+        Py_DECREF(result);
+    }
+    else
+        PyErr_Clear();
+    PyGILState_Release(gil_state);
+    return ret;
+}
+
+static enum heif_reader_grow_status reader_wait_for_file_size(int64_t target_size, void* userdata) {
+    enum heif_reader_grow_status status = heif_reader_grow_status_size_beyond_eof;
+    PyGILState_STATE gil_state = PyGILState_Ensure();
+    PyObject* result = PyObject_CallMethod((PyObject*)userdata, "wait_for_file_size", "L", (long long)target_size);
+    if (result) {
+        if (PyObject_IsTrue(result) == 1)
+            status = heif_reader_grow_status_size_reached;
+        Py_DECREF(result);
+    }
+    if (PyErr_Occurred())
+        PyErr_Clear();
+    PyGILState_Release(gil_state);
+    return status;
+}
+
+static struct heif_reader ph_reader = {
+    .reader_api_version = 1,
+    .get_position = &reader_get_position,
+    .read = &reader_read,
+    .seek = &reader_seek,
+    .wait_for_file_size = &reader_wait_for_file_size,
+};
+
 /* =========== Objects ======== */
 
 typedef struct {
@@ -60,8 +160,6 @@ typedef struct {
     struct heif_color_profile_nclx* output_nclx_color_profile;
 } CtxWriteImageObject;
 
-static PyTypeObject CtxWriteImage_Type;
-
 typedef struct {
     PyObject_HEAD
     struct heif_context* ctx;               // libheif context
@@ -70,11 +168,9 @@ typedef struct {
     void* data;                             // encoded data if success
 } CtxWriteObject;
 
-static PyTypeObject CtxWrite_Type;
-
 typedef struct {
     PyObject_HEAD
-    enum ph_image_type image_type;              // 0 - standard, 2 - depth image
+    enum ph_image_type image_type;              // 0 - standard, 1 - thumbnail, 2 - depth image
     int width;                                  // size[0];
     int height;                                 // size[1];
     int bits;                                   // one of: 8, 10, 12.
@@ -89,16 +185,78 @@ typedef struct {
     int remove_stride;                          // private. decode option.
     int hdr_to_16bit;                           // private. decode option.
     int reload_size;                            // private. decode option.
+    int reduce;                                 // private. decode option. box reduce factor, 1 - no reduce.
+    int region[4];                              // private. decode option. left, top, right, bottom. empty - no crop.
+    int decode_threads;                         // private. decode option. libheif threads, -1 - as set for the file
     char decoder_id[64];                        // private. decode option. optional
     struct heif_image_handle *handle;           // private
     struct heif_image *heif_image;              // private
     const struct heif_depth_representation_info* depth_metadata; // only for image_type == 2
     uint8_t *data;                              // pointer to data after decoding
     int stride;                                 // time when it get filled depends on `remove_stride` value
-    PyObject *file_bytes;                       // private
+    PyObject *pixels;                           // private. `CtxBuffer` that owns decoded data
+    PyObject *file_data;                        // private. bytes, memoryview or reader object
+    PyThread_type_lock lock;                    // private. serializes decoding and changes of the decoded state
 } CtxImageObject;
 
-static PyTypeObject CtxImage_Type;
+typedef struct {
+    PyObject_HEAD
+    struct heif_context* ctx;                   // libheif context
+    heif_item_id primary_id;                    // ID of the primary image
+    int decode_threads;                         // maximum number of threads libheif uses to decode an image
+    int hdr_to_8bit;                            // decode options for the images
+    int bgr_mode;
+    int remove_stride;
+    int hdr_to_16bit;
+    int reload_size;
+    char decoder_id[64];
+    PyObject *file_data;                        // bytes, memoryview or reader object
+} CtxFileObject;
+
+typedef struct {
+    PyObject_HEAD
+    struct heif_image *heif_image;              // owner of the decoded pixels, NULL if `data` is allocated
+    uint8_t *data;                              // pointer to the first pixel or to the encoded data
+    Py_ssize_t size;                            // number of bytes in `data`
+    int readonly;                               // exported buffer is read-only
+} CtxBufferObject;
+
+/* =========== Module state ======== */
+
+// Types are created per module object, so every interpreter that imports the module gets its own types.
+typedef struct {
+    PyTypeObject* CtxWriteImage_Type;
+    PyTypeObject* CtxWrite_Type;
+    PyTypeObject* CtxImage_Type;
+    PyTypeObject* CtxFile_Type;
+    PyTypeObject* CtxBuffer_Type;
+} ph_module_state;
+
+#if PY_VERSION_HEX >= 0x03090000 && !defined(PYPY_VERSION)
+#define PH_TYPE_MODULE_STATE 1
+#else
+// There is no `PyType_GetModuleState` here, sub-interpreters are not supported and the state is global.
+static ph_module_state* ph_global_state = NULL;
+#endif
+
+static ph_module_state* get_module_state(PyObject* module) {
+    return (ph_module_state*)PyModule_GetState(module);
+}
+
+static ph_module_state* get_type_state(PyTypeObject* type) {
+#ifdef PH_TYPE_MODULE_STATE
+    return (ph_module_state*)PyType_GetModuleState(type);
+#else
+    return ph_global_state;
+#endif
+}
+
+// Instances of heap types hold a reference to their type, which is released after the object.
+static void ph_object_del(PyObject* self) {
+    PyTypeObject* type = Py_TYPE(self);
+    PyObject_Del(self);
+    Py_DECREF(type);
+}
 
 int get_stride(CtxImageObject *ctx_image) {
     int stride = ctx_image->width * ctx_image->n_channels;
@@ -116,7 +274,7 @@ static void _CtxWriteImage_destructor(CtxWriteImageObject* self) {
         heif_image_release(self->image);
     if (self->output_nclx_color_profile)
         heif_nclx_color_profile_free(self->output_nclx_color_profile);
-    PyObject_Del(self);
+    ph_object_del((PyObject*)self);
 }
 
 static PyObject* _CtxWriteImage_add_plane(CtxWriteImageObject* self, PyObject* args) {
@@ -521,23 +679,9 @@ static PyObject* _CtxWriteImage_set_nclx_profile(CtxWriteImageObject* self, PyOb
     Py_RETURN_NONE;
 }
 
-static PyObject* _CtxWriteImage_encode(CtxWriteImageObject* self, PyObject* args) {
-    /* ctx: CtxWriteObject, primary: int */
-    CtxWriteObject* ctx_write;
-    int primary, image_orientation,
-        save_nclx, color_primaries, transfer_characteristics, matrix_coefficients, full_range_flag;
-    struct heif_error error;
-    struct heif_encoding_options* options;
-
-    if (!PyArg_ParseTuple(args, "Oiiiiiii",
-        (PyObject*)&ctx_write, &primary,
-        &save_nclx, &color_primaries, &transfer_characteristics, &matrix_coefficients, &full_range_flag,
-        &image_orientation
-    ))
-        return NULL;
-
-    Py_BEGIN_ALLOW_THREADS
-    options = heif_encoding_options_alloc();
+struct heif_encoding_options* alloc_encoding_options(int save_nclx, int color_primaries, int transfer_characteristics,
+                                                     int matrix_coefficients, int full_range_flag, int image_orientation) {
+    struct heif_encoding_options* options = heif_encoding_options_alloc();
     options->macOS_compatibility_workaround_no_nclx_profile = !save_nclx;
     if (
         (color_primaries != -1) ||
@@ -556,10 +700,35 @@ static PyObject* _CtxWriteImage_encode(CtxWriteImageObject* self, PyObject* args
             options->output_nclx_profile->full_range_flag = full_range_flag;
     }
     options->image_orientation = image_orientation;
-    error = heif_context_encode_image(ctx_write->ctx, self->image, ctx_write->encoder, options, &self->handle);
+    return options;
+}
+
+void free_encoding_options(struct heif_encoding_options* options) {
     if (options->output_nclx_profile)
         heif_nclx_color_profile_free(options->output_nclx_profile);
     heif_encoding_options_free(options);
+}
+
+static PyObject* _CtxWriteImage_encode(CtxWriteImageObject* self, PyObject* args) {
+    /* ctx: CtxWriteObject, primary: int */
+    CtxWriteObject* ctx_write;
+    int primary, image_orientation,
+        save_nclx, color_primaries, transfer_characteristics, matrix_coefficients, full_range_flag;
+    struct heif_error error;
+    struct heif_encoding_options* options;
+
+    if (!PyArg_ParseTuple(args, "Oiiiiiii",
+        (PyObject*)&ctx_write, &primary,
+        &save_nclx, &color_primaries, &transfer_characteristics, &matrix_coefficients, &full_range_flag,
+        &image_orientation
+    ))
+        return NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    options = alloc_encoding_options(
+        save_nclx, color_primaries, transfer_characteristics, matrix_coefficients, full_range_flag, image_orientation);
+    error = heif_context_encode_image(ctx_write->ctx, self->image, ctx_write->encoder, options, &self->handle);
+    free_encoding_options(options);
     Py_END_ALLOW_THREADS
     if (check_error(error))
         return NULL;
@@ -664,9 +833,76 @@ static struct PyMethodDef _CtxWriteImage_methods[] = {
 
 /* =========== CtxWrite ======== */
 
+// `heif_context_write` is called without the GIL, libheif passes all encoded data to the writer at once.
+// Without `write` the data is copied to a `bytes` object, or to a buffer without the GIL when `as_buffer` is set.
+// With `write` the data is passed to it in chunks of `bytes`, or of memoryviews over the libheif's buffer that are
+// valid only during the call when `as_buffer` is set. The writer is called from the thread that released the GIL,
+// so its thread state is reused: `PyGILState_Ensure` knows only about the main interpreter.
+struct ph_write_data {
+    PyThreadState* thread_state;
+    PyObject* write;                            // `write` method of the output or NULL
+    Py_ssize_t chunk_size;                      // max size of data passed to `write` at once
+    int as_buffer;                              // pass and return buffers instead of `bytes`
+    PyObject* bytes;                            // copy of the encoded data, when there is no `write`
+    uint8_t* data;                              // copy of the encoded data, when there is no `write` and `as_buffer`
+    size_t size;
+    int failed;                                 // there is an exception set, or memory allocation failed
+};
+
 static struct heif_error ctx_write_callback(struct heif_context* ctx, const void* data, size_t size, void* userdata) {
-    *((PyObject**)userdata) = PyBytes_FromStringAndSize((char*)data, size);
-    return heif_error_no;
+    struct ph_write_data* write_data = (struct ph_write_data*)userdata;
+    struct heif_error error_write = {
+        .code = heif_error_Encoding_error,
+        .subcode = heif_suberror_Cannot_write_output_data,
+        .message = "Can not write output data"
+    };
+
+    if (!write_data->write && write_data->as_buffer) {
+        write_data->data = (uint8_t*)malloc(size ? size : 1);
+        if (!write_data->data) {
+            write_data->failed = 1;
+            return error_write;
+        }
+        memcpy(write_data->data, data, size);
+        write_data->size = size;
+        return heif_error_no;
+    }
+
+    PyEval_RestoreThread(write_data->thread_state);
+    if (!write_data->write) {
+        write_data->bytes = PyBytes_FromStringAndSize((const char*)data, (Py_ssize_t)size);
+        if (!write_data->bytes)
+            write_data->failed = 1;
+    }
+    else
+        for (size_t offset = 0; offset < size; offset += write_data->chunk_size) {
+            size_t chunk_size = size - offset;
+            if (chunk_size > (size_t)write_data->chunk_size)
+                chunk_size = (size_t)write_data->chunk_size;
+            PyObject* chunk;
+            if (write_data->as_buffer)
+                chunk = PyMemoryView_FromMemory((char*)data + offset, chunk_size, PyBUF_READ);
+            else
+                chunk = PyBytes_FromStringAndSize((const char*)data + offset, (Py_ssize_t)chunk_size);
+            if (!chunk) {
+                write_data->failed = 1;
+                break;
+            }
+            PyObject* result = PyObject_CallFunctionObjArgs(write_data->write, chunk, NULL);
+            if (result && write_data->as_buffer) {
+                // libheif frees its buffer after the writer returns, so the output must not keep references to it
+                Py_DECREF(result);
+                result = PyObject_CallMethod(chunk, "release", NULL);
+            }
+            Py_DECREF(chunk);
+            Py_XDECREF(result);
+            if (!result) {
+                write_data->failed = 1;
+                break;
+            }
+        }
+    write_data->thread_state = PyEval_SaveThread();
+    return write_data->failed ? error_write : heif_error_no;
 }
 
 static struct heif_writer ctx_writer = { .writer_api_version = 1, .write = &ctx_write_callback };
@@ -677,7 +913,7 @@ static void _CtxWrite_destructor(CtxWriteObject* self) {
     if (self->encoder)
         heif_encoder_release(self->encoder);
     heif_context_free(self->ctx);
-    PyObject_Del(self);
+    ph_object_del((PyObject*)self);
 }
 
 static PyObject* _CtxWrite_set_parameter(CtxWriteObject* self, PyObject* args) {
@@ -689,6 +925,40 @@ static PyObject* _CtxWrite_set_parameter(CtxWriteObject* self, PyObject* args) {
     Py_RETURN_NONE;
 }
 
+static PyObject* _CtxWrite_set_threads(CtxWriteObject* self, PyObject* args) {
+    /* threads: int. returns True if the encoder supports setting of the number of threads */
+    int threads, have_minimum, have_maximum, minimum, maximum, num_valid_values;
+    const int* valid_values;
+    if (!PyArg_ParseTuple(args, "i", &threads))
+        return NULL;
+
+    const struct heif_encoder_parameter* const* params = heif_encoder_list_parameters(self->encoder);
+    for (; params && *params; params++) {
+        if (strcmp(heif_encoder_parameter_get_name(*params), "threads") != 0)
+            continue;
+        struct heif_error error = heif_encoder_parameter_get_valid_integer_values(
+            *params, &have_minimum, &have_maximum, &minimum, &maximum, &num_valid_values, &valid_values);
+        if (error.code == heif_error_Ok) {
+            if (have_minimum && threads < minimum)
+                threads = minimum;
+            if (have_maximum && threads > maximum)
+                threads = maximum;
+        }
+        if (check_error(heif_encoder_set_parameter_integer(self->encoder, "threads", threads)))
+            return NULL;
+        Py_RETURN_TRUE;
+    }
+    // x265 encoder passes parameters with the `x265:` prefix to the x265 library
+    if (strstr(heif_encoder_get_name(self->encoder), "x265")) {
+        char value[16];
+        snprintf(value, sizeof(value), "%d", threads);
+        if (check_error(heif_encoder_set_parameter(self->encoder, "x265:pools", value)))
+            return NULL;
+        Py_RETURN_TRUE;
+    }
+    Py_RETURN_FALSE;
+}
+
 static PyObject* _CtxWriteImage_create(CtxWriteObject* self, PyObject* args) {
     /* (size), color: int, chroma: int, premultiplied: int */
     struct heif_image* image;
@@ -701,7 +971,7 @@ static PyObject* _CtxWriteImage_create(CtxWriteObject* self, PyObject* args) {
     if (premultiplied)
         heif_image_set_premultiplied_alpha(image, 1);
 
-    CtxWriteImageObject* ctx_write_image = PyObject_New(CtxWriteImageObject, &CtxWriteImage_Type);
+    CtxWriteImageObject* ctx_write_image = PyObject_New(CtxWriteImageObject, get_type_state(Py_TYPE(self))->CtxWriteImage_Type);
     if (!ctx_write_image) {
         heif_image_release(image);
         PyErr_SetString(PyExc_RuntimeError, "could not create CtxWriteImage object");
@@ -714,37 +984,280 @@ static PyObject* _CtxWriteImage_create(CtxWriteObject* self, PyObject* args) {
     return (PyObject*)ctx_write_image;
 }
 
-static PyObject* _CtxWrite_finalize(CtxWriteObject* self) {
-    PyObject *ret = NULL;
-    struct heif_error error = heif_context_write(self->ctx, &ctx_writer, &ret);
-    if (!check_error(error)) {
-        if (ret != NULL)
-            return ret;
-        PyErr_SetString(PyExc_RuntimeError, "Unknown runtime or memory error");
+#if LIBHEIF_HAVE_VERSION(1,18,0)
+// libheif has no API to set the `colr`, `clap`, `irot` and `imir` properties of an item, they are written as raw
+// properties with `heif_item_add_raw_property`, that is available since libheif 1.18.
+void write_uint32_be(uint8_t* p, uint32_t value) {
+    p[0] = (uint8_t)(value >> 24);
+    p[1] = (uint8_t)(value >> 16);
+    p[2] = (uint8_t)(value >> 8);
+    p[3] = (uint8_t)value;
+}
+
+// Copies `colr` boxes of the first tile to the grid image, libheif 1.18 writes them only for the tiles.
+struct heif_error add_grid_color_profiles(struct heif_context* ctx, heif_item_id item_id) {
+    struct heif_error error = heif_error_no;
+    struct heif_image_handle* tile_handle;
+    struct heif_color_profile_nclx* nclx;
+    heif_item_id* tiles_ids;
+    uint32_t reference_type, property_id;
+    uint8_t* colr;
+    size_t size;
+
+    if (!heif_context_get_item_references(ctx, item_id, 0, &reference_type, &tiles_ids))
+        return error;
+    error = heif_context_get_image_handle(ctx, tiles_ids[0], &tile_handle);
+    heif_release_item_references(ctx, &tiles_ids);
+    if (error.code != heif_error_Ok)
+        return error;
+    size = heif_image_handle_get_raw_color_profile_size(tile_handle);
+    if (size) {
+        colr = (uint8_t*)malloc(size + 4);
+        if (!colr) {
+            heif_image_handle_release(tile_handle);
+            return (struct heif_error){ .code = heif_error_Memory_allocation_error, .message = "out of memory" };
+        }
+        write_uint32_be(colr, heif_image_handle_get_color_profile_type(tile_handle));
+        error = heif_image_handle_get_raw_color_profile(tile_handle, colr + 4);
+        if (error.code == heif_error_Ok)
+            error = heif_item_add_raw_property(
+                ctx, item_id, heif_fourcc('c','o','l','r'), NULL, colr, size + 4, 0, &property_id);
+        free(colr);
+    }
+    if ((error.code == heif_error_Ok) &&
+        (heif_image_handle_get_nclx_color_profile(tile_handle, &nclx).code == heif_error_Ok)) {
+        uint8_t nclx_colr[11] = {
+            'n', 'c', 'l', 'x',
+            (uint8_t)(nclx->color_primaries >> 8), (uint8_t)nclx->color_primaries,
+            (uint8_t)(nclx->transfer_characteristics >> 8), (uint8_t)nclx->transfer_characteristics,
+            (uint8_t)(nclx->matrix_coefficients >> 8), (uint8_t)nclx->matrix_coefficients,
+            nclx->full_range_flag ? 0x80 : 0};
+        heif_nclx_color_profile_free(nclx);
+        error = heif_item_add_raw_property(
+            ctx, item_id, heif_fourcc('c','o','l','r'), NULL, nclx_colr, 11, 0, &property_id);
+    }
+    heif_image_handle_release(tile_handle);
+    return error;
+}
+
+// libheif 1.18 always gives the grid image the size of all tiles and ignores the `image_orientation` option.
+// When the image size is not a multiple of the tile size we crop the padding with a `clap` box, and write the
+// EXIF orientation as `irot` and `imir` boxes, transformative properties must follow in this order.
+struct heif_error add_grid_transformations(struct heif_context* ctx, heif_item_id item_id,
+                                           int width, int height, int grid_width, int grid_height,
+                                           int image_orientation) {
+    // rotation(ccw, in 90 degrees units) and mirroring(0 - top and bottom are swapped, 1 - left and right)
+    static const int rotations[9] = {0, 0, 0, 2, 0, 1, 3, 3, 1};
+    static const int mirrors[9] = {-1, -1, 1, -1, 0, 0, -1, 0, -1};
+    struct heif_error error = heif_error_no;
+    uint32_t property_id;
+    uint8_t clap[32], irot, imir;
+
+    if ((width != grid_width) || (height != grid_height)) {
+        write_uint32_be(clap, (uint32_t)width);
+        write_uint32_be(clap + 4, 1);
+        write_uint32_be(clap + 8, (uint32_t)height);
+        write_uint32_be(clap + 12, 1);
+        write_uint32_be(clap + 16, (uint32_t)(width - grid_width));
+        write_uint32_be(clap + 20, 2);
+        write_uint32_be(clap + 24, (uint32_t)(height - grid_height));
+        write_uint32_be(clap + 28, 2);
+        error = heif_item_add_raw_property(ctx, item_id, heif_fourcc('c','l','a','p'), NULL, clap, 32, 1, &property_id);
+    }
+    if ((error.code != heif_error_Ok) || (image_orientation < 2) || (image_orientation > 8))
+        return error;
+    if (rotations[image_orientation]) {
+        irot = (uint8_t)rotations[image_orientation];
+        error = heif_item_add_raw_property(ctx, item_id, heif_fourcc('i','r','o','t'), NULL, &irot, 1, 1, &property_id);
+        if (error.code != heif_error_Ok)
+            return error;
+    }
+    if (mirrors[image_orientation] != -1) {
+        imir = (uint8_t)mirrors[image_orientation];
+        error = heif_item_add_raw_property(ctx, item_id, heif_fourcc('i','m','i','r'), NULL, &imir, 1, 1, &property_id);
+    }
+    return error;
+}
+#endif
+
+static PyObject* _CtxWrite_encode_grid(CtxWriteObject* self, PyObject* args) {
+    /* tiles: list[CtxWriteImage], columns: int, rows: int, (size), primary: int, ... */
+    PyObject* tiles_list;
+    int columns, rows, width, height, primary, image_orientation,
+        save_nclx, color_primaries, transfer_characteristics, matrix_coefficients, full_range_flag;
+
+    if (!PyArg_ParseTuple(args, "O!ii(ii)iiiiiii",
+        &PyList_Type, &tiles_list, &columns, &rows, &width, &height, &primary,
+        &save_nclx, &color_primaries, &transfer_characteristics, &matrix_coefficients, &full_range_flag,
+        &image_orientation
+    ))
+        return NULL;
+
+#if LIBHEIF_HAVE_VERSION(1,18,0)
+    struct heif_error error;
+    struct heif_encoding_options* options;
+    struct heif_image_handle* handle;
+    int grid_width, grid_height;
+    enum heif_chroma chroma;
+
+    if ((columns <= 0) || (rows <= 0) || (columns > 0xFFFF) || (rows > 0xFFFF) ||
+        (PyList_Size(tiles_list) != (Py_ssize_t)columns * rows)) {
+        PyErr_SetString(PyExc_ValueError, "number of tiles does not match the grid layout");
+        return NULL;
+    }
+    struct heif_image** tiles = (struct heif_image**)malloc(sizeof(struct heif_image*) * columns * rows);
+    if (!tiles)
+        return PyErr_NoMemory();
+    for (int i = 0; i < columns * rows; i++) {
+        PyObject* tile = PyList_GET_ITEM(tiles_list, i);
+        if (!PyObject_TypeCheck(tile, get_type_state(Py_TYPE(self))->CtxWriteImage_Type) || !((CtxWriteImageObject*)tile)->image) {
+            free(tiles);
+            PyErr_SetString(PyExc_TypeError, "tiles must be a list of CtxWriteImage objects");
+            return NULL;
+        }
+        tiles[i] = ((CtxWriteImageObject*)tile)->image;
     }
+    grid_width = heif_image_get_primary_width(tiles[0]) * columns;
+    grid_height = heif_image_get_primary_height(tiles[0]) * rows;
+    if ((width > grid_width) || (height > grid_height)) {
+        free(tiles);
+        PyErr_SetString(PyExc_ValueError, "image size is bigger than the grid");
+        return NULL;
+    }
+    chroma = heif_image_get_chroma_format(tiles[0]);
+
+    Py_BEGIN_ALLOW_THREADS
+    options = alloc_encoding_options(
+        save_nclx, color_primaries, transfer_characteristics, matrix_coefficients, full_range_flag,
+        heif_orientation_normal);
+    // libheif 1.18 implementation takes `columns` before `rows`, in contrast to the parameter names in `heif.h`
+    error = heif_context_encode_grid(
+        self->ctx, tiles, (uint16_t)columns, (uint16_t)rows, self->encoder, options, &handle);
+    free_encoding_options(options);
+    if (error.code == heif_error_Ok) {
+        error = add_grid_color_profiles(self->ctx, heif_image_handle_get_item_id(handle));
+        if (error.code == heif_error_Ok)
+            error = add_grid_transformations(
+                self->ctx, heif_image_handle_get_item_id(handle), width, height, grid_width, grid_height,
+                image_orientation);
+        if (error.code != heif_error_Ok)
+            heif_image_handle_release(handle);
+    }
+    Py_END_ALLOW_THREADS
+    free(tiles);
+    if (check_error(error))
+        return NULL;
+
+    if (primary)
+        heif_context_set_primary_image(self->ctx, handle);
+    CtxWriteImageObject* ctx_write_image = PyObject_New(CtxWriteImageObject, get_type_state(Py_TYPE(self))->CtxWriteImage_Type);
+    if (!ctx_write_image) {
+        heif_image_handle_release(handle);
+        PyErr_SetString(PyExc_RuntimeError, "could not create CtxWriteImage object");
+        return NULL;
+    }
+    ctx_write_image->chroma = chroma;
+    ctx_write_image->image = NULL;
+    ctx_write_image->handle = handle;
+    ctx_write_image->output_nclx_color_profile = NULL;
+    return (PyObject*)ctx_write_image;
+#else
+    PyErr_SetString(PyExc_RuntimeError, "grid encoding requires libheif 1.18 or newer");
     return NULL;
+#endif
+}
+
+static PyObject* _CtxWrite_finalize(CtxWriteObject* self, PyObject* args) {
+    /* write: Optional[callable], chunk_size: int, as_buffer: bool */
+    struct ph_write_data write_data = {
+        .thread_state = NULL, .write = NULL, .chunk_size = 1 << 20, .as_buffer = 0,
+        .bytes = NULL, .data = NULL, .size = 0, .failed = 0
+    };
+    struct heif_error error;
+
+    if (!PyArg_ParseTuple(args, "|Onp", &write_data.write, &write_data.chunk_size, &write_data.as_buffer))
+        return NULL;
+    if (write_data.write == Py_None)
+        write_data.write = NULL;
+    if (write_data.chunk_size <= 0) {
+        PyErr_SetString(PyExc_ValueError, "chunk_size must be positive");
+        return NULL;
+    }
+
+    write_data.thread_state = PyEval_SaveThread();
+    error = heif_context_write(self->ctx, &ctx_writer, &write_data);
+    PyEval_RestoreThread(write_data.thread_state);
+    if (write_data.failed) {
+        free(write_data.data);
+        if (!write_data.write && write_data.as_buffer)
+            PyErr_NoMemory();
+        return NULL;
+    }
+    if (check_error(error)) {
+        free(write_data.data);
+        Py_XDECREF(write_data.bytes);
+        return NULL;
+    }
+    if (write_data.write)
+        Py_RETURN_NONE;
+    if (write_data.bytes)
+        return write_data.bytes;
+    if (!write_data.data) {
+        PyErr_SetString(PyExc_RuntimeError, "Unknown runtime or memory error");
+        return NULL;
+    }
+
+    CtxBufferObject* buffer = PyObject_New(CtxBufferObject, get_type_state(Py_TYPE(self))->CtxBuffer_Type);
+    if (!buffer) {
+        free(write_data.data);
+        return NULL;
+    }
+    buffer->heif_image = NULL;
+    buffer->data = write_data.data;
+    buffer->size = (Py_ssize_t)write_data.size;
+    buffer->readonly = 1;
+    return (PyObject*)buffer;
+}
+
+// Replaces the context with an empty one, the configured encoder is kept to be reused for the next file.
+static PyObject* _CtxWrite_reset(CtxWriteObject* self) {
+    struct heif_context* ctx = heif_context_alloc();
+    if (!ctx)
+        return PyErr_NoMemory();
+    heif_context_free(self->ctx);
+    self->ctx = ctx;
+    Py_RETURN_NONE;
 }
 
 static struct PyMethodDef _CtxWrite_methods[] = {
     {"set_parameter", (PyCFunction)_CtxWrite_set_parameter, METH_VARARGS},
+    {"set_threads", (PyCFunction)_CtxWrite_set_threads, METH_VARARGS},
     {"create_image", (PyCFunction)_CtxWriteImage_create, METH_VARARGS},
-    {"finalize", (PyCFunction)_CtxWrite_finalize, METH_NOARGS},
+    {"encode_grid", (PyCFunction)_CtxWrite_encode_grid, METH_VARARGS},
+    {"finalize", (PyCFunction)_CtxWrite_finalize, METH_VARARGS},
+    {"reset", (PyCFunction)_CtxWrite_reset, METH_NOARGS},
     {NULL, NULL}
 };
 
 /* =========== CtxDepthImage ======== */
 
-PyObject* _CtxDepthImage(struct heif_image_handle* main_handle, heif_item_id depth_image_id,
-                            int remove_stride, int hdr_to_16bit, PyObject* file_bytes) {
+PyObject* _CtxDepthImage(PyTypeObject* type, struct heif_image_handle* main_handle, heif_item_id depth_image_id,
+                            int remove_stride, int hdr_to_16bit, PyObject* file_data) {
     struct heif_image_handle* depth_handle;
     if (check_error(heif_image_handle_get_depth_image_handle(main_handle, depth_image_id, &depth_handle))) {
         Py_RETURN_NONE;
     }
-    CtxImageObject *ctx_image = PyObject_New(CtxImageObject, &CtxImage_Type);
+    CtxImageObject *ctx_image = PyObject_New(CtxImageObject, type);
     if (!ctx_image) {
         heif_image_handle_release(depth_handle);
         Py_RETURN_NONE;
     }
+    ctx_image->lock = PyThread_allocate_lock();
+    if (!ctx_image->lock) {
+        heif_image_handle_release(depth_handle);
+        ph_object_del((PyObject*)ctx_image);
+        Py_RETURN_NONE;
+    }
     if (!heif_image_handle_get_depth_image_representation_info(main_handle, depth_image_id, &ctx_image->depth_metadata))
         ctx_image->depth_metadata = NULL;
     ctx_image->image_type = PhHeifDepthImage;
@@ -771,40 +1284,62 @@ PyObject* _CtxDepthImage(struct heif_image_handle* main_handle, heif_item_id dep
     ctx_image->chroma = heif_chroma_monochrome;
     ctx_image->handle = depth_handle;
     ctx_image->heif_image = NULL;
+    ctx_image->pixels = NULL;
     ctx_image->data = NULL;
     ctx_image->remove_stride = remove_stride;
     ctx_image->hdr_to_16bit = hdr_to_16bit;
     ctx_image->reload_size = 1;
-    ctx_image->file_bytes = file_bytes;
+    ctx_image->reduce = 1;
+    memset(ctx_image->region, 0, sizeof(ctx_image->region));
+    ctx_image->decode_threads = -1;
+    ctx_image->file_data = file_data;
     ctx_image->stride = get_stride(ctx_image);
-    Py_INCREF(file_bytes);
+    Py_INCREF(file_data);
     return (PyObject*)ctx_image;
 }
 
 /* =========== CtxImage ======== */
 
 static void _CtxImage_destructor(CtxImageObject* self) {
+    Py_XDECREF(self->pixels);
     if (self->heif_image)
         heif_image_release(self->heif_image);
     if (self->handle)
         heif_image_handle_release(self->handle);
     if (self->depth_metadata)
         heif_depth_representation_info_free(self->depth_metadata);
-    Py_DECREF(self->file_bytes);
-    PyObject_Del(self);
+    Py_DECREF(self->file_data);
+    PyThread_free_lock(self->lock);
+    ph_object_del((PyObject*)self);
+}
+
+// Decoding releases the GIL(and there is no GIL in the free-threaded builds), so the decoded state of an image
+// is changed only with its lock held. The lock is taken without the GIL, to not block other threads.
+static void lock_image(CtxImageObject* self) {
+    if (!PyThread_acquire_lock(self->lock, NOWAIT_LOCK)) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(self->lock, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+    }
 }
 
-PyObject* _CtxImage(struct heif_image_handle* handle, int hdr_to_8bit,
+PyObject* _CtxImage(PyTypeObject* type, struct heif_image_handle* handle, int hdr_to_8bit,
                     int bgr_mode, int remove_stride, int hdr_to_16bit,
-                    int reload_size, int primary, PyObject* file_bytes,
+                    int reload_size, int primary, PyObject* file_data,
                     const char *decoder_id,
                     enum heif_colorspace colorspace, enum heif_chroma chroma
                     ) {
-    CtxImageObject *ctx_image = PyObject_New(CtxImageObject, &CtxImage_Type);
+    CtxImageObject *ctx_image = PyObject_New(CtxImageObject, type);
     if (!ctx_image) {
         heif_image_handle_release(handle);
         Py_RETURN_NONE;
     }
+    ctx_image->lock = PyThread_allocate_lock();
+    if (!ctx_image->lock) {
+        heif_image_handle_release(handle);
+        ph_object_del((PyObject*)ctx_image);
+        Py_RETURN_NONE;
+    }
     ctx_image->depth_metadata = NULL;
     ctx_image->image_type = PhHeifImage;
     ctx_image->width = heif_image_handle_get_width(handle);
@@ -850,24 +1385,58 @@ PyObject* _CtxImage(struct heif_image_handle* handle, int hdr_to_8bit,
     ctx_image->bgr_mode = bgr_mode;
     ctx_image->handle = handle;
     ctx_image->heif_image = NULL;
+    ctx_image->pixels = NULL;
     ctx_image->data = NULL;
     ctx_image->remove_stride = remove_stride;
     ctx_image->hdr_to_16bit = hdr_to_16bit;
     ctx_image->reload_size = reload_size;
+    ctx_image->reduce = 1;
+    memset(ctx_image->region, 0, sizeof(ctx_image->region));
+    ctx_image->decode_threads = -1;
     ctx_image->primary = primary;
     ctx_image->colorspace = colorspace;
     ctx_image->chroma = chroma;
-    ctx_image->file_bytes = file_bytes;
+    ctx_image->file_data = file_data;
     ctx_image->stride = get_stride(ctx_image);
     strcpy(ctx_image->decoder_id, decoder_id);
-    Py_INCREF(file_bytes);
+    Py_INCREF(file_data);
     return (PyObject*)ctx_image;
 }
 
-static PyObject* _CtxImage_size_mode(CtxImageObject* self, void* closure) {
+/* =========== CtxThumbnailImage ======== */
+
+PyObject* _CtxThumbnailImage(CtxImageObject* main_image, heif_item_id thumbnail_id) {
+    struct heif_image_handle* handle;
+    enum heif_colorspace colorspace;
+    enum heif_chroma chroma;
+    if (heif_image_handle_get_thumbnail(main_image->handle, thumbnail_id, &handle).code != heif_error_Ok) {
+        Py_RETURN_NONE;
+    }
+    if (heif_image_handle_get_preferred_decoding_colorspace(handle, &colorspace, &chroma).code != heif_error_Ok) {
+        heif_image_handle_release(handle);
+        Py_RETURN_NONE;
+    }
+    // thumbnails can be coded with padding, with `reload_size` disabled they are cropped to the size from header
+    PyObject* ctx_image = _CtxImage(Py_TYPE(main_image), handle, main_image->hdr_to_8bit,
+                                    main_image->bgr_mode, main_image->remove_stride, main_image->hdr_to_16bit,
+                                    main_image->reload_size, 0, main_image->file_data, main_image->decoder_id,
+                                    colorspace, chroma);
+    if (ctx_image != Py_None)
+        ((CtxImageObject*)ctx_image)->image_type = PhHeifThumbnailImage;
+    return ctx_image;
+}
+
+static PyObject* _CtxImage_size_mode_unlocked(CtxImageObject* self) {
     return Py_BuildValue("(ii)s", self->width, self->height, self->mode);
 }
 
+static PyObject* _CtxImage_size_mode(CtxImageObject* self, void* closure) {
+    lock_image(self);
+    PyObject* result = _CtxImage_size_mode_unlocked(self);
+    PyThread_release_lock(self->lock);
+    return result;
+}
+
 static PyObject* _CtxImage_primary(CtxImageObject* self, void* closure) {
     return Py_BuildValue("i", self->primary);
 }
@@ -928,7 +1497,11 @@ static PyObject* _CtxImage_color_profile(CtxImageObject* self, void* closure) {
             PyErr_SetString(PyExc_OSError, "Out of Memory");
         }
         else {
-            if (!check_error(heif_image_handle_get_raw_color_profile(self->handle, data)))
+            struct heif_error error;
+            Py_BEGIN_ALLOW_THREADS
+            error = heif_image_handle_get_raw_color_profile(self->handle, data);
+            Py_END_ALLOW_THREADS
+            if (!check_error(error))
                 __PyDict_SetItemString(result, "data", PyBytes_FromStringAndSize(data, size));
             else {
                 Py_DECREF(result);
@@ -940,54 +1513,75 @@ static PyObject* _CtxImage_color_profile(CtxImageObject* self, void* closure) {
     return result;
 }
 
+struct ph_metadata_block {
+    const char* type;
+    const char* content_type;
+    size_t size;
+    void* data;                                 // NULL if the block can not be read
+};
+
 static PyObject* _CtxImage_metadata(CtxImageObject* self, void* closure) {
     if (self->image_type == PhHeifImage) {
         PyObject *meta_item_info;
-        const char *type, *content_type;
-        size_t size;
-        void* data;
-        struct heif_error error;
-
-        int n_metas = heif_image_handle_get_number_of_metadata_blocks(self->handle, NULL);
-        if (!n_metas)
-            return PyList_New(0);
-
-        heif_item_id* meta_ids  = (heif_item_id*)malloc(n_metas * sizeof(heif_item_id));
-        if (!meta_ids) {
-            PyErr_SetString(PyExc_OSError, "Out of Memory");
-            return NULL;
+        struct ph_metadata_block* blocks;
+        heif_item_id* meta_ids;
+        int n_metas, out_of_memory = 0;
+
+        // metadata blocks are read without the GIL, Python objects are created after that
+        Py_BEGIN_ALLOW_THREADS
+        n_metas = heif_image_handle_get_number_of_metadata_blocks(self->handle, NULL);
+        meta_ids = (heif_item_id*)malloc((n_metas ? n_metas : 1) * sizeof(heif_item_id));
+        blocks = (struct ph_metadata_block*)calloc(n_metas ? n_metas : 1, sizeof(struct ph_metadata_block));
+        if (!meta_ids || !blocks)
+            out_of_memory = 1;
+        else {
+            n_metas = heif_image_handle_get_list_of_metadata_block_IDs(self->handle, NULL, meta_ids, n_metas);
+            for (int i = 0; i < n_metas; i++) {
+                blocks[i].type = heif_image_handle_get_metadata_type(self->handle, meta_ids[i]);
+                blocks[i].content_type = heif_image_handle_get_metadata_content_type(self->handle, meta_ids[i]);
+                blocks[i].size = heif_image_handle_get_metadata_size(self->handle, meta_ids[i]);
+                blocks[i].data = malloc(blocks[i].size ? blocks[i].size : 1);
+                if (blocks[i].data) {
+                    struct heif_error error = heif_image_handle_get_metadata(self->handle, meta_ids[i], blocks[i].data);
+                    if (error.code != heif_error_Ok) {
+                        free(blocks[i].data);
+                        blocks[i].data = NULL;
+                    }
+                }
+            }
         }
-        n_metas = heif_image_handle_get_list_of_metadata_block_IDs(self->handle, NULL, meta_ids, n_metas);
-        PyObject* meta_list = PyList_New(n_metas);
-        if (!meta_list) {
-            free(meta_ids);
+        free(meta_ids);
+        Py_END_ALLOW_THREADS
+        if (out_of_memory) {
+            free(blocks);
             PyErr_SetString(PyExc_OSError, "Out of Memory");
             return NULL;
         }
 
+        PyObject* meta_list = PyList_New(n_metas);
         for (int i = 0; i < n_metas; i++) {
             meta_item_info = NULL;
-            type = heif_image_handle_get_metadata_type(self->handle, meta_ids[i]);
-            content_type = heif_image_handle_get_metadata_content_type(self->handle, meta_ids[i]);
-            size = heif_image_handle_get_metadata_size(self->handle, meta_ids[i]);
-            data = malloc(size);
-            if (data) {
-                error = heif_image_handle_get_metadata(self->handle, meta_ids[i], data);
-                if (error.code == heif_error_Ok) {
-                    meta_item_info = PyDict_New();
-                    __PyDict_SetItemString(meta_item_info, "type", PyUnicode_FromString(type));
-                    __PyDict_SetItemString(meta_item_info, "content_type", PyUnicode_FromString(content_type));
-                    __PyDict_SetItemString(meta_item_info, "data", PyBytes_FromStringAndSize((char*)data, size));
-                }
-                free(data);
+            if (meta_list && blocks[i].data) {
+                meta_item_info = PyDict_New();
+                __PyDict_SetItemString(meta_item_info, "type", PyUnicode_FromString(blocks[i].type));
+                __PyDict_SetItemString(meta_item_info, "content_type", PyUnicode_FromString(blocks[i].content_type));
+                __PyDict_SetItemString(
+                    meta_item_info, "data", PyBytes_FromStringAndSize((char*)blocks[i].data, blocks[i].size));
             }
+            free(blocks[i].data);
+            if (!meta_list)
+                continue;
             if (!meta_item_info) {
                 meta_item_info = Py_None;
                 Py_INCREF(meta_item_info);
             }
             PyList_SET_ITEM(meta_list, i, meta_item_info);
         }
-        free(meta_ids);
+        free(blocks);
+        if (!meta_list) {
+            PyErr_SetString(PyExc_OSError, "Out of Memory");
+            return NULL;
+        }
         return meta_list;
     }
     else if (self->image_type == PhHeifDepthImage) {
@@ -1053,42 +1647,273 @@ static PyObject* _CtxImage_thumbnails(CtxImageObject* self, void* closure) {
     return images_list;
 }
 
-int decode_image(CtxImageObject* self) {
-    struct heif_error error;
-    int bytes_in_cc;
-    enum heif_colorspace colorspace;
-    enum heif_chroma chroma;
-    enum heif_channel channel;
+#if LIBHEIF_HAVE_VERSION(1,18,0)
+uint32_t read_uint32_be(const uint8_t* p) {
+    return ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) | ((uint32_t)p[2] << 8) | (uint32_t)p[3];
+}
 
-    Py_BEGIN_ALLOW_THREADS
-    struct heif_decoding_options *decode_options = heif_decoding_options_alloc();
-    decode_options->convert_hdr_to_8bit = self->hdr_to_8bit;
-    if (self->n_channels == 1) {
-        channel = heif_channel_Y;
-        colorspace = heif_colorspace_monochrome;
-        chroma = heif_chroma_monochrome;
-    }
-    else {
-        channel = heif_channel_interleaved;
-        colorspace = heif_colorspace_RGB;
-        if ((self->bits == 8) || (self->hdr_to_8bit)) {
-            chroma = self->alpha ? heif_chroma_interleaved_RGBA : heif_chroma_interleaved_RGB;
+// Looks for the box of the `type` among the boxes in [`*data`, `end`). On success moves `*data` to the payload of
+// the box and returns the end of the box, otherwise returns NULL.
+const uint8_t* find_box(const uint8_t** data, const uint8_t* end, uint32_t type) {
+    const uint8_t* p = *data;
+    while (end - p >= 8) {
+        uint64_t size = read_uint32_be(p), header_size = 8;
+        if (size == 1) {
+            if (end - p < 16)
+                return NULL;
+            size = ((uint64_t)read_uint32_be(p + 8) << 32) | read_uint32_be(p + 12);
+            header_size = 16;
         }
-        else {
-            chroma = self->alpha ? heif_chroma_interleaved_RRGGBBAA_LE : heif_chroma_interleaved_RRGGBB_LE;
+        else if (size == 0)
+            size = (uint64_t)(end - p);
+        if ((size < header_size) || (size > (uint64_t)(end - p)))
+            return NULL;
+        if (read_uint32_be(p + 4) == type) {
+            *data = p + header_size;
+            return p + size;
         }
+        p += size;
     }
-    if ((self->bits == 8) || (self->hdr_to_8bit)) {
-        bytes_in_cc = 1;
+    return NULL;
+}
+
+// Returns the type of the item from its `infe` box, 0 if it is not known.
+// `heif_item_get_item_type` is a part of the C API only since libheif 1.19, for older versions the `infe` box is
+// read from the file data. The data is not available for reader objects, their items have an unknown type.
+uint32_t get_item_type(struct heif_context* heif_ctx, heif_item_id item_id, PyObject* file_data) {
+#if LIBHEIF_HAVE_VERSION(1,19,0)
+    return heif_item_get_item_type(heif_ctx, item_id);
+#else
+    const uint8_t *p, *end, *infe_end;
+    if (PyBytes_Check(file_data)) {
+        p = (const uint8_t*)PyBytes_AS_STRING(file_data);
+        end = p + PyBytes_GET_SIZE(file_data);
     }
-    else {
-        bytes_in_cc = 2;
+    else if (PyMemoryView_Check(file_data)) {
+        p = (const uint8_t*)PyMemoryView_GET_BUFFER(file_data)->buf;
+        end = p + PyMemoryView_GET_BUFFER(file_data)->len;
     }
-
-    if (strlen(self->decoder_id) > 0) {
-        decode_options->decoder_id = self->decoder_id;
+    else
+        return 0;
+    // `meta` and `iinf` are full boxes, `iinf` has 16-bit entry count in version 0 and 32-bit one otherwise
+    end = find_box(&p, end, heif_fourcc('m','e','t','a'));
+    if ((!end) || (end - p < 4))
+        return 0;
+    p += 4;
+    end = find_box(&p, end, heif_fourcc('i','i','n','f'));
+    if ((!end) || (end - p < 8))
+        return 0;
+    p += p[0] ? 8 : 6;
+    while ((infe_end = find_box(&p, end, heif_fourcc('i','n','f','e')))) {
+        // `infe` of version 2 has 16-bit item ID and version 3 has 32-bit one, they are followed by 16-bit
+        // protection index and the item type
+        if ((p[0] == 2) && (infe_end - p >= 12) && ((((uint32_t)p[4] << 8) | p[5]) == item_id))
+            return read_uint32_be(p + 8);
+        if ((p[0] == 3) && (infe_end - p >= 14) && (read_uint32_be(p + 4) == item_id))
+            return read_uint32_be(p + 10);
+        p = infe_end;
     }
-    error = heif_decode_image(self->handle, &self->heif_image, colorspace, chroma, decode_options);
+    return 0;
+#endif
+}
+
+// Zero rotations and crops of the right and bottom borders(as written by `encode_grid`) do not move the tiles.
+int is_transformed(struct heif_context* heif_ctx, struct heif_image_handle* handle) {
+    uint32_t properties[16];
+    int left, top, right, bottom;
+    heif_item_id item_id = heif_image_handle_get_item_id(handle);
+    int n_properties = heif_item_get_transformation_properties(heif_ctx, item_id, properties, 16);
+    for (int i = 0; i < n_properties; i++) {
+        int property_type = heif_item_get_property_type(heif_ctx, item_id, properties[i]);
+        if (property_type == (int)heif_fourcc('i','r','o','t')) {
+            if (heif_item_get_property_transform_rotation_ccw(heif_ctx, item_id, properties[i]) != 0)
+                return 1;
+        }
+        else if (property_type == (int)heif_fourcc('c','l','a','p')) {
+            heif_item_get_property_transform_crop_borders(
+                heif_ctx, item_id, properties[i],
+                heif_image_handle_get_ispe_width(handle), heif_image_handle_get_ispe_height(handle),
+                &left, &top, &right, &bottom);
+            if (left || top)
+                return 1;
+        }
+        else
+            return 1;
+    }
+    return 0;
+}
+
+// Returns the number of tiles if the image is a plain grid image(without transformations and alpha) and fills
+// `layout` with columns, rows, tile width and tile height. Otherwise returns 0.
+// On success `tiles_ids` should be released by the caller with `heif_release_item_references`.
+size_t get_grid_layout(CtxImageObject* self, struct heif_context* heif_ctx, heif_item_id** tiles_ids, int* layout) {
+    struct heif_image_handle* tile_handle;
+    heif_item_id item_id = heif_image_handle_get_item_id(self->handle);
+    uint32_t reference_type = 0;
+    size_t n_tiles = 0;
+
+    *tiles_ids = NULL;
+    if ((self->image_type != PhHeifImage) || (heif_image_handle_has_alpha_channel(self->handle)))
+        return 0;
+    if (is_transformed(heif_ctx, self->handle))
+        return 0;
+    // other derived images(e.g. `iovl` overlays) reference their input images in the same way as grids
+    if (get_item_type(heif_ctx, item_id, self->file_data) != heif_fourcc('g','r','i','d'))
+        return 0;
+    for (int i = 0; i < 16; i++) {
+        n_tiles = heif_context_get_item_references(heif_ctx, item_id, i, &reference_type, tiles_ids);
+        if ((reference_type == heif_fourcc('d','i','m','g')) || (!n_tiles))
+            break;
+        heif_release_item_references(heif_ctx, tiles_ids);
+        *tiles_ids = NULL;
+    }
+    if ((reference_type == heif_fourcc('d','i','m','g')) && (n_tiles) && (*tiles_ids) &&
+        (heif_context_get_image_handle(heif_ctx, (*tiles_ids)[0], &tile_handle).code == heif_error_Ok)) {
+        layout[2] = heif_image_handle_get_width(tile_handle);
+        layout[3] = heif_image_handle_get_height(tile_handle);
+        heif_image_handle_release(tile_handle);
+        if ((layout[2] > 0) && (layout[3] > 0)) {
+            layout[0] = (heif_image_handle_get_width(self->handle) + layout[2] - 1) / layout[2];
+            layout[1] = (heif_image_handle_get_height(self->handle) + layout[3] - 1) / layout[3];
+            if ((size_t)(layout[0] * layout[1]) == n_tiles)
+                return n_tiles;
+        }
+    }
+    if (*tiles_ids)
+        heif_release_item_references(heif_ctx, tiles_ids);
+    *tiles_ids = NULL;
+    return 0;
+}
+#endif
+
+// Decodes only the tiles of a grid image that intersect `self->region` into a new image of the region size.
+// Sets `decoded` to 0 when the image is not a plain grid(has transformations, alpha, etc.), the caller then
+// decodes the whole image in the usual way.
+struct heif_error decode_grid_region(CtxImageObject* self, enum heif_colorspace colorspace, enum heif_chroma chroma,
+                                     enum heif_channel channel, int bytes_in_cc,
+                                     const struct heif_decoding_options* decode_options, int* decoded) {
+    struct heif_error error = heif_error_no;
+    *decoded = 0;
+#if LIBHEIF_HAVE_VERSION(1,18,0)
+    struct heif_context* heif_ctx = heif_image_handle_get_context(self->handle);
+    if (!heif_ctx)
+        return error;
+    heif_item_id* tiles_ids;
+    struct heif_image_handle* tile_handle;
+    struct heif_image* tile_image;
+    int layout[4];
+    if (!get_grid_layout(self, heif_ctx, &tiles_ids, layout))
+        goto done;
+    int columns = layout[0], tile_width = layout[2], tile_height = layout[3];
+
+    int left = self->region[0], top = self->region[1], right = self->region[2], bottom = self->region[3];
+    int pixel_size = self->n_channels * bytes_in_cc;
+    int out_stride, tile_stride;
+    error = heif_image_create(right - left, bottom - top, colorspace, chroma, &self->heif_image);
+    if (error.code != heif_error_Ok)
+        goto done;
+    error = heif_image_add_plane(self->heif_image, channel, right - left, bottom - top,
+                                 bytes_in_cc == 1 ? 8 : self->bits);
+    if (error.code != heif_error_Ok)
+        goto done;
+    uint8_t *out_data = heif_image_get_plane(self->heif_image, channel, &out_stride);
+    for (int row = top / tile_height; row <= (bottom - 1) / tile_height; row++) {
+        for (int column = left / tile_width; column <= (right - 1) / tile_width; column++) {
+            error = heif_context_get_image_handle(heif_ctx, tiles_ids[row * columns + column], &tile_handle);
+            if (error.code != heif_error_Ok)
+                goto done;
+            error = heif_decode_image(tile_handle, &tile_image, colorspace, chroma, decode_options);
+            heif_image_handle_release(tile_handle);
+            if (error.code != heif_error_Ok)
+                goto done;
+            int x0 = left > column * tile_width ? left : column * tile_width;
+            int x1 = right < (column + 1) * tile_width ? right : (column + 1) * tile_width;
+            int y0 = top > row * tile_height ? top : row * tile_height;
+            int y1 = bottom < (row + 1) * tile_height ? bottom : (row + 1) * tile_height;
+            uint8_t *tile_data = heif_image_get_plane(tile_image, channel, &tile_stride);
+            if ((!tile_data) ||
+                (heif_image_get_primary_width(tile_image) < x1 - column * tile_width) ||
+                (heif_image_get_primary_height(tile_image) < y1 - row * tile_height)) {
+                heif_image_release(tile_image);
+                error.code = heif_error_Decoder_plugin_error;
+                error.subcode = heif_suberror_Invalid_image_size;
+                error.message = "invalid size of the decoded tile";
+                goto done;
+            }
+            for (int y = y0; y < y1; y++)
+                memcpy(out_data + (y - top) * out_stride + (x0 - left) * pixel_size,
+                       tile_data + (y - row * tile_height) * tile_stride + (x0 - column * tile_width) * pixel_size,
+                       (x1 - x0) * pixel_size);
+            heif_image_release(tile_image);
+        }
+    }
+    *decoded = 1;
+
+done:
+    if ((!*decoded) && (self->heif_image)) {
+        heif_image_release(self->heif_image);
+        self->heif_image = NULL;
+    }
+    if (tiles_ids)
+        heif_release_item_references(heif_ctx, &tiles_ids);
+    heif_context_free(heif_ctx);
+#endif
+    return error;
+}
+
+// Decodes the image into `self->heif_image` without postprocessing, `self->data` points to the first pixel of the
+// image(or region), `plane_stride` and `plane_bytes_in_cc` are set to the values of the decoded plane.
+int decode_image_plane(CtxImageObject* self, int* plane_stride, int* plane_bytes_in_cc) {
+    struct heif_error error;
+    int bytes_in_cc;
+    int region_decoded = 0;
+    enum heif_colorspace colorspace;
+    enum heif_chroma chroma;
+    enum heif_channel channel;
+
+    Py_BEGIN_ALLOW_THREADS
+    struct heif_decoding_options *decode_options = heif_decoding_options_alloc();
+    decode_options->convert_hdr_to_8bit = self->hdr_to_8bit;
+    if (self->n_channels == 1) {
+        channel = heif_channel_Y;
+        colorspace = heif_colorspace_monochrome;
+        chroma = heif_chroma_monochrome;
+    }
+    else {
+        channel = heif_channel_interleaved;
+        colorspace = heif_colorspace_RGB;
+        if ((self->bits == 8) || (self->hdr_to_8bit)) {
+            chroma = (self->n_channels == 4) ? heif_chroma_interleaved_RGBA : heif_chroma_interleaved_RGB;
+        }
+        else {
+            chroma = (self->n_channels == 4) ? heif_chroma_interleaved_RRGGBBAA_LE : heif_chroma_interleaved_RRGGBB_LE;
+        }
+    }
+    if ((self->bits == 8) || (self->hdr_to_8bit)) {
+        bytes_in_cc = 1;
+    }
+    else {
+        bytes_in_cc = 2;
+    }
+
+    if (strlen(self->decoder_id) > 0) {
+        decode_options->decoder_id = self->decoder_id;
+    }
+#if LIBHEIF_HAVE_VERSION(1,18,0)
+    // libheif has only the limit of threads of the context, it is set right before the decoding of this image
+    if (self->decode_threads >= 0) {
+        struct heif_context* heif_ctx = heif_image_handle_get_context(self->handle);
+        if (heif_ctx) {
+            heif_context_set_max_decoding_threads(heif_ctx, self->decode_threads);
+            heif_context_free(heif_ctx);
+        }
+    }
+#endif
+    error = heif_error_no;
+    if (self->region[2] > 0)
+        error = decode_grid_region(self, colorspace, chroma, channel, bytes_in_cc, decode_options, &region_decoded);
+    if ((error.code == heif_error_Ok) && (!region_decoded))
+        error = heif_decode_image(self->handle, &self->heif_image, colorspace, chroma, decode_options);
     heif_decoding_options_free(decode_options);
     Py_END_ALLOW_THREADS
     if (check_error(error))
@@ -1105,13 +1930,32 @@ int decode_image(CtxImageObject* self) {
 
     int decoded_width = heif_image_get_primary_width(self->heif_image);
     int decoded_height = heif_image_get_primary_height(self->heif_image);
-    if (self->reload_size) {
+    if (self->region[2] > 0) {
+        if ((!region_decoded) && ((self->region[2] > decoded_width) || (self->region[3] > decoded_height))) {
+            heif_image_release(self->heif_image);
+            self->heif_image = NULL;
+            self->data = NULL;
+            PyErr_Format(PyExc_ValueError,
+                        "region (%d, %d, %d, %d) is outside of the decoded image (%d, %d)",
+                        self->region[0], self->region[1], self->region[2], self->region[3],
+                        decoded_width, decoded_height);
+            return 0;
+        }
+        if (!region_decoded)
+            self->data += self->region[1] * stride + self->region[0] * self->n_channels * bytes_in_cc;
+        self->width = self->region[2] - self->region[0];
+        self->height = self->region[3] - self->region[1];
+        // region does not start at the beginning of the plane, so its data should always be packed
+        self->remove_stride = 1;
+    }
+    else if (self->reload_size) {
         self->width = decoded_width;
         self->height = decoded_height;
     }
     else if ((self->width > decoded_width) || (self->height > decoded_height)) {
         heif_image_release(self->heif_image);
         self->heif_image = NULL;
+        self->data = NULL;
         PyErr_Format(PyExc_ValueError,
                     "corrupted image(dimensions in header: (%d, %d), decoded dimensions: (%d, %d)). "
                     "Set ALLOW_INCORRECT_HEADERS to True if you need to load them.",
@@ -1119,42 +1963,212 @@ int decode_image(CtxImageObject* self) {
         return 0;
     }
 
+    if (self->reduce > 1) {
+        int reduced_width = (self->width + self->reduce - 1) / self->reduce;
+        int reduced_height = (self->height + self->reduce - 1) / self->reduce;
+        int reduced_stride = reduced_width * self->n_channels * bytes_in_cc;
+        postprocess__reduce(self->width, self->height, self->data, stride, reduced_stride,
+                            bytes_in_cc, self->n_channels, self->reduce,
+                            heif_image_handle_is_premultiplied_alpha(self->handle));
+        self->width = reduced_width;
+        self->height = reduced_height;
+        stride = reduced_stride;
+    }
+    *plane_stride = stride;
+    *plane_bytes_in_cc = bytes_in_cc;
+    return 1;
+}
+
+int get_shift_size(CtxImageObject* self) {
+    return ((self->hdr_to_16bit) && (self->bits > 8) && (!self->hdr_to_8bit)) ? 16 - self->bits : 0;
+}
+
+int decode_image(CtxImageObject* self) {
+    int stride, bytes_in_cc;
+
+    if (!decode_image_plane(self, &stride, &bytes_in_cc))
+        return 0;
+
     self->stride = self->remove_stride ? get_stride(self) : stride;
 
     int remove_stride = ((self->remove_stride) && (self->stride != stride));
-    int shift_size = ((self->hdr_to_16bit) && (self->bits > 8) && (!self->hdr_to_8bit)) ? 16 - self->bits : 0;
+    int shift_size = get_shift_size(self);
 
     if ((self->bgr_mode) && (!remove_stride))
         postprocess__bgr(self->width, self->height, self->data, stride,
                          bytes_in_cc, self->n_channels, shift_size);
     else if ((self->bgr_mode) && (remove_stride))
-        postprocess__bgr_stride(self->width, self->height, self->data, stride, self->stride,
+        postprocess__bgr_stride(self->width, self->height, self->data, self->data, stride, self->stride,
                                 bytes_in_cc, self->n_channels, shift_size);
     else if ((!self->bgr_mode) && (!remove_stride))
         postprocess(self->width, self->height, self->data, stride,
                     bytes_in_cc, self->n_channels, shift_size);
     else if ((!self->bgr_mode) && (remove_stride))
-        postprocess__stride(self->width, self->height, self->data, stride, self->stride,
+        postprocess__stride(self->width, self->height, self->data, self->data, stride, self->stride,
                             bytes_in_cc, self->n_channels, shift_size);
     else {
         PyErr_SetString(PyExc_ValueError, "internal error, invalid postprocess condition");
         return 0;
     }
+
+    CtxBufferObject* pixels = PyObject_New(CtxBufferObject, get_type_state(Py_TYPE(self))->CtxBuffer_Type);
+    if (!pixels) {
+        heif_image_release(self->heif_image);
+        self->heif_image = NULL;
+        self->data = NULL;
+        return 0;
+    }
+    pixels->heif_image = self->heif_image;
+    pixels->data = self->data;
+    pixels->size = (Py_ssize_t)self->stride * self->height;
+    pixels->readonly = 1;
+    self->pixels = (PyObject*)pixels;
+    self->heif_image = NULL;
     return 1;
 }
 
-static PyObject* _CtxImage_stride(CtxImageObject* self, void* closure) {
+static PyObject* _CtxImage_reduce(CtxImageObject* self, void* closure) {
+    return Py_BuildValue("i", self->reduce);
+}
+
+static int _CtxImage_set_reduce_unlocked(CtxImageObject* self, PyObject* value) {
+    if (!value) {
+        PyErr_SetString(PyExc_TypeError, "cannot delete reduce attribute");
+        return -1;
+    }
+    long reduce = PyLong_AsLong(value);
+    if ((reduce == -1) && (PyErr_Occurred()))
+        return -1;
+    if ((reduce < 1) || (reduce > 64)) {
+        PyErr_SetString(PyExc_ValueError, "reduce factor must be in range [1, 64]");
+        return -1;
+    }
+    if (self->data) {
+        PyErr_SetString(PyExc_ValueError, "image is already decoded");
+        return -1;
+    }
+    self->reduce = (int)reduce;
+    return 0;
+}
+
+static int _CtxImage_set_reduce(CtxImageObject* self, PyObject* value, void* closure) {
+    lock_image(self);
+    int result = _CtxImage_set_reduce_unlocked(self, value);
+    PyThread_release_lock(self->lock);
+    return result;
+}
+
+static PyObject* _CtxImage_decode_threads(CtxImageObject* self, void* closure) {
+    return Py_BuildValue("i", self->decode_threads);
+}
+
+static int _CtxImage_set_decode_threads(CtxImageObject* self, PyObject* value, void* closure) {
+    if (!value) {
+        PyErr_SetString(PyExc_TypeError, "cannot delete decode_threads attribute");
+        return -1;
+    }
+    long decode_threads = PyLong_AsLong(value);
+    if ((decode_threads == -1) && (PyErr_Occurred()))
+        return -1;
+    if ((decode_threads < -1) || (decode_threads > INT_MAX)) {
+        PyErr_SetString(PyExc_ValueError, "decode_threads must be a non-negative integer or -1");
+        return -1;
+    }
+    lock_image(self);
+    self->decode_threads = (int)decode_threads;
+    PyThread_release_lock(self->lock);
+    return 0;
+}
+
+static PyObject* _CtxImage_region(CtxImageObject* self, void* closure) {
+    if (self->region[2] == 0)
+        Py_RETURN_NONE;
+    return Py_BuildValue("(iiii)", self->region[0], self->region[1], self->region[2], self->region[3]);
+}
+
+static int _CtxImage_set_region_unlocked(CtxImageObject* self, PyObject* value) {
+    int left, top, right, bottom;
+    if (!value) {
+        PyErr_SetString(PyExc_TypeError, "cannot delete region attribute");
+        return -1;
+    }
+    if (!PyArg_ParseTuple(value, "iiii", &left, &top, &right, &bottom))
+        return -1;
+    if (self->data) {
+        PyErr_SetString(PyExc_ValueError, "image is already decoded");
+        return -1;
+    }
+    if (self->region[2] > 0) {
+        PyErr_SetString(PyExc_ValueError, "region is already set");
+        return -1;
+    }
+    if ((left < 0) || (top < 0) || (right <= left) || (bottom <= top) ||
+        (right > self->width) || (bottom > self->height)) {
+        PyErr_Format(PyExc_ValueError, "invalid region (%d, %d, %d, %d) for image with size (%d, %d)",
+                     left, top, right, bottom, self->width, self->height);
+        return -1;
+    }
+    self->region[0] = left;
+    self->region[1] = top;
+    self->region[2] = right;
+    self->region[3] = bottom;
+    self->width = right - left;
+    self->height = bottom - top;
+    self->stride = get_stride(self);
+    return 0;
+}
+
+static int _CtxImage_set_region(CtxImageObject* self, PyObject* value, void* closure) {
+    lock_image(self);
+    int result = _CtxImage_set_region_unlocked(self, value);
+    PyThread_release_lock(self->lock);
+    return result;
+}
+
+static PyObject* _CtxImage_grid_layout(CtxImageObject* self, void* closure) {
+#if LIBHEIF_HAVE_VERSION(1,18,0)
+    heif_item_id* tiles_ids;
+    int layout[4];
+    struct heif_context* heif_ctx = heif_image_handle_get_context(self->handle);
+    if (!heif_ctx)
+        Py_RETURN_NONE;
+    size_t n_tiles = get_grid_layout(self, heif_ctx, &tiles_ids, layout);
+    if (tiles_ids)
+        heif_release_item_references(heif_ctx, &tiles_ids);
+    heif_context_free(heif_ctx);
+    if (n_tiles)
+        return Py_BuildValue("(iiii)", layout[0], layout[1], layout[2], layout[3]);
+#endif
+    Py_RETURN_NONE;
+}
+
+static PyObject* _CtxImage_stride_unlocked(CtxImageObject* self) {
     if (!self->data)
         if (!decode_image(self))
             return NULL;
     return PyLong_FromSsize_t(self->stride);
 }
 
-static PyObject* _CtxImage_data(CtxImageObject* self, void* closure) {
+static PyObject* _CtxImage_stride(CtxImageObject* self, void* closure) {
+    lock_image(self);
+    PyObject* result = _CtxImage_stride_unlocked(self);
+    PyThread_release_lock(self->lock);
+    return result;
+}
+
+static PyObject* _CtxImage_data_unlocked(CtxImageObject* self) {
     if (!self->data)
         if (!decode_image(self))
             return NULL;
-    return PyMemoryView_FromMemory((char*)self->data, self->stride * self->height, PyBUF_READ);
+    // memoryview keeps decoded data alive, even if the image is unloaded
+    return PyMemoryView_FromObject(self->pixels);
+}
+
+static PyObject* _CtxImage_data(CtxImageObject* self, void* closure) {
+    lock_image(self);
+    PyObject* result = _CtxImage_data_unlocked(self);
+    PyThread_release_lock(self->lock);
+    return result;
 }
 
 static PyObject* _CtxImage_depth_image_list(CtxImageObject* self, void* closure) {
@@ -1176,13 +2190,53 @@ static PyObject* _CtxImage_depth_image_list(CtxImageObject* self, void* closure)
         PyList_SET_ITEM(images_list,
                         i,
                         _CtxDepthImage(
-                            self->handle, images_ids[i], self->remove_stride, self->hdr_to_16bit, self->file_bytes
+                            Py_TYPE(self), self->handle, images_ids[i],
+                            self->remove_stride, self->hdr_to_16bit, self->file_data
                         ));
     }
     free(images_ids);
     return images_list;
 }
 
+static PyObject* _CtxImage_thumbnail_list(CtxImageObject* self, void* closure) {
+    int n_images = heif_image_handle_get_number_of_thumbnails(self->handle);
+    if (n_images == 0)
+        return PyList_New(0);
+    heif_item_id* images_ids = (heif_item_id*)malloc(n_images * sizeof(heif_item_id));
+    if (!images_ids)
+        return PyList_New(0);
+
+    n_images = heif_image_handle_get_list_of_thumbnail_IDs(self->handle, images_ids, n_images);
+    PyObject* images_list = PyList_New(n_images);
+    if (!images_list) {
+        free(images_ids);
+        return PyList_New(0);
+    }
+
+    for (int i = 0; i < n_images; i++) {
+        PyList_SET_ITEM(images_list, i, _CtxThumbnailImage(self, images_ids[i]));
+    }
+    free(images_ids);
+    return images_list;
+}
+
+static PyObject* _CtxImage_clone(CtxImageObject* self) {
+    struct heif_image_handle* handle;
+    struct heif_context* heif_ctx = heif_image_handle_get_context(self->handle);
+    if (!heif_ctx) {
+        PyErr_SetString(PyExc_RuntimeError, "heif_image_handle_get_context failed");
+        return NULL;
+    }
+    struct heif_error error = heif_context_get_image_handle(heif_ctx, heif_image_handle_get_item_id(self->handle),
+                                                            &handle);
+    heif_context_free(heif_ctx);
+    if (check_error(error))
+        return NULL;
+    return _CtxImage(Py_TYPE(self), handle, self->hdr_to_8bit, self->bgr_mode, self->remove_stride,
+                     self->hdr_to_16bit, self->reload_size, self->primary, self->file_data, self->decoder_id,
+                     self->colorspace, self->chroma);
+}
+
 /* =========== CtxImage Experimental Part ======== */
 
 static PyObject* _CtxImage_camera_intrinsic_matrix(CtxImageObject* self, void* closure) {
@@ -1242,14 +2296,231 @@ static struct PyGetSetDef _CtxImage_getseters[] = {
     {"color_profile", (getter)_CtxImage_color_profile, NULL, NULL, NULL},
     {"metadata", (getter)_CtxImage_metadata, NULL, NULL, NULL},
     {"thumbnails", (getter)_CtxImage_thumbnails, NULL, NULL, NULL},
+    {"reduce", (getter)_CtxImage_reduce, (setter)_CtxImage_set_reduce, NULL, NULL},
+    {"region", (getter)_CtxImage_region, (setter)_CtxImage_set_region, NULL, NULL},
+    {"decode_threads", (getter)_CtxImage_decode_threads, (setter)_CtxImage_set_decode_threads, NULL, NULL},
+    {"grid_layout", (getter)_CtxImage_grid_layout, NULL, NULL, NULL},
     {"stride", (getter)_CtxImage_stride, NULL, NULL, NULL},
     {"data", (getter)_CtxImage_data, NULL, NULL, NULL},
     {"depth_image_list", (getter)_CtxImage_depth_image_list, NULL, NULL, NULL},
+    {"thumbnail_list", (getter)_CtxImage_thumbnail_list, NULL, NULL, NULL},
     {"camera_intrinsic_matrix", (getter)_CtxImage_camera_intrinsic_matrix, NULL, NULL, NULL},
     {"camera_extrinsic_matrix_rot", (getter)_CtxImage_camera_extrinsic_matrix_rot, NULL, NULL, NULL},
     {NULL, NULL, NULL, NULL, NULL}
 };
 
+static PyObject* _CtxImage_decode_into_unlocked(CtxImageObject* self, PyObject* args) {
+    /* buffer: writable buffer, stride: int */
+    Py_buffer buffer;
+    int stride_out = 0, stride, bytes_in_cc, row_size, width = self->width, height = self->height, invalid = 0;
+
+    if (!PyArg_ParseTuple(args, "w*|i", &buffer, &stride_out))
+        return NULL;
+
+    int decoded = self->data != NULL;
+    if ((!decoded) && (!decode_image_plane(self, &stride, &bytes_in_cc))) {
+        PyBuffer_Release(&buffer);
+        return NULL;
+    }
+    row_size = get_stride(self);
+    if (stride_out == 0)
+        stride_out = row_size;
+    if ((stride_out < row_size) || (stride_out % (row_size / (self->width * self->n_channels))) ||
+        ((Py_ssize_t)stride_out * (self->height - 1) + row_size > buffer.len)) {
+        PyErr_Format(PyExc_ValueError,
+                     "invalid stride %d or buffer of size %zd is too small for image (%d, %d) with row size %d",
+                     stride_out, buffer.len, self->width, self->height, row_size);
+        invalid = 1;
+    }
+    else if (decoded) {
+        // the image is already decoded and postprocessed, only copy it
+        Py_BEGIN_ALLOW_THREADS
+        for (int i = 0; i < self->height; i++)
+            memcpy((uint8_t*)buffer.buf + (Py_ssize_t)i * stride_out, self->data + (Py_ssize_t)i * self->stride,
+                   row_size);
+        Py_END_ALLOW_THREADS
+    }
+    else if (self->bgr_mode)
+        postprocess__bgr_stride(self->width, self->height, self->data, buffer.buf, stride, stride_out,
+                                bytes_in_cc, self->n_channels, get_shift_size(self));
+    else
+        postprocess__stride(self->width, self->height, self->data, buffer.buf, stride, stride_out,
+                            bytes_in_cc, self->n_channels, get_shift_size(self));
+    PyBuffer_Release(&buffer);
+    if (!decoded) {
+        // pixels are only in the buffer, the image stays not decoded and can be decoded again
+        heif_image_release(self->heif_image);
+        self->heif_image = NULL;
+        self->data = NULL;
+        self->width = width;
+        self->height = height;
+    }
+    if (invalid)
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject* _CtxImage_decode_into(CtxImageObject* self, PyObject* args) {
+    lock_image(self);
+    PyObject* result = _CtxImage_decode_into_unlocked(self, args);
+    PyThread_release_lock(self->lock);
+    return result;
+}
+
+static PyObject* _CtxImage_decode_buffer_unlocked(CtxImageObject* self, PyObject* args) {
+    /* rgbx: int */
+    int rgbx, decoded, width = self->width, height = self->height, n_channels = self->n_channels;
+
+    if (!PyArg_ParseTuple(args, "i", &rgbx))
+        return NULL;
+
+    if (self->data) {
+        PyErr_SetString(PyExc_ValueError, "image is already decoded");
+        return NULL;
+    }
+    // Pillow keeps `RGB` images with 4 bytes per pixel, so such images are decoded with the fourth byte
+    // filled by libheif, and can be used by Pillow without a copy.
+    if ((rgbx) && (n_channels == 3) && (!self->bgr_mode) && ((self->bits == 8) || (self->hdr_to_8bit)))
+        self->n_channels = 4;
+    decoded = decode_image(self);
+    self->n_channels = n_channels;
+    if (!decoded)
+        return NULL;
+
+    // pixels are owned by the buffer object, the image stays not decoded and can be decoded again
+    CtxBufferObject* buffer = (CtxBufferObject*)self->pixels;
+    buffer->readonly = 0;
+    PyObject* result = Py_BuildValue("(N(ii)i)", buffer, self->width, self->height, self->stride);
+    self->pixels = NULL;
+    self->data = NULL;
+    self->width = width;
+    self->height = height;
+    self->stride = get_stride(self);
+    return result;
+}
+
+static PyObject* _CtxImage_decode_buffer(CtxImageObject* self, PyObject* args) {
+    lock_image(self);
+    PyObject* result = _CtxImage_decode_buffer_unlocked(self, args);
+    PyThread_release_lock(self->lock);
+    return result;
+}
+
+static PyObject* _CtxImage_unload(CtxImageObject* self) {
+    // memoryviews returned by `data` keep their own references to the decoded data
+    lock_image(self);
+    PyObject* pixels = self->pixels;
+    self->pixels = NULL;
+    self->data = NULL;
+    self->width = heif_image_handle_get_width(self->handle);
+    self->height = heif_image_handle_get_height(self->handle);
+    self->stride = get_stride(self);
+    PyThread_release_lock(self->lock);
+    Py_XDECREF(pixels);
+    Py_RETURN_NONE;
+}
+
+static struct PyMethodDef _CtxImage_methods[] = {
+    {"clone", (PyCFunction)_CtxImage_clone, METH_NOARGS},
+    {"decode_into", (PyCFunction)_CtxImage_decode_into, METH_VARARGS},
+    {"decode_buffer", (PyCFunction)_CtxImage_decode_buffer, METH_VARARGS},
+    {"unload", (PyCFunction)_CtxImage_unload, METH_NOARGS},
+    {NULL, NULL}
+};
+
+/* =========== CtxBuffer ======== */
+
+static void _CtxBuffer_destructor(CtxBufferObject* self) {
+    if (self->heif_image)
+        heif_image_release(self->heif_image);
+    else
+        free(self->data);
+    ph_object_del((PyObject*)self);
+}
+
+static int _CtxBuffer_getbuffer(CtxBufferObject* self, Py_buffer* view, int flags) {
+    return PyBuffer_FillInfo(view, (PyObject*)self, self->data, self->size, self->readonly, flags);
+}
+
+/* =========== CtxFile ======== */
+
+static void _CtxFile_destructor(CtxFileObject* self) {
+    heif_context_free(self->ctx);
+    Py_DECREF(self->file_data);
+    ph_object_del((PyObject*)self);
+}
+
+static PyObject* _CtxFile_primary_id(CtxFileObject* self, void* closure) {
+    return PyLong_FromUnsignedLong(self->primary_id);
+}
+
+static PyObject* _CtxFile_decode_threads(CtxFileObject* self, void* closure) {
+    return PyLong_FromLong(self->decode_threads);
+}
+
+static PyObject* _CtxFile_item_ids(CtxFileObject* self, void* closure) {
+    int n_images = heif_context_get_number_of_top_level_images(self->ctx);
+    heif_item_id* images_ids = (heif_item_id*)malloc(n_images * sizeof(heif_item_id));
+    if (!images_ids) {
+        PyErr_SetString(PyExc_OSError, "Out of Memory");
+        return NULL;
+    }
+    n_images = heif_context_get_list_of_top_level_image_IDs(self->ctx, images_ids, n_images);
+    PyObject* ids_list = PyList_New(n_images);
+    if (!ids_list) {
+        free(images_ids);
+        return NULL;
+    }
+    for (int i = 0; i < n_images; i++)
+        PyList_SET_ITEM(ids_list, i, PyLong_FromUnsignedLong(images_ids[i]));
+    free(images_ids);
+    return ids_list;
+}
+
+static PyObject* _CtxFile_get_image(CtxFileObject* self, PyObject* args) {
+    /* item_id: int */
+    unsigned long item_id;
+    struct heif_image_handle* handle;
+    enum heif_colorspace colorspace;
+    enum heif_chroma chroma;
+
+    if (!PyArg_ParseTuple(args, "k", &item_id))
+        return NULL;
+
+    struct heif_error error;
+    Py_BEGIN_ALLOW_THREADS
+    error = heif_context_get_image_handle(self->ctx, (heif_item_id)item_id, &handle);
+    if (error.code == heif_error_Ok) {
+        error = heif_image_handle_get_preferred_decoding_colorspace(handle, &colorspace, &chroma);
+        if (error.code != heif_error_Ok)
+            heif_image_handle_release(handle);
+    }
+    Py_END_ALLOW_THREADS
+    if (check_error(error))
+        return NULL;
+    PyObject* ctx_image = _CtxImage(get_type_state(Py_TYPE(self))->CtxImage_Type, handle, self->hdr_to_8bit,
+                                    self->bgr_mode, self->remove_stride, self->hdr_to_16bit, self->reload_size,
+                                    item_id == self->primary_id, self->file_data, self->decoder_id, colorspace, chroma);
+    if (ctx_image == Py_None) {
+        Py_DECREF(ctx_image);
+        PyErr_SetString(PyExc_OSError, "Out of Memory");
+        return NULL;
+    }
+    return ctx_image;
+}
+
+static struct PyGetSetDef _CtxFile_getseters[] = {
+    {"primary_id", (getter)_CtxFile_primary_id, NULL, NULL, NULL},
+    {"item_ids", (getter)_CtxFile_item_ids, NULL, NULL, NULL},
+    {"decode_threads", (getter)_CtxFile_decode_threads, NULL, NULL, NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static struct PyMethodDef _CtxFile_methods[] = {
+    {"get_image", (PyCFunction)_CtxFile_get_image, METH_VARARGS},
+    {NULL, NULL}
+};
+
 /* =========== Functions ======== */
 
 static PyObject* _CtxWrite(PyObject* self, PyObject* args) {
@@ -1288,7 +2559,7 @@ static PyObject* _CtxWrite(PyObject* self, PyObject* args) {
         return NULL;
     }
 
-    CtxWriteObject* ctx_write = PyObject_New(CtxWriteObject, &CtxWrite_Type);
+    CtxWriteObject* ctx_write = PyObject_New(CtxWriteObject, get_module_state(self)->CtxWrite_Type);
     if (!ctx_write) {
         heif_encoder_release(encoder);
         heif_context_free(ctx);
@@ -1304,7 +2575,7 @@ static PyObject* _CtxWrite(PyObject* self, PyObject* args) {
 
 static PyObject* _load_file(PyObject* self, PyObject* args) {
     int hdr_to_8bit, threads_count, bgr_mode, remove_stride, hdr_to_16bit, reload_size;
-    PyObject *heif_bytes;
+    PyObject *heif_bytes, *file_data;
     const char *decoder_id;
 
     if (!PyArg_ParseTuple(args,
@@ -1319,9 +2590,52 @@ static PyObject* _load_file(PyObject* self, PyObject* args) {
                           &decoder_id))
         return NULL;
 
+    // `CtxImage` objects keep reference to `file_data`, as libheif does not copy input data or reads it lazily.
     struct heif_context* heif_ctx = heif_context_alloc();
-    if (check_error(heif_context_read_from_memory_without_copy(
-                        heif_ctx, (void*)PyBytes_AS_STRING(heif_bytes), PyBytes_GET_SIZE(heif_bytes), NULL))) {
+    struct heif_error error;
+    if (PyBytes_Check(heif_bytes)) {
+        file_data = heif_bytes;
+        Py_INCREF(file_data);
+        Py_BEGIN_ALLOW_THREADS
+        error = heif_context_read_from_memory_without_copy(
+            heif_ctx, (void*)PyBytes_AS_STRING(heif_bytes), PyBytes_GET_SIZE(heif_bytes), NULL);
+        Py_END_ALLOW_THREADS
+    }
+    else if (PyObject_CheckBuffer(heif_bytes)) {
+        // memoryview holds the exported buffer(bytearray, mmap, numpy array, etc) while images are alive.
+        file_data = PyMemoryView_FromObject(heif_bytes);
+        if (!file_data) {
+            heif_context_free(heif_ctx);
+            return NULL;
+        }
+        Py_buffer* view = PyMemoryView_GET_BUFFER(file_data);
+        if (!PyBuffer_IsContiguous(view, 'C')) {
+            Py_DECREF(file_data);
+            heif_context_free(heif_ctx);
+            PyErr_SetString(PyExc_ValueError, "input buffer must be C-contiguous");
+            return NULL;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        error = heif_context_read_from_memory_without_copy(heif_ctx, view->buf, view->len, NULL);
+        Py_END_ALLOW_THREADS
+    }
+    else {
+#if PY_VERSION_HEX >= 0x03090000
+        if (PyInterpreterState_Get() != PyInterpreterState_Main()) {
+            heif_context_free(heif_ctx);
+            PyErr_SetString(PyExc_ValueError, "readers are not supported in sub-interpreters");
+            return NULL;
+        }
+#endif
+        file_data = heif_bytes;
+        Py_INCREF(file_data);
+        // reader callbacks acquire the GIL themselves
+        Py_BEGIN_ALLOW_THREADS
+        error = heif_context_read_from_reader(heif_ctx, &ph_reader, file_data, NULL);
+        Py_END_ALLOW_THREADS
+    }
+    if (check_error(error)) {
+        Py_DECREF(file_data);
         heif_context_free(heif_ctx);
         return NULL;
     }
@@ -1330,58 +2644,28 @@ static PyObject* _load_file(PyObject* self, PyObject* args) {
 
     heif_item_id primary_image_id;
     if (check_error(heif_context_get_primary_image_ID(heif_ctx, &primary_image_id))) {
+        Py_DECREF(file_data);
         heif_context_free(heif_ctx);
         return NULL;
     }
 
-    int n_images = heif_context_get_number_of_top_level_images(heif_ctx);
-    heif_item_id* images_ids = (heif_item_id*)malloc(n_images * sizeof(heif_item_id));
-    if (!images_ids) {
+    CtxFileObject* ctx_file = PyObject_New(CtxFileObject, get_module_state(self)->CtxFile_Type);
+    if (!ctx_file) {
+        Py_DECREF(file_data);
         heif_context_free(heif_ctx);
-        PyErr_SetString(PyExc_OSError, "Out of Memory");
         return NULL;
     }
-    n_images = heif_context_get_list_of_top_level_image_IDs(heif_ctx, images_ids, n_images);
-    PyObject* images_list = PyList_New(n_images);
-    if (!images_list) {
-        free(images_ids);
-        heif_context_free(heif_ctx);
-        PyErr_SetString(PyExc_OSError, "Out of Memory");
-        return NULL;
-    }
-
-    enum heif_colorspace colorspace;
-    enum heif_chroma chroma;
-    struct heif_image_handle* handle;
-    struct heif_error error;
-    for (int i = 0; i < n_images; i++) {
-        int primary = 0;
-        if (images_ids[i] == primary_image_id) {
-            error = heif_context_get_primary_image_handle(heif_ctx, &handle);
-            primary = 1;
-        }
-        else
-            error = heif_context_get_image_handle(heif_ctx, images_ids[i], &handle);
-        if (error.code == heif_error_Ok) {
-            error = heif_image_handle_get_preferred_decoding_colorspace(handle, &colorspace, &chroma);
-            if (error.code == heif_error_Ok) {
-                PyList_SET_ITEM(images_list,
-                                i,
-                                _CtxImage(handle, hdr_to_8bit,
-                                    bgr_mode, remove_stride, hdr_to_16bit, reload_size, primary, heif_bytes,
-                                    decoder_id, colorspace, chroma));
-            } else {
-                heif_image_handle_release(handle);
-            }
-        }
-        if (error.code != heif_error_Ok) {
-            Py_INCREF(Py_None);
-            PyList_SET_ITEM(images_list, i, Py_None);
-        }
-    }
-    free(images_ids);
-    heif_context_free(heif_ctx);
-    return images_list;
+    ctx_file->ctx = heif_ctx;
+    ctx_file->primary_id = primary_image_id;
+    ctx_file->decode_threads = threads_count;
+    ctx_file->hdr_to_8bit = hdr_to_8bit;
+    ctx_file->bgr_mode = bgr_mode;
+    ctx_file->remove_stride = remove_stride;
+    ctx_file->hdr_to_16bit = hdr_to_16bit;
+    ctx_file->reload_size = reload_size;
+    snprintf(ctx_file->decoder_id, sizeof(ctx_file->decoder_id), "%s", decoder_id);
+    ctx_file->file_data = file_data;
+    return (PyObject*)ctx_file;
 }
 
 static PyObject* _get_lib_info(PyObject* self) {
@@ -1458,61 +2742,153 @@ static PyMethodDef heifMethods[] = {
     {NULL, NULL}
 };
 
-static PyTypeObject CtxWriteImage_Type = {
-    PyVarObject_HEAD_INIT(NULL, 0)
-    .tp_name = "CtxWriteImage",
-    .tp_basicsize = sizeof(CtxWriteImageObject),
-    .tp_itemsize = 0,
-    .tp_dealloc = (destructor)_CtxWriteImage_destructor,
-    .tp_flags = Py_TPFLAGS_DEFAULT,
-    .tp_methods = _CtxWriteImage_methods,
+static PyType_Slot CtxWriteImage_slots[] = {
+    {Py_tp_dealloc, _CtxWriteImage_destructor},
+    {Py_tp_methods, _CtxWriteImage_methods},
+    {0, NULL},
+};
+
+static PyType_Slot CtxWrite_slots[] = {
+    {Py_tp_dealloc, _CtxWrite_destructor},
+    {Py_tp_methods, _CtxWrite_methods},
+    {0, NULL},
 };
 
-static PyTypeObject CtxWrite_Type = {
-    PyVarObject_HEAD_INIT(NULL, 0)
-    .tp_name = "CtxWrite",
-    .tp_basicsize = sizeof(CtxWriteObject),
-    .tp_itemsize = 0,
-    .tp_dealloc = (destructor)_CtxWrite_destructor,
-    .tp_flags = Py_TPFLAGS_DEFAULT,
-    .tp_methods = _CtxWrite_methods,
+static PyType_Slot CtxImage_slots[] = {
+    {Py_tp_dealloc, _CtxImage_destructor},
+    {Py_tp_getset, _CtxImage_getseters},
+    {Py_tp_methods, _CtxImage_methods},
+    {0, NULL},
 };
 
-static PyTypeObject CtxImage_Type = {
-    PyVarObject_HEAD_INIT(NULL, 0)
-    .tp_name = "CtxImage",
-    .tp_basicsize = sizeof(CtxImageObject),
-    .tp_itemsize = 0,
-    .tp_dealloc = (destructor)_CtxImage_destructor,
-    .tp_flags = Py_TPFLAGS_DEFAULT,
-    .tp_getset = _CtxImage_getseters,
+static PyType_Slot CtxFile_slots[] = {
+    {Py_tp_dealloc, _CtxFile_destructor},
+    {Py_tp_getset, _CtxFile_getseters},
+    {Py_tp_methods, _CtxFile_methods},
+    {0, NULL},
+};
+
+static PyType_Slot CtxBuffer_slots[] = {
+    {Py_tp_dealloc, _CtxBuffer_destructor},
+    {Py_bf_getbuffer, _CtxBuffer_getbuffer},
+    {0, NULL},
+};
+
+// Objects are created only by the module functions and methods, they can not be instantiated from Python.
+#ifdef Py_TPFLAGS_DISALLOW_INSTANTIATION
+#define PH_TYPE_FLAGS (Py_TPFLAGS_DEFAULT | Py_TPFLAGS_DISALLOW_INSTANTIATION)
+#else
+#define PH_TYPE_FLAGS Py_TPFLAGS_DEFAULT
+#endif
+
+static PyType_Spec CtxWriteImage_spec = {
+    "_pillow_heif.CtxWriteImage", sizeof(CtxWriteImageObject), 0, PH_TYPE_FLAGS, CtxWriteImage_slots,
 };
 
-static int setup_module(PyObject* m) {
-    if (PyType_Ready(&CtxWriteImage_Type) < 0)
+static PyType_Spec CtxWrite_spec = {
+    "_pillow_heif.CtxWrite", sizeof(CtxWriteObject), 0, PH_TYPE_FLAGS, CtxWrite_slots,
+};
+
+static PyType_Spec CtxImage_spec = {
+    "_pillow_heif.CtxImage", sizeof(CtxImageObject), 0, PH_TYPE_FLAGS, CtxImage_slots,
+};
+
+static PyType_Spec CtxFile_spec = {
+    "_pillow_heif.CtxFile", sizeof(CtxFileObject), 0, PH_TYPE_FLAGS, CtxFile_slots,
+};
+
+static PyType_Spec CtxBuffer_spec = {
+    "_pillow_heif.CtxBuffer", sizeof(CtxBufferObject), 0, PH_TYPE_FLAGS, CtxBuffer_slots,
+};
+
+static PyTypeObject* create_type(PyObject* m, PyType_Spec* spec) {
+#ifdef PH_TYPE_MODULE_STATE
+    PyTypeObject* type = (PyTypeObject*)PyType_FromModuleAndSpec(m, spec, NULL);
+#else
+    PyTypeObject* type = (PyTypeObject*)PyType_FromSpec(spec);
+#endif
+#ifndef Py_TPFLAGS_DISALLOW_INSTANTIATION
+    if (type)
+        type->tp_new = NULL;
+#endif
+    return type;
+}
+
+static int module_exec(PyObject* m) {
+    ph_module_state* state = get_module_state(m);
+
+    if (!(state->CtxWriteImage_Type = create_type(m, &CtxWriteImage_spec)))
+        return -1;
+
+    if (!(state->CtxWrite_Type = create_type(m, &CtxWrite_spec)))
+        return -1;
+
+    if (!(state->CtxImage_Type = create_type(m, &CtxImage_spec)))
         return -1;
 
-    if (PyType_Ready(&CtxWrite_Type) < 0)
+    if (!(state->CtxBuffer_Type = create_type(m, &CtxBuffer_spec)))
         return -1;
 
-    if (PyType_Ready(&CtxImage_Type) < 0)
+    if (!(state->CtxFile_Type = create_type(m, &CtxFile_spec)))
         return -1;
 
+#ifndef PH_TYPE_MODULE_STATE
+    ph_global_state = state;
+#endif
+    // libheif counts initializations, it is initialized once per process and shared by all interpreters.
     heif_init(NULL);
     return 0;
 }
 
-PyMODINIT_FUNC PyInit__pillow_heif(void) {
-    static PyModuleDef module_def = {
-        PyModuleDef_HEAD_INIT,
-        "_pillow_heif", /* m_name */
-        NULL,           /* m_doc */
-        -1,             /* m_size */
-        heifMethods,    /* m_methods */
-    };
+static int module_traverse(PyObject* m, visitproc visit, void* arg) {
+    ph_module_state* state = get_module_state(m);
+    Py_VISIT(state->CtxWriteImage_Type);
+    Py_VISIT(state->CtxWrite_Type);
+    Py_VISIT(state->CtxImage_Type);
+    Py_VISIT(state->CtxBuffer_Type);
+    Py_VISIT(state->CtxFile_Type);
+    return 0;
+}
 
-    PyObject* m = PyModule_Create(&module_def);
-    if (setup_module(m) < 0)
-        return NULL;
-    return m;
+static int module_clear(PyObject* m) {
+    ph_module_state* state = get_module_state(m);
+    Py_CLEAR(state->CtxWriteImage_Type);
+    Py_CLEAR(state->CtxWrite_Type);
+    Py_CLEAR(state->CtxImage_Type);
+    Py_CLEAR(state->CtxBuffer_Type);
+    Py_CLEAR(state->CtxFile_Type);
+    return 0;
+}
+
+static void module_free(void* m) {
+    module_clear((PyObject*)m);
+}
+
+static PyModuleDef_Slot module_slots[] = {
+    {Py_mod_exec, module_exec},
+#if PY_VERSION_HEX >= 0x030C0000
+    // nothing is shared between interpreters, except libheif itself, which is thread-safe
+    {Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED},
+#endif
+#if PY_VERSION_HEX >= 0x030D0000
+    // decoded state of images is guarded by their locks, everything else is not shared between threads
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL}
+};
+
+static PyModuleDef module_def = {
+    PyModuleDef_HEAD_INIT,
+    "_pillow_heif",             /* m_name */
+    NULL,                       /* m_doc */
+    sizeof(ph_module_state),    /* m_size */
+    heifMethods,                /* m_methods */
+    module_slots,               /* m_slots */
+    module_traverse,            /* m_traverse */
+    module_clear,               /* m_clear */
+    module_free,                /* m_free */
+};
+
+PyMODINIT_FUNC PyInit__pillow_heif(void) {
+    return PyModuleDef_Init(&module_def);
 }
@@ -1,13 +1,15 @@
 """Plugins for the Pillow library."""
 
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from itertools import chain
-from typing import Union
+from typing import Dict, List, Union
 from warnings import warn
 
 from PIL import Image, ImageFile, ImageSequence
 from PIL import __version__ as pil_version
 
 from . import options
+from ._lib_info import _get_lib_info
 from .constants import HeifCompressionFormat
 from .heif import HeifFile
 from .misc import (
@@ -15,19 +17,12 @@ from .misc import (
     _exif_from_pillow,
     _get_bytes,
     _get_orientation_for_encoder,
-    _get_primary_index,
+    _iter_with_primary,
     _pil_to_supported_mode,
     _xmp_from_pillow,
     set_orientation,
 )
 
-try:
-    import _pillow_heif
-except ImportError as ex:
-    from ._deffered_error import DeferredError
-
-    _pillow_heif = DeferredError(ex)
-
 
 class _LibHeifImageFile(ImageFile.ImageFile):
     """Base class with all functionality for ``HeifImageFile`` and ``AvifImageFile`` classes."""
@@ -38,6 +33,10 @@ class _LibHeifImageFile(ImageFile.ImageFile):
 
     def __init__(self, *args, **kwargs):
         self.__frame = 0
+        self.__frame_loaded = False
+        self.__draft_image = None
+        self.__prefetch_executor: Union[ThreadPoolExecutor, None] = None
+        self.__prefetched: Dict[int, Future] = {}
         super().__init__(*args, **kwargs)
 
     def _open(self):
@@ -53,13 +52,24 @@ class _LibHeifImageFile(ImageFile.ImageFile):
         self.tile = []
 
     def load(self):
-        if self._heif_file:
-            frame_heif = self._heif_file[self.tell()]
+        if self._heif_file and not self.__frame_loaded:
+            frame_heif = self.__draft_image or self._heif_file[self.tell()]
             try:
-                data = frame_heif.data  # Size of Image can change during decoding
-                self._size = frame_heif.size  # noqa
-                self.load_prepare()
-                self.frombytes(data, "raw", (frame_heif.mode, frame_heif.stride))
+                # decoded pixels are owned by the Pillow image and are not kept in `frame_heif`
+                prefetched = None if self.__draft_image else self.__prefetched.pop(self.tell(), None)
+                image = prefetched.result() if prefetched else None
+                if image is None:
+                    image = frame_heif._decode_pillow()  # pylint: disable=protected-access
+                if image is not None:
+                    self._size = image.size  # noqa
+                    self.im = image.im
+                else:
+                    data = frame_heif.data  # Size of Image can change during decoding
+                    self._size = frame_heif.size  # noqa
+                    self.load_prepare()
+                    self.frombytes(data, "raw", (frame_heif.mode, frame_heif.stride))
+                self.__frame_loaded = True
+                self.__prefetch(self.tell())
             except EOFError:
                 if not ImageFile.LOAD_TRUNCATED_IMAGES:
                     raise
@@ -72,6 +82,66 @@ class _LibHeifImageFile(ImageFile.ImageFile):
                 self._heif_file = None
         return super().load()
 
+    def __prefetch(self, frame: int) -> None:
+        """Starts decoding of the frames that follow the ``frame`` in background threads."""
+        prefetch_frames = options.PREFETCH_FRAMES
+        if prefetch_frames <= 0 or not self._heif_file:
+            return
+        next_frames = range(frame + 1, min(frame + 1 + prefetch_frames, len(self._heif_file)))
+        for i in [i for i in self.__prefetched if i not in next_frames]:
+            self.__prefetched.pop(i).cancel()
+        if self.__prefetch_executor is None:
+            self.__prefetch_executor = ThreadPoolExecutor(max_workers=prefetch_frames)
+        for i in next_frames:
+            if i not in self.__prefetched:
+                # pylint: disable=protected-access
+                self.__prefetched[i] = self.__prefetch_executor.submit(self._heif_file[i]._decode_pillow)
+
+    def close(self):
+        self.__stop_prefetch()
+        super().close()
+
+    def __exit__(self, *args):
+        # Pillow closes only `fp` here, not calling `close`
+        self.__stop_prefetch()
+        super().__exit__(*args)
+
+    def __stop_prefetch(self) -> None:
+        """Cancels decoding of the prefetched frames and shuts down the threads of it."""
+        if self.__prefetch_executor is not None:
+            for future in self.__prefetched.values():
+                future.cancel()
+            self.__prefetched = {}
+            self.__prefetch_executor.shutdown(wait=False)
+            self.__prefetch_executor = None
+
+    def draft(self, mode, size):
+        if not self._heif_file or not size or self.__draft_image or self.__frame_loaded:
+            return None
+        prefetched = self.__prefetched.pop(self.tell(), None)
+        if prefetched is not None and not prefetched.cancel():
+            # the frame will be decoded again with the draft parameters
+            wait([prefetched])
+        frame_heif = self._heif_file[self.tell()]
+        if frame_heif._data:  # pylint: disable=protected-access
+            return None
+        thumbnails = [
+            i
+            for i in frame_heif.thumbnails
+            if i.mode == frame_heif.mode and i.size[0] >= size[0] and i.size[1] >= size[1]
+        ]
+        if thumbnails:
+            # smallest embedded thumbnail that is big enough, decoding it is much cheaper than decoding of the image
+            self.__draft_image = min(thumbnails, key=lambda x: x.size[0] * x.size[1])
+            result = self.__draft_image.draft(mode, size)
+            if result is None:
+                result = self.__draft_image.mode, (0, 0, *self.__draft_image.size)
+            self._size = self.__draft_image.size  # noqa
+            return result
+        result = frame_heif.draft(mode, size)
+        self._size = frame_heif.size  # noqa
+        return result
+
     if pil_version[:4] in ("10.1", "10.2", "10.3"):
 
         def getxmp(self) -> dict:
@@ -89,6 +159,8 @@ class _LibHeifImageFile(ImageFile.ImageFile):
         if not self._seek_check(frame):
             return
         self.__frame = frame
+        self.__frame_loaded = False
+        self.__draft_image = None
         self._init_from_heif_file(frame)
         _exif = getattr(self, "_exif", None)  # Pillow 9.2+ do no reload exif between frames.
         if _exif is not None and getattr(_exif, "_loaded", None):
@@ -155,7 +227,7 @@ def register_heif_opener(**kwargs) -> None:
     """
     __options_update(**kwargs)
     Image.register_open(HeifImageFile.format, HeifImageFile, _is_supported_heif)
-    if _pillow_heif.get_lib_info()["HEIF"]:
+    if _get_lib_info()["HEIF"]:
         Image.register_save(HeifImageFile.format, _save_heif)
         Image.register_save_all(HeifImageFile.format, _save_all_heif)
     extensions = [".heic", ".heics", ".heif", ".heifs", ".hif"]
@@ -196,7 +268,7 @@ def register_avif_opener(**kwargs) -> None:
 
     :param kwargs: dictionary with values to set in options. See: :ref:`options`.
     """
-    if not _pillow_heif.get_lib_info()["AVIF"]:
+    if not _get_lib_info()["AVIF"]:
         warn("This version of `pillow-heif` was built without AVIF support.", stacklevel=1)
         return
     __options_update(**kwargs)
@@ -222,6 +294,12 @@ def __options_update(**kwargs):
             options.SAVE_HDR_TO_12_BIT = v
         elif k == "decode_threads":
             options.DECODE_THREADS = v
+        elif k == "threads_budget":
+            options.THREADS_BUDGET = v
+        elif k == "prefetch_frames":
+            options.PREFETCH_FRAMES = v
+        elif k == "encoder_pool_size":
+            options.ENCODER_POOL_SIZE = v
         elif k == "allow_incorrect_headers":
             options.ALLOW_INCORRECT_HEADERS = v
         elif k == "save_nclx_profile":
@@ -244,16 +322,30 @@ def __save_all(im, fp, compression_format: HeifCompressionFormat):
     ctx_write = CtxEncode(compression_format, **im.encoderinfo)
     current_frame = im.tell() if hasattr(im, "tell") else None
     append_images = im.encoderinfo.get("append_images", [])
-    primary_index = _get_primary_index(
-        chain(ImageSequence.Iterator(im), append_images), im.encoderinfo.get("primary_index", None)
-    )
-    for i, frame in enumerate(chain(ImageSequence.Iterator(im), append_images)):
-        _pil_encode_image(ctx_write, frame, i == primary_index, **im.encoderinfo)
+    # frames are decoded, encoded and released one by one, `append_images` can be a generator
+    primary_attrs = __get_primary_attrs(im)
+    frames_count = None
+    if isinstance(append_images, (list, tuple)):
+        primary_attrs += [i.info.get("primary", False) for i in append_images]
+        frames_count = len(primary_attrs)
+    frames = chain(ImageSequence.Iterator(im), append_images)
+    primary_index = im.encoderinfo.get("primary_index", None)
+    for frame, primary in _iter_with_primary(frames, primary_index, primary_attrs, frames_count):
+        _pil_encode_image(ctx_write, frame, primary, **im.encoderinfo)
     if current_frame is not None and hasattr(im, "seek"):
         im.seek(current_frame)
     ctx_write.save(fp)
 
 
+def __get_primary_attrs(im) -> List[bool]:
+    """Returns which frames of ``im`` are primary, frames that are not known without seeking are not marked."""
+    heif_file = im._heif_file if isinstance(im, _LibHeifImageFile) else None  # pylint: disable=protected-access
+    if heif_file is not None:
+        return heif_file._get_primary_attrs()  # pylint: disable=protected-access
+    n_frames = getattr(im, "n_frames", 1)
+    return [im.info.get("primary", False)] if n_frames == 1 else [False] * n_frames
+
+
 def _pil_encode_image(ctx: CtxEncode, img: Image.Image, primary: bool, **kwargs) -> None:
     if img.size[0] <= 0 or img.size[1] <= 0:
         raise ValueError("Empty images are not supported.")
@@ -0,0 +1,136 @@
+"""Executor with priorities and functions to decode many images in parallel."""
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Deque, Iterable, Iterator, Optional, Union
+
+from . import options
+from ._executor import _PriorityExecutor, _run_async
+from .heif import HeifFile, open_heif
+from .image import BaseImage, HeifImage
+
+
+class HeifExecutor(_PriorityExecutor):
+    """Pool of threads that decodes and encodes images in the order of their priority.
+
+    Tasks are submitted with one of the priority classes: ``"high"``, ``"normal"`` or ``"low"``.
+    Queued tasks with a higher priority are started first. Low priority tasks never take the last worker,
+    so a high priority task is not waiting for them, when there is more than one worker.
+
+    The number of ``libheif`` and encoder threads of a task depends on its priority:
+    high priority tasks get as many threads as they request and :py:attr:`~pillow_heif.options.THREADS_BUDGET`
+    allows, normal priority tasks get the equal share of the budget per worker, low priority tasks get one thread.
+
+    :param workers: number of tasks running at the same time. Default = number of CPU cores.
+    """
+
+    def open_heif(self, fp, priority: str = "normal", **kwargs) -> Future:
+        """Schedules :py:func:`~pillow_heif.open_heif` with the given priority.
+
+        :returns: :py:class:`concurrent.futures.Future` with the :py:class:`~pillow_heif.HeifFile` object.
+        """
+        return self.submit(open_heif, fp, priority=priority, **kwargs)
+
+    def load(self, image: Union[BaseImage, HeifFile], priority: str = "normal") -> Future:
+        """Schedules decoding of the image or of all images of the :py:class:`~pillow_heif.HeifFile`.
+
+        :returns: :py:class:`concurrent.futures.Future` with the decoded ``image``.
+        """
+        return self.submit(_load_image, image, priority=priority)
+
+    def save(self, heif_file: HeifFile, fp, priority: str = "normal", **kwargs) -> Future:
+        """Schedules :py:meth:`~pillow_heif.HeifFile.save` with the given priority.
+
+        :returns: :py:class:`concurrent.futures.Future` with the result of ``save``.
+        """
+        return self.submit(heif_file.save, fp, priority=priority, **kwargs)
+
+
+async def aopen_heif(
+    fp, convert_hdr_to_8bit=True, bgr_mode=False, executor=None, priority: str = "normal", **kwargs
+) -> HeifFile:
+    """Coroutine version of :py:func:`~pillow_heif.open_heif`, the file is read and parsed in the ``executor``.
+
+    The event loop thread is never blocked: the running operations are limited by the workers of the ``executor``
+    and :py:attr:`~pillow_heif.options.THREADS_BUDGET`. An event loop submits to the ``executor`` no more operations
+    of each priority class than the ``executor`` has workers, the other coroutines wait before submitting them.
+
+    .. note:: Cancellation of the coroutine removes the operation from the queue, operations that are already
+        running are finished in the ``executor``.
+
+    :param fp: See parameter ``fp`` in :func:`is_supported`.
+    :param convert_hdr_to_8bit: See :py:func:`~pillow_heif.open_heif`.
+    :param bgr_mode: See :py:func:`~pillow_heif.open_heif`.
+    :param executor: :py:class:`~pillow_heif.HeifExecutor` or any :py:class:`concurrent.futures.Executor`.
+        Default = shared executor with a worker per CPU core, with the same priorities as in ``HeifExecutor``.
+    :param priority: priority class, when ``executor`` is a :py:class:`~pillow_heif.HeifExecutor`.
+    :param kwargs: See :py:func:`~pillow_heif.open_heif`.
+
+    :returns: :py:class:`~pillow_heif.HeifFile` object.
+    """
+    return await _run_async(executor, priority, open_heif, fp, convert_hdr_to_8bit, bgr_mode, **kwargs)
+
+
+def decode_many(
+    sources: Iterable, workers: Optional[int] = None, ordered: bool = True, **kwargs
+) -> Iterator[HeifImage]:
+    """Opens and decodes the primary images of many files in a pool of threads.
+
+    Decoding releases the GIL, so files are decoded in parallel. The number of workers and the number of
+    ``libheif`` threads per image are chosen together, so that the CPU cores are used without oversubscription.
+
+    .. note:: :py:class:`~pillow_heif.HeifImage` supports the array interface: use ``numpy.asarray(image)``
+        to get a numpy array without copying.
+
+    :param sources: iterable with anything that :py:func:`~pillow_heif.open_heif` accepts.
+    :param workers: number of images decoded at the same time. Default = number of CPU cores.
+    :param ordered: yield images in the order of ``sources``, otherwise in the order they are decoded.
+    :param kwargs: parameters for :py:func:`~pillow_heif.open_heif`. When **decode_threads** is not specified,
+        it is ``number of CPU cores // workers``, but not bigger than :py:attr:`~pillow_heif.options.DECODE_THREADS`
+
+    :returns: generator of loaded :py:class:`~pillow_heif.HeifImage` objects.
+    """
+    cpu_count = os.cpu_count() or 1
+    workers = workers or cpu_count
+    if workers <= 0:
+        raise ValueError("`workers` must be a positive integer.")
+    kwargs.setdefault("decode_threads", max(1, min(options.DECODE_THREADS, cpu_count // workers)))
+    pending: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for fp in sources:
+                pending.append(executor.submit(_decode_primary, fp, **kwargs))
+                # keep the number of decoded but not consumed images bounded
+                while len(pending) >= 2 * workers:
+                    yield from _pop_decoded(pending, ordered)
+            while pending:
+                yield from _pop_decoded(pending, ordered)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _decode_primary(fp, **kwargs) -> HeifImage:
+    heif_file = open_heif(fp, **{"primary_only": True, **kwargs})
+    image = heif_file[heif_file.primary_index]
+    image.load()
+    return image
+
+
+def _pop_decoded(pending: Deque[Future], ordered: bool) -> Iterator[HeifImage]:
+    if ordered:
+        yield pending.popleft().result()
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in [i for i in pending if i in done]:
+        pending.remove(future)
+        yield future.result()
+
+
+def _load_image(image: Union[BaseImage, HeifFile]) -> Union[BaseImage, HeifFile]:
+    if isinstance(image, HeifFile):
+        image.load_all(workers=1)
+    else:
+        image.load()
+    return image
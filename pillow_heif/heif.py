@@ -1,29 +1,41 @@
 """Functions and classes for heif images to read and write."""
 
+import os
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import copy, deepcopy
+from dataclasses import dataclass
 from io import SEEK_SET
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import chain, islice
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Union
 
 from PIL import Image
 
 from . import options
+from ._executor import _DecodedImages, _run_async
+from ._lib_info import _get_lib_info
 from .constants import HeifCompressionFormat
+from .image import (  # noqa: F401 pylint: disable=unused-import
+    BaseImage,  # the image classes were defined in this module before, they are still importable from it
+    HeifDepthImage,
+    HeifImage,
+    HeifThumbnailImage,
+)
 from .misc import (
-    MODE_INFO,
     CtxEncode,
     MimCImage,
+    RangeReader,
     _exif_from_pillow,
     _get_bytes,
-    _get_heif_meta,
+    _get_data,
     _get_orientation_for_encoder,
-    _get_primary_index,
+    _iter_with_primary,
     _pil_to_supported_mode,
-    _retrieve_exif,
-    _retrieve_xmp,
     _rotate_pil,
     _xmp_from_pillow,
     get_file_mimetype,
-    save_colorspace_chroma,
     set_orientation,
 )
 
@@ -35,178 +47,6 @@ except ImportError as ex:
     _pillow_heif = DeferredError(ex)
 
 
-class BaseImage:
-    """Base class for :py:class:`HeifImage` and :py:class:`HeifDepthImage`."""
-
-    size: tuple
-    """Width and height of the image."""
-
-    mode: str
-    """A string which defines the type and depth of a pixel in the image:
-    `Pillow Modes <https://pillow.readthedocs.io/en/stable/handbook/concepts.html#modes>`_
-
-    For currently supported modes by Pillow-Heif see :ref:`image-modes`."""
-
-    def __init__(self, c_image):
-        self.size, self.mode = c_image.size_mode
-        self._c_image = c_image
-        self._data = None
-
-    @property
-    def data(self):
-        """Decodes image and returns image data.
-
-        :returns: ``bytes`` of the decoded image.
-        """
-        self.load()
-        return self._data
-
-    @property
-    def stride(self) -> int:
-        """Stride of the image.
-
-        .. note:: from `0.10.0` version this value always will have width * sizeof pixel in default usage mode.
-
-        :returns: An Int value indicating the image stride after decoding.
-        """
-        self.load()
-        return self._c_image.stride
-
-    @property
-    def __array_interface__(self):
-        """Numpy array interface support."""
-        self.load()
-        width = int(self.stride / MODE_INFO[self.mode][0])
-        if MODE_INFO[self.mode][1] <= 8:
-            typestr = "|u1"
-        else:
-            width = int(width / 2)
-            typestr = "<u2"
-        shape: Tuple[Any, ...] = (self.size[1], width)
-        if MODE_INFO[self.mode][0] > 1:
-            shape += (MODE_INFO[self.mode][0],)
-        return {"shape": shape, "typestr": typestr, "version": 3, "data": self.data}
-
-    def to_pillow(self) -> Image.Image:
-        """Helper method to create :external:py:class:`~PIL.Image.Image` class.
-
-        :returns: :external:py:class:`~PIL.Image.Image` class created from an image.
-        """
-        self.load()
-        return Image.frombytes(
-            self.mode,  # noqa
-            self.size,
-            self.data,
-            "raw",
-            self.mode,
-            self.stride,
-        )
-
-    def load(self) -> None:
-        """Method to decode image.
-
-        .. note:: In normal cases, you should not call this method directly,
-            when reading `data` or `stride` property of image will be loaded automatically.
-        """
-        if not self._data:
-            self._data = self._c_image.data
-            self.size, _ = self._c_image.size_mode
-
-
-class HeifDepthImage(BaseImage):
-    """Class representing the depth image associated with the :py:class:`~pillow_heif.HeifImage` class."""
-
-    def __init__(self, c_image):
-        super().__init__(c_image)
-        _metadata: dict = c_image.metadata
-        self.info = {
-            "metadata": _metadata,
-        }
-        save_colorspace_chroma(c_image, self.info)
-
-    def __repr__(self):
-        _bytes = f"{len(self.data)} bytes" if self._data or isinstance(self._c_image, MimCImage) else "no"
-        return f"<{self.__class__.__name__} {self.size[0]}x{self.size[1]} {self.mode}>"
-
-    def to_pillow(self) -> Image.Image:
-        """Helper method to create :external:py:class:`~PIL.Image.Image` class.
-
-        :returns: :external:py:class:`~PIL.Image.Image` class created from an image.
-        """
-        image = super().to_pillow()
-        image.info = self.info.copy()
-        return image
-
-
-class HeifImage(BaseImage):
-    """One image in a :py:class:`~pillow_heif.HeifFile` container."""
-
-    def __init__(self, c_image):
-        super().__init__(c_image)
-        _metadata: List[dict] = c_image.metadata
-        _exif = _retrieve_exif(_metadata)
-        _xmp = _retrieve_xmp(_metadata)
-        _thumbnails: List[Optional[int]] = (
-            [i for i in c_image.thumbnails if i is not None] if options.THUMBNAILS else []
-        )
-        _depth_images: List[Optional[HeifDepthImage]] = (
-            [HeifDepthImage(i) for i in c_image.depth_image_list if i is not None] if options.DEPTH_IMAGES else []
-        )
-        _heif_meta = _get_heif_meta(c_image)
-        self.info = {
-            "primary": bool(c_image.primary),
-            "bit_depth": int(c_image.bit_depth),
-            "exif": _exif,
-            "metadata": _metadata,
-            "thumbnails": _thumbnails,
-            "depth_images": _depth_images,
-        }
-        if _xmp:
-            self.info["xmp"] = _xmp
-        if _heif_meta:
-            self.info["heif"] = _heif_meta
-        save_colorspace_chroma(c_image, self.info)
-        _color_profile: Dict[str, Any] = c_image.color_profile
-        if _color_profile:
-            if _color_profile["type"] in ("rICC", "prof"):
-                self.info["icc_profile"] = _color_profile["data"]
-                self.info["icc_profile_type"] = _color_profile["type"]
-            else:
-                self.info["nclx_profile"] = _color_profile["data"]
-
-    def __repr__(self):
-        _bytes = f"{len(self.data)} bytes" if self._data or isinstance(self._c_image, MimCImage) else "no"
-        return (
-            f"<{self.__class__.__name__} {self.size[0]}x{self.size[1]} {self.mode} "
-            f"with {_bytes} image data and {len(self.info.get('thumbnails', []))} thumbnails>"
-        )
-
-    @property
-    def has_alpha(self) -> bool:
-        """``True`` for images with the ``alpha`` channel, ``False`` otherwise."""
-        return self.mode.split(sep=";")[0][-1] in ("A", "a")
-
-    @property
-    def premultiplied_alpha(self) -> bool:
-        """``True`` for images with ``premultiplied alpha`` channel, ``False`` otherwise."""
-        return bool(self.mode.split(sep=";")[0][-1] == "a")
-
-    @premultiplied_alpha.setter
-    def premultiplied_alpha(self, value: bool):
-        if self.has_alpha:
-            self.mode = self.mode.replace("A" if value else "a", "a" if value else "A")
-
-    def to_pillow(self) -> Image.Image:
-        """Helper method to create :external:py:class:`~PIL.Image.Image` class.
-
-        :returns: :external:py:class:`~PIL.Image.Image` class created from an image.
-        """
-        image = super().to_pillow()
-        image.info = self.info.copy()
-        image.info["original_orientation"] = set_orientation(image.info)
-        return image
-
-
 class HeifFile:
     """Representation of the :py:class:`~pillow_heif.HeifImage` classes container.
 
@@ -222,37 +62,36 @@ class HeifFile:
     """
 
     def __init__(self, fp=None, convert_hdr_to_8bit=True, bgr_mode=False, **kwargs):
+        if callable(fp):
+            fp = RangeReader(fp)
         if hasattr(fp, "seek"):
             fp.seek(0, SEEK_SET)
 
+        self._ctx_file = None
+        # IDs of the images in the file, `None` for the added images
+        self._item_ids: List[Optional[int]] = []
         if fp is None:
-            images = []
             mimetype = ""
         else:
-            fp_bytes = _get_bytes(fp)
-            mimetype = get_file_mimetype(fp_bytes)
-            if mimetype.find("avif") != -1:
-                preferred_decoder = options.PREFERRED_DECODER.get("AVIF", "")
-            elif mimetype.find("heic") != -1 or mimetype.find("heif") != -1:
-                preferred_decoder = options.PREFERRED_DECODER.get("HEIF", "")
-            else:
-                preferred_decoder = ""
-            images = _pillow_heif.load_file(
-                fp_bytes,
-                options.DECODE_THREADS,
-                convert_hdr_to_8bit,
-                bgr_mode,
-                kwargs.get("remove_stride", True),
-                kwargs.get("hdr_to_16bit", True),
-                kwargs.get("reload_size", options.ALLOW_INCORRECT_HEADERS),
-                preferred_decoder,
-            )
+            mimetype, _, self._ctx_file = _load_file(fp, convert_hdr_to_8bit, bgr_mode, **kwargs)
+            self._item_ids = _select_item_ids(self._ctx_file, **kwargs)
         self.mimetype = mimetype
-        self._images: List[HeifImage] = [HeifImage(i) for i in images if i is not None]
+        # images are created on the first access
+        self._images: List[Optional[HeifImage]] = [None] * len(self._item_ids)
+        self._images_lock = threading.Lock()
+        self._index_by_id: Optional[Dict[int, int]] = None
+        self._read_options = (options.THUMBNAILS, options.DEPTH_IMAGES)
+        self._prefetch_frames: int = kwargs.get("prefetch_frames", options.PREFETCH_FRAMES)
+        self._decoded_images: Optional[_DecodedImages] = None
+        if kwargs.get("max_decoded_images", 0) or kwargs.get("max_decoded_bytes", 0) or kwargs.get("low_memory"):
+            self._decoded_images = _DecodedImages(
+                kwargs.get("max_decoded_images", 0),
+                kwargs.get("max_decoded_bytes", 0),
+                weakref.ref(self) if kwargs.get("low_memory") else None,
+            )
         self.primary_index = 0
-        for index, _ in enumerate(self._images):
-            if _.info.get("primary", False):
-                self.primary_index = index
+        if self._ctx_file is not None and self._ctx_file.primary_id in self._item_ids:
+            self.primary_index = self._item_ids.index(self._ctx_file.primary_id)
 
     @property
     def size(self):
@@ -260,7 +99,7 @@ class HeifFile:
 
         :exception IndexError: If there are no images.
         """
-        return self._images[self.primary_index].size
+        return self._get_image(self.primary_index).size
 
     @property
     def mode(self):
@@ -268,7 +107,7 @@ class HeifFile:
 
         :exception IndexError: If there are no images.
         """
-        return self._images[self.primary_index].mode
+        return self._get_image(self.primary_index).mode
 
     @property
     def has_alpha(self):
@@ -276,7 +115,7 @@ class HeifFile:
 
         :exception IndexError: If there are no images.
         """
-        return self._images[self.primary_index].has_alpha
+        return self._get_image(self.primary_index).has_alpha
 
     @property
     def premultiplied_alpha(self):
@@ -284,11 +123,11 @@ class HeifFile:
 
         :exception IndexError: If there are no images.
         """
-        return self._images[self.primary_index].premultiplied_alpha
+        return self._get_image(self.primary_index).premultiplied_alpha
 
     @premultiplied_alpha.setter
     def premultiplied_alpha(self, value: bool):
-        self._images[self.primary_index].premultiplied_alpha = value
+        self._get_image(self.primary_index).premultiplied_alpha = value
 
     @property
     def data(self):
@@ -296,7 +135,7 @@ class HeifFile:
 
         :exception IndexError: If there are no images.
         """
-        return self._images[self.primary_index].data
+        return self._get_image(self.primary_index).data
 
     @property
     def stride(self):
@@ -304,7 +143,7 @@ class HeifFile:
 
         :exception IndexError: If there are no images.
         """
-        return self._images[self.primary_index].stride
+        return self._get_image(self.primary_index).stride
 
     @property
     def info(self):
@@ -312,16 +151,16 @@ class HeifFile:
 
         :exception IndexError: If there are no images.
         """
-        return self._images[self.primary_index].info
+        return self._get_image(self.primary_index).info
 
     def to_pillow(self) -> Image.Image:
         """Helper method to create Pillow :external:py:class:`~PIL.Image.Image`.
 
         :returns: :external:py:class:`~PIL.Image.Image` class created from the primary image.
         """
-        return self._images[self.primary_index].to_pillow()
+        return self._get_image(self.primary_index).to_pillow()
 
-    def save(self, fp, **kwargs) -> None:
+    def save(self, fp, **kwargs) -> Union[bytes, memoryview, None]:
         """Saves image(s) under the given fp.
 
         Keyword options can be used to provide additional instructions to the writer.
@@ -331,7 +170,8 @@ class HeifFile:
             ``save_all`` - boolean. Should all images from ``HeiFile`` be saved?
             (default = ``True``)
 
-            ``append_images`` - do the same as in Pillow. Accepts the list of ``HeifImage``
+            ``append_images`` - do the same as in Pillow. Accepts the list or any iterable(e.g. generator)
+            of ``HeifImage``. Images are decoded, encoded and released one by one.
 
             .. note:: Appended images always will have ``info["primary"]=False``
 
@@ -362,9 +202,36 @@ class HeifFile:
 
             ``full_range_flag`` - nclx profile: full range flag, default: 1
 
-        :param fp: A filename (string), pathlib.Path object or an object with `write` method.
+            ``tile_size`` - ``int`` or tuple with ``width`` and ``height``. Images bigger than a tile are encoded
+            as grid images from tiles of this size. Thumbnails are not generated for the grid images.
+            The image is copied to the tiles, which are encoded one after another when all of them are ready,
+            so saving needs about the size of the raw image of additional memory.
+
+            ``as_memoryview`` - boolean, when ``fp`` is ``None`` return a read-only ``memoryview`` instead
+            of ``bytes``, without an extra copy of the encoded data.
+
+        :param fp: A filename (string), pathlib.Path object, an object with `write` method or ``None``.
+            Encoded data is passed to `write` in chunks, without creating a ``bytes`` object with the whole file.
+
+        :returns: ``None``, or the encoded data if ``fp`` is ``None``.
         """
-        _encode_images(self._images, fp, **kwargs)
+        return _encode_images([self._get_image(i) for i in range(len(self))], fp, **kwargs)
+
+    async def asave(self, fp, executor=None, priority: str = "normal", **kwargs) -> Union[bytes, memoryview, None]:
+        """Coroutine version of :py:meth:`save`, images are encoded in the ``executor``.
+
+        .. note:: Images are decoded and encoded in the ``executor`` too, when they were not decoded before.
+
+        For the ``executor`` and ``priority`` parameters see :py:meth:`~pillow_heif.HeifImage.aload`.
+        """
+        return await _run_async(executor, priority, self.save, fp, **kwargs)
+
+    async def aload(self, executor=None, priority: str = "normal") -> None:
+        """Coroutine version of :py:meth:`load_all`, images are decoded one by one in the ``executor``.
+
+        For the ``executor`` and ``priority`` parameters see :py:meth:`~pillow_heif.HeifImage.aload`.
+        """
+        await _run_async(executor, priority, self.load_all, 1)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} with {len(self)} images: {[str(i) for i in self]}>"
@@ -373,17 +240,120 @@ class HeifFile:
         return len(self._images)
 
     def __iter__(self):
-        yield from self._images
+        if self._prefetch_frames <= 0 or self._ctx_file is None:
+            for index in range(len(self._images)):
+                yield self._get_image(index)
+            return
+        # the next images are decoded in background threads, while the current one is consumed
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=self._prefetch_frames) as executor:
+            try:
+                next_index = 0
+                for index in range(len(self._images)):
+                    while next_index < len(self._images) and next_index <= index + self._prefetch_frames:
+                        pending.append(executor.submit(self._get_image(next_index).load))
+                        next_index += 1
+                    pending.popleft().result()
+                    yield self._get_image(index)
+            finally:
+                for future in pending:
+                    future.cancel()
 
     def __getitem__(self, index):
         if index < 0 or index >= len(self._images):
             raise IndexError(f"invalid image index: {index}")
-        return self._images[index]
+        return self._get_image(index)
 
     def __delitem__(self, key):
         if key < 0 or key >= len(self._images):
             raise IndexError(f"invalid image index: {key}")
         del self._images[key]
+        del self._item_ids[key]
+        self._index_by_id = None
+
+    @property
+    def item_ids(self) -> List[Optional[int]]:
+        """IDs of the images in the file, ``None`` for the images added to the container.
+
+        Images are not created to get their IDs.
+        """
+        return list(self._item_ids)
+
+    def get_by_id(self, item_id: int) -> HeifImage:
+        """Returns the image with the given ID of the item in the file.
+
+        :param item_id: ID of the image item, see :py:attr:`~pillow_heif.HeifFile.item_ids`.
+
+        :returns: :py:class:`~pillow_heif.HeifImage` object.
+        :exception KeyError: If there is no image with such ID in the container.
+        """
+        if self._index_by_id is None:
+            self._index_by_id = {v: i for i, v in enumerate(self._item_ids) if v is not None}
+        return self._get_image(self._index_by_id[item_id])
+
+    def _get_image(self, index: int) -> HeifImage:
+        image = self._images[index]
+        if image is None:
+            with self._images_lock:
+                image = self._images[index]
+                if image is None:
+                    image = HeifImage(self._ctx_file.get_image(self._item_ids[index]))
+                    # pylint: disable=protected-access
+                    image._read_thumbnails, image._read_depth_images = self._read_options
+                    image._decoded_images = self._decoded_images
+                    image._ctx_file = self._ctx_file
+                    self._images[index] = image
+        return image
+
+    def _get_primary_attrs(self) -> List[bool]:
+        """Returns ``info["primary"]`` of the images, without creating the images or reading their ``info``."""
+        # pylint: disable=protected-access
+        return [
+            (
+                image._info.get("primary", False)
+                if image is not None and image._info is not None
+                else i == self.primary_index
+            )
+            for i, image in enumerate(self._images)
+        ]
+
+    def load_all(self, workers: Optional[int] = None) -> None:
+        """Decodes all images of the container in a pool of threads.
+
+        Images share one ``libheif`` context, decoding of the different images of it from many threads is safe.
+        While images are decoded, the number of ``libheif`` threads per image is reduced to
+        ``number of CPU cores // workers``, so that the CPU cores are used without oversubscription.
+
+        :param workers: number of images decoded at the same time. Default = number of CPU cores.
+        """
+        cpu_count = os.cpu_count() or 1
+        workers = workers or cpu_count
+        if workers <= 0:
+            raise ValueError("`workers` must be a positive integer.")
+        images = [self._get_image(i) for i in range(len(self._images))]
+        workers = min(workers, len(images))
+        if workers <= 1 or self._ctx_file is None:
+            for image in images:
+                image.load()
+            return
+        decode_threads = max(1, min(self._ctx_file.decode_threads, cpu_count // workers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # pylint: disable=protected-access
+            for future in [executor.submit(image._load, decode_threads) for image in images]:
+                future.result()
+
+    def _drop_file_if_decoded(self) -> None:
+        """Releases the input file, when all images of a file are decoded."""
+        if self._ctx_file is None:
+            return
+        for image in self._images:
+            # pylint: disable=protected-access
+            if image is None or (not image._data and not isinstance(image._c_image, MimCImage)):
+                return
+        for image in self._images:
+            if not isinstance(image._c_image, MimCImage):  # pylint: disable=protected-access
+                image._drop_file()  # pylint: disable=protected-access
+        self._ctx_file = None
 
     def add_frombytes(self, mode: str, size: tuple, data, **kwargs):
         """Adds image from bytes to container.
@@ -398,6 +368,7 @@ class HeifFile:
         """
         added_image = HeifImage(MimCImage(mode, size, data, **kwargs))
         self._images.append(added_image)
+        self._item_ids.append(None)
         return added_image
 
     def add_from_heif(self, image: HeifImage) -> HeifImage:
@@ -457,11 +428,11 @@ class HeifFile:
     @property
     def __array_interface__(self):
         """Returns the primary image as a numpy array."""
-        return self._images[self.primary_index].__array_interface__
+        return self._get_image(self.primary_index).__array_interface__
 
     def __getstate__(self):
         im_desc = []
-        for im in self._images:
+        for im in self:
             im_data = bytes(im.data)
             im_desc.append([im.mode, im.size, im_data, im.info])
         return [self.primary_index, self.mimetype, im_desc]
@@ -476,7 +447,10 @@ class HeifFile:
 
     def __copy(self):
         _im_copy = HeifFile()
-        _im_copy._images = copy(self._images)  # pylint: disable=protected-access
+        _im_copy._ctx_file = self._ctx_file  # pylint: disable=protected-access
+        _im_copy._read_options = self._read_options  # pylint: disable=protected-access
+        _im_copy._item_ids = copy(self._item_ids)  # pylint: disable=protected-access
+        _im_copy._images = list(self)  # pylint: disable=protected-access
         _im_copy.mimetype = self.mimetype
         _im_copy.primary_index = self.primary_index
         return _im_copy
@@ -484,6 +458,52 @@ class HeifFile:
     __copy__ = __copy
 
 
+@dataclass(frozen=True)
+class HeifProbeImage:
+    """Basic information about one image of a file, returned by :py:func:`~pillow_heif.probe`."""
+
+    size: Tuple[int, int]
+    """Width and height of the image."""
+    mode: str
+    """Mode that the image will have when it is opened with the same parameters."""
+    bit_depth: int
+    """Bit depth of the image stored in the file: 8, 10 or 12."""
+    has_alpha: bool
+    """``True`` for images with the ``alpha`` channel."""
+    primary: bool
+    """``True`` for the primary image of the file."""
+
+
+@dataclass(frozen=True)
+class HeifProbe:
+    """Basic information about a file, returned by :py:func:`~pillow_heif.probe`."""
+
+    mimetype: str
+    """MIME type of the file, see :py:func:`~pillow_heif.get_file_mimetype`."""
+    brand: str
+    """Major brand from the ``ftyp`` box of the file, e.g. ``heic`` or ``avif``."""
+    primary_index: int
+    """Index of the primary image in ``images``."""
+    images: Tuple[HeifProbeImage, ...]
+    """Top-level images of the file, in the same order as in :py:class:`~pillow_heif.HeifFile`."""
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Size of the primary image.
+
+        :exception IndexError: If there are no images.
+        """
+        return self.images[self.primary_index].size
+
+    @property
+    def mode(self) -> str:
+        """Mode of the primary image.
+
+        :exception IndexError: If there are no images.
+        """
+        return self.images[self.primary_index].mode
+
+
 def is_supported(fp) -> bool:
     """Checks if the given `fp` object contains a supported file type.
 
@@ -502,7 +522,11 @@ def is_supported(fp) -> bool:
 def open_heif(fp, convert_hdr_to_8bit=True, bgr_mode=False, **kwargs) -> HeifFile:
     """Opens the given HEIF(AVIF) image file.
 
-    :param fp: See parameter ``fp`` in :func:`is_supported`
+    :param fp: See parameter ``fp`` in :func:`is_supported`.
+        Also can be a :py:class:`~pillow_heif.RangeReader` or a callable ``read(offset, size) -> bytes``,
+        in that case only the needed parts of the file are read, and they are read when needed.
+        Bytes and any C-contiguous buffer objects(``bytearray``, ``memoryview``, ``numpy`` arrays, ``mmap``)
+        are used without copying, and must not be changed while images are not decoded.
     :param convert_hdr_to_8bit: Boolean indicating should 10 bit or 12 bit images
         be converted to 8-bit images during decoding. Otherwise, they will open in 16-bit mode.
         ``Does not affect "monochrome" or "depth images".``
@@ -511,6 +535,31 @@ def open_heif(fp, convert_hdr_to_8bit=True, bgr_mode=False, **kwargs) -> HeifFil
         should be converted to 16-bit mode during decoding. `Has lower priority than convert_hdr_to_8bit`!
         Default = **True**
 
+        **mmap** a boolean value indicating that the file specified by a path should be memory-mapped
+        instead of reading it into memory. Default = **False**
+
+        **decode_threads** maximum number of threads ``libheif`` uses to decode an image of this file.
+        Default = :py:attr:`~pillow_heif.options.DECODE_THREADS`
+
+        **images** list with indexes of the top-level images to open, other images of the file are not touched.
+        Default = all images
+
+        **primary_only** a boolean value indicating that only the primary image should be opened.
+        Default = **False**
+
+        **max_decoded_images** maximum number of decoded images kept in memory, the least recently used images
+        are unloaded and decoded again on the next access. Default = **0** - no limit
+
+        **max_decoded_bytes** the same as **max_decoded_images**, but limits the size of the decoded data.
+        Default = **0** - no limit
+
+        **low_memory** a boolean value indicating that the input data should be released, when all images
+        are decoded. Depth images and thumbnails that were not accessed before are not available then.
+        Default = **False**
+
+        **prefetch_frames** number of the next images that are decoded in background threads, while iterating
+        over the :py:class:`~pillow_heif.HeifFile`. Default = :py:attr:`~pillow_heif.options.PREFETCH_FRAMES`
+
     :returns: :py:class:`~pillow_heif.HeifFile` object.
     :exception ValueError: invalid input data.
     :exception EOFError: corrupted image data.
@@ -521,6 +570,73 @@ def open_heif(fp, convert_hdr_to_8bit=True, bgr_mode=False, **kwargs) -> HeifFil
     return HeifFile(fp, convert_hdr_to_8bit, bgr_mode, **kwargs)
 
 
+def probe(fp, convert_hdr_to_8bit=True, bgr_mode=False, **kwargs) -> HeifProbe:
+    """Reads only the headers of the given HEIF(AVIF) file and returns the basic information about its images.
+
+    It is much cheaper than :py:func:`~pillow_heif.open_heif`, as metadata, color profiles, thumbnails
+    and depth images are not read and :py:class:`~pillow_heif.HeifImage` objects are not created.
+
+    :param fp: See parameter ``fp`` in :func:`open_heif`.
+    :param convert_hdr_to_8bit: See parameter ``convert_hdr_to_8bit`` in :func:`open_heif`,
+        affects only the reported modes.
+    :param bgr_mode: See parameter ``bgr_mode`` in :func:`open_heif`, affects only the reported modes.
+    :param kwargs: **hdr_to_16bit**, **mmap**, **images** and **primary_only**, see :func:`open_heif`.
+
+    :returns: :py:class:`~pillow_heif.HeifProbe` object.
+    :exception ValueError: invalid input data.
+    :exception EOFError: corrupted image data.
+    :exception SyntaxError: unsupported feature.
+    :exception RuntimeError: some other error.
+    :exception OSError: out of memory.
+    """
+    if callable(fp):
+        fp = RangeReader(fp)
+    if hasattr(fp, "seek"):
+        fp.seek(0, SEEK_SET)
+    mimetype, brand, ctx_file = _load_file(fp, convert_hdr_to_8bit, bgr_mode, **kwargs)
+    images = []
+    for item_id in _select_item_ids(ctx_file, **kwargs):
+        c_image = ctx_file.get_image(item_id)
+        size, mode = c_image.size_mode
+        has_alpha = mode.split(sep=";")[0][-1] in ("A", "a")
+        images.append(HeifProbeImage(size, mode, c_image.bit_depth, has_alpha, bool(c_image.primary)))
+    primary_index = next((i for i, image in enumerate(images) if image.primary), 0)
+    return HeifProbe(mimetype, brand, primary_index, tuple(images))
+
+
+def _load_file(fp, convert_hdr_to_8bit: bool, bgr_mode: bool, **kwargs) -> Tuple[str, str, Any]:
+    fp_data = _get_data(fp, kwargs.get("mmap", False))
+    header = _get_bytes(fp_data, 12)
+    mimetype = get_file_mimetype(header)
+    if mimetype.find("avif") != -1:
+        preferred_decoder = options.PREFERRED_DECODER.get("AVIF", "")
+    elif mimetype.find("heic") != -1 or mimetype.find("heif") != -1:
+        preferred_decoder = options.PREFERRED_DECODER.get("HEIF", "")
+    else:
+        preferred_decoder = ""
+    ctx_file = _pillow_heif.load_file(
+        fp_data,
+        kwargs.get("decode_threads", options.DECODE_THREADS),
+        convert_hdr_to_8bit,
+        bgr_mode,
+        kwargs.get("remove_stride", True),
+        kwargs.get("hdr_to_16bit", True),
+        kwargs.get("reload_size", options.ALLOW_INCORRECT_HEADERS),
+        preferred_decoder,
+    )
+    return mimetype, header[8:].decode("ascii", errors="replace"), ctx_file
+
+
+def _select_item_ids(ctx_file, **kwargs) -> List[Optional[int]]:
+    if kwargs.get("primary_only", False):
+        return [ctx_file.primary_id]
+    item_ids = ctx_file.item_ids
+    indexes = kwargs.get("images", None)
+    if indexes is None:
+        return item_ids
+    return [item_ids[i] for i in indexes]
+
+
 def read_heif(fp, convert_hdr_to_8bit=True, bgr_mode=False, **kwargs) -> HeifFile:
     """Opens the given HEIF(AVIF) image file and decodes all images.
 
@@ -549,34 +665,77 @@ def read_heif(fp, convert_hdr_to_8bit=True, bgr_mode=False, **kwargs) -> HeifFil
     return ret
 
 
-def encode(mode: str, size: tuple, data, fp, **kwargs) -> None:
+def encode(mode: str, size: tuple, data, fp, **kwargs) -> Union[bytes, memoryview, None]:
     """Encodes data in a ``fp``.
 
     :param mode: `BGR(A);16`, `RGB(A);16`, LA;16`, `L;16`, `I;16L`, `BGR(A)`, `RGB(A)`, `LA`, `L`
     :param size: tuple with ``width`` and ``height`` of an image.
     :param data: bytes object with raw image data.
-    :param fp: A filename (string), pathlib.Path object or an object with ``write`` method.
+    :param fp: A filename (string), pathlib.Path object, an object with ``write`` method or ``None``.
+
+    :returns: ``None``, or ``bytes`` with the encoded data if ``fp`` is ``None``,
+        a read-only ``memoryview`` with the ``as_memoryview`` option.
+    """
+    return _encode_images([HeifImage(MimCImage(mode, size, data, **kwargs))], fp, **kwargs)
+
+
+def encode_tiles(
+    mode: str, size: tuple, tiles: Iterable, fp, tile_size: Union[int, Tuple[int, int]], **kwargs
+) -> Union[bytes, memoryview, None]:
+    """Encodes image supplied tile by tile as a grid image in a ``fp``.
+
+    ``tiles`` can be a generator: each tile is copied to the encoder when it is received, so the whole image
+    never has to be in memory as one buffer. The copies are kept until the last tile is received, and then
+    they are encoded one after another, so the peak memory usage is about the size of the raw image.
+
+    .. note:: Thumbnails are not generated for the grid images.
+
+    :param mode: `BGR(A);16`, `RGB(A);16`, LA;16`, `L;16`, `I;16L`, `BGR(A)`, `RGB(A)`, `LA`, `L`
+    :param size: tuple with ``width`` and ``height`` of an image.
+    :param tiles: iterable with raw data of tiles, from left to right and from top to bottom.
+        Tiles in the last column and row can be cropped to the image size.
+    :param fp: A filename (string), pathlib.Path object, an object with ``write`` method or ``None``.
+    :param tile_size: ``int`` or tuple with ``width`` and ``height`` of a tile.
+
+    :returns: ``None``, or ``bytes`` with the encoded data if ``fp`` is ``None``,
+        a read-only ``memoryview`` with the ``as_memoryview`` option.
     """
-    _encode_images([HeifImage(MimCImage(mode, size, data, **kwargs))], fp, **kwargs)
+    ctx_write = _get_encode_context(**kwargs)
+    ctx_write.add_image_tiles(size, mode, tiles, **{**kwargs, "tile_size": tile_size, "primary": True})
+    return ctx_write.save(fp, kwargs.get("as_memoryview", False))
 
 
-def _encode_images(images: List[HeifImage], fp, **kwargs) -> None:
+def _get_encode_context(**kwargs) -> CtxEncode:
     compression = kwargs.get("format", "HEIF")
     compression_format = HeifCompressionFormat.AV1 if compression == "AVIF" else HeifCompressionFormat.HEVC
-    if not _pillow_heif.get_lib_info()[compression]:
+    if not _get_lib_info()[compression]:
         raise RuntimeError(f"No {compression} encoder found.")
-    images_to_save: List[HeifImage] = images + kwargs.get("append_images", [])
+    return CtxEncode(compression_format, **kwargs)
+
+
+def _encode_images(images: List[HeifImage], fp, **kwargs) -> Union[bytes, memoryview, None]:
+    """Decodes, encodes and releases images one by one, ``append_images`` can be a generator."""
+    append_images = kwargs.get("append_images", [])
+    images_to_save: Iterable[HeifImage] = chain(images, append_images)
+    primary_attrs = [img.info.get("primary", False) for img in images]
+    frames_count = None
+    if isinstance(append_images, (list, tuple)):
+        primary_attrs += [img.info.get("primary", False) for img in append_images]
+        frames_count = len(primary_attrs)
     if not kwargs.get("save_all", True):
-        images_to_save = images_to_save[:1]
-    if not images_to_save:
+        images_to_save, primary_attrs, frames_count = islice(images_to_save, 1), primary_attrs[:1], None
+    frames = _iter_with_primary(images_to_save, kwargs.get("primary_index", None), primary_attrs, frames_count)
+    first_frame = next(frames, None)
+    if first_frame is None:
         raise ValueError("Cannot write file with no images as HEIF.")
-    primary_index = _get_primary_index(images_to_save, kwargs.get("primary_index", None))
-    ctx_write = CtxEncode(compression_format, **kwargs)
-    for i, img in enumerate(images_to_save):
+    ctx_write = _get_encode_context(**kwargs)
+    for img, primary in chain((first_frame,), frames):
+        # images that were not decoded before are released after encoding, to not keep all of them in memory
+        decoded = bool(img._data)  # pylint: disable=protected-access
         img.load()
         _info = img.info.copy()
         _info["primary"] = False
-        if i == primary_index:
+        if primary:
             _info.update(**kwargs)
             _info["primary"] = True
         _info.pop("stride", 0)
@@ -588,7 +747,9 @@ def _encode_images(images: List[HeifImage], fp, **kwargs) -> None:
             **_info,
             stride=img.stride,
         )
-    ctx_write.save(fp)
+        if not decoded:
+            img.unload()
+    return ctx_write.save(fp, kwargs.get("as_memoryview", False))
 
 
 def from_pillow(pil_image: Image.Image) -> HeifFile:
@@ -0,0 +1,492 @@
+"""Classes of the images: primary and other top-level images, their thumbnails and depth images."""
+
+import threading
+from contextlib import contextmanager
+from math import ceil
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from . import options
+from ._executor import _DecodedImages, _run_async
+from .misc import (
+    MODE_INFO,
+    MimCImage,
+    _THREADS_BUDGET,
+    _get_heif_meta,
+    _retrieve_exif,
+    _retrieve_xmp,
+    save_colorspace_chroma,
+    set_orientation,
+)
+
+
+class BaseImage:
+    """Base class for :py:class:`HeifImage`, :py:class:`HeifDepthImage` and :py:class:`HeifThumbnailImage`."""
+
+    size: tuple
+    """Width and height of the image."""
+
+    mode: str
+    """A string which defines the type and depth of a pixel in the image:
+    `Pillow Modes <https://pillow.readthedocs.io/en/stable/handbook/concepts.html#modes>`_
+
+    For currently supported modes by Pillow-Heif see :ref:`image-modes`."""
+
+    def __init__(self, c_image):
+        self.size, self.mode = c_image.size_mode
+        self._c_image = c_image
+        self._data = None
+        self._decoded_images: Optional[_DecodedImages] = None
+        # the image can be decoded in a background thread, see `prefetch_frames`
+        self._lock = threading.Lock()
+        # `CtxFile` of the image, to set the number of decoding threads from the threads budget
+        self._ctx_file = None
+
+    @property
+    def data(self):
+        """Decodes image and returns image data.
+
+        :returns: ``bytes`` of the decoded image.
+        """
+        self.load()
+        return self._data
+
+    @property
+    def stride(self) -> int:
+        """Stride of the image.
+
+        .. note:: from `0.10.0` version this value always will have width * sizeof pixel in default usage mode.
+
+        :returns: An Int value indicating the image stride after decoding.
+        """
+        self.load()
+        return self._c_image.stride
+
+    @property
+    def __array_interface__(self):
+        """Numpy array interface support."""
+        self.load()
+        width = int(self.stride / MODE_INFO[self.mode][0])
+        if MODE_INFO[self.mode][1] <= 8:
+            typestr = "|u1"
+        else:
+            width = int(width / 2)
+            typestr = "<u2"
+        shape: Tuple[Any, ...] = (self.size[1], width)
+        if MODE_INFO[self.mode][0] > 1:
+            shape += (MODE_INFO[self.mode][0],)
+        return {"shape": shape, "typestr": typestr, "version": 3, "data": self.data}
+
+    def to_pillow(self) -> Image.Image:
+        """Helper method to create :external:py:class:`~PIL.Image.Image` class.
+
+        .. note:: An image that was not decoded before is decoded straight into the memory of the returned
+            Pillow image, without a copy, and is not kept decoded in this object.
+
+        :returns: :external:py:class:`~PIL.Image.Image` class created from an image.
+        """
+        image = self._decode_pillow()
+        if image is not None:
+            return image
+        self.load()
+        return Image.frombytes(
+            self.mode,  # noqa
+            self.size,
+            self.data,
+            "raw",
+            self.mode,
+            self.stride,
+        )
+
+    def _decode_pillow(self) -> Optional[Image.Image]:
+        """Decodes the image into a new Pillow image that owns the decoded pixels.
+
+        :returns: ``None`` if the image is already decoded or its mode cannot be mapped by Pillow.
+        """
+        if self._data or isinstance(self._c_image, MimCImage) or self.mode not in ("L", "I;16", "RGB", "RGBA", "RGBa"):
+            return None
+        with self._lock:
+            if self._data:
+                return None
+            with self._decoding_threads():
+                buffer, size, stride = self._c_image.decode_buffer(self.mode == "RGB")
+        if not hasattr(Image.core, "map_buffer"):
+            rawmode = "RGBX" if self.mode == "RGB" else self.mode
+            image = Image.frombytes(self.mode, size, buffer, "raw", rawmode, stride, 1)
+        elif self.mode in ("RGB", "RGBa"):
+            # `frombuffer` maps only some modes and copies the others, `RGB` images are decoded
+            # with 4 bytes per pixel, as Pillow keeps them, so they can be mapped the same way.
+            # pylint: disable=protected-access
+            image = Image.new(self.mode, (0, 0))._new(
+                Image.core.map_buffer(buffer, size, "raw", 0, (self.mode, stride, 1))
+            )
+        else:
+            image = Image.frombuffer(self.mode, size, buffer, "raw", self.mode, stride, 1)
+        # the buffer is owned by the image only, it is not a view of the data of this object
+        image.readonly = 0
+        return image
+
+    def load(self) -> None:
+        """Method to decode image.
+
+        .. note:: In normal cases, you should not call this method directly,
+            when reading `data` or `stride` property of image will be loaded automatically.
+        """
+        self._load()
+
+    def _load(self, decode_threads: Optional[int] = None) -> None:
+        if not self._data:
+            with self._lock:
+                if not self._data:
+                    with self._decoding_threads(decode_threads):
+                        self._data = self._c_image.data
+                    self.size, _ = self._c_image.size_mode
+        if self._decoded_images is not None:
+            self._decoded_images.touch(self)
+
+    async def aload(self, executor=None, priority: str = "normal") -> None:
+        """Coroutine version of :py:meth:`load`, the image is decoded in the ``executor``.
+
+        :param executor: :py:class:`~pillow_heif.HeifExecutor` or any :py:class:`concurrent.futures.Executor`.
+            Default = shared executor with a worker per CPU core, with the same priorities as in ``HeifExecutor``.
+        :param priority: priority class, when ``executor`` is a :py:class:`~pillow_heif.HeifExecutor`.
+        """
+        await _run_async(executor, priority, self.load)
+
+    def unload(self) -> None:
+        """Releases the decoded data of the image, it is decoded again on the next access.
+
+        .. note:: Objects returned by :py:attr:`data` before stay valid.
+            Images that were not read from a file are not changed.
+        """
+        if not self._data or isinstance(self._c_image, MimCImage):
+            return
+        with self._lock:
+            self._data = None
+            self._c_image.unload()
+
+    def decode_into(self, buffer, stride: Optional[int] = None) -> None:
+        """Decodes the image straight into a writable buffer, without keeping the decoded image in memory.
+
+        Postprocessing(conversion to `BGR` and of 10/12 bit values to 16 bit) is done while pixels are written
+        to the ``buffer``, so there is no additional copy of the image. Already decoded images are copied.
+
+        :param buffer: writable C-contiguous buffer object(``bytearray``, numpy array or its contiguous slice,
+            ``numpy.memmap``, ``mmap``, shared memory) with at least ``stride * height`` bytes.
+        :param stride: number of bytes between the starts of the rows in the ``buffer``, for 16 bit modes must
+            be even. Default = size of a row.
+        """
+        if not isinstance(self._c_image, MimCImage):
+            with self._decoding_threads():
+                self._c_image.decode_into(buffer, stride or 0)
+            return
+        bytes_in_cc = ceil(MODE_INFO[self.mode][1] / 8)
+        row_size = self.size[0] * MODE_INFO[self.mode][0] * bytes_in_cc
+        stride = stride or row_size
+        buffer_out = memoryview(buffer).cast("B")
+        if stride < row_size or stride % bytes_in_cc or len(buffer_out) < stride * (self.size[1] - 1) + row_size:
+            raise ValueError(f"invalid stride {stride} or buffer is too small for image {self.size}")
+        data = memoryview(self.data).cast("B")
+        for i in range(self.size[1]):
+            buffer_out[i * stride : i * stride + row_size] = data[i * self.stride : i * self.stride + row_size]
+
+    @contextmanager
+    def _decoding_threads(self, decode_threads: Optional[int] = None) -> Iterator[None]:
+        """Passes the number of ``libheif`` threads granted by the threads budget to the next decoding of the image.
+
+        :param decode_threads: requested number of threads, default is the ``decode_threads`` value of the file.
+        """
+        ctx_file = self._ctx_file
+        if ctx_file is None:
+            yield
+            return
+        with _THREADS_BUDGET.acquire(ctx_file.decode_threads if decode_threads is None else decode_threads) as threads:
+            self._c_image.decode_threads = threads
+            try:
+                yield
+            finally:
+                self._c_image.decode_threads = -1
+
+    def draft(  # pylint: disable=unused-argument
+        self, mode: Optional[str], size: Optional[tuple]
+    ) -> Optional[Tuple[str, Tuple[float, ...]]]:
+        """Configures the image to be decoded with a reduced size, as close as possible to the requested one.
+
+        During decoding, the image is reduced in place with a box filter by a factor of 2, 4 or 8,
+        the largest one at which the image is still not smaller than ``size``.
+        This is much faster and uses less memory than decoding a full image and resizing it afterward.
+
+        .. note:: Works only for images that have not been decoded yet. ``mode`` is ignored.
+
+        :param mode: The requested mode, is not used and is present only for compatibility with Pillow.
+        :param size: The requested size as a ``(width, height)`` tuple.
+
+        :returns: ``None`` if the image cannot be reduced, otherwise a tuple with the image mode and the box
+            of the original image in the coordinates of the reduced one.
+        """
+        if self._data or isinstance(self._c_image, MimCImage) or not size:
+            return None
+        original_size = self._c_image.size_mode[0]  # size from the header, `self.size` can be already reduced
+        scale = min(original_size[0] // max(size[0], 1), original_size[1] // max(size[1], 1))
+        reduce = next(i for i in (8, 4, 2, 1) if scale >= i)
+        self._c_image.reduce = reduce
+        if reduce == 1:
+            self.size = original_size
+            return None
+        self.size = ((original_size[0] + reduce - 1) // reduce, (original_size[1] + reduce - 1) // reduce)
+        return self.mode, (0, 0, original_size[0] / reduce, original_size[1] / reduce)
+
+
+class HeifDepthImage(BaseImage):
+    """Class representing the depth image associated with the :py:class:`~pillow_heif.HeifImage` class."""
+
+    def __init__(self, c_image):
+        super().__init__(c_image)
+        _metadata: dict = c_image.metadata
+        self.info = {
+            "metadata": _metadata,
+        }
+        save_colorspace_chroma(c_image, self.info)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.size[0]}x{self.size[1]} {self.mode}>"
+
+    def to_pillow(self) -> Image.Image:
+        """Helper method to create :external:py:class:`~PIL.Image.Image` class.
+
+        :returns: :external:py:class:`~PIL.Image.Image` class created from an image.
+        """
+        image = super().to_pillow()
+        image.info = self.info.copy()
+        return image
+
+
+class HeifThumbnailImage(BaseImage):
+    """Class representing the thumbnail image associated with the :py:class:`~pillow_heif.HeifImage` class.
+
+    Thumbnail is decoded only on first access to its data.
+    """
+
+    def __init__(self, c_image):
+        super().__init__(c_image)
+        self.info = {
+            "bit_depth": int(c_image.bit_depth),
+        }
+        save_colorspace_chroma(c_image, self.info)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.size[0]}x{self.size[1]} {self.mode}>"
+
+    def to_pillow(self) -> Image.Image:
+        """Helper method to create :external:py:class:`~PIL.Image.Image` class.
+
+        :returns: :external:py:class:`~PIL.Image.Image` class created from an image.
+        """
+        image = super().to_pillow()
+        image.info = self.info.copy()
+        return image
+
+
+class HeifImage(BaseImage):
+    """One image in a :py:class:`~pillow_heif.HeifFile` container."""
+
+    def __init__(self, c_image):
+        super().__init__(c_image)
+        self._info: Optional[dict] = None
+        self._thumbnails: Optional[List[HeifThumbnailImage]] = None
+        # options in effect during opening, as metadata is read only when it is requested
+        self._read_thumbnails = options.THUMBNAILS
+        self._read_depth_images = options.DEPTH_IMAGES
+
+    @property
+    def info(self) -> dict:
+        """Dictionary with the metadata of the image.
+
+        .. note:: Metadata, color profiles, thumbnails and depth images are read on the first access.
+        """
+        if self._info is None:
+            self._info = self._read_info()
+        return self._info
+
+    @info.setter
+    def info(self, value: dict):
+        self._info = value
+
+    @property
+    def thumbnails(self) -> List[HeifThumbnailImage]:
+        """List of embedded thumbnails as :py:class:`~pillow_heif.HeifThumbnailImage` objects.
+
+        Empty if there are no thumbnails or if thumbnails are disabled with :py:attr:`~pillow_heif.options.THUMBNAILS`.
+        """
+        if self._thumbnails is None:
+            self._thumbnails = (
+                [HeifThumbnailImage(i) for i in self._c_image.thumbnail_list if i is not None]
+                if self._read_thumbnails
+                else []
+            )
+        return self._thumbnails
+
+    def _drop_file(self) -> None:
+        """Keeps only the decoded data and the metadata of the image, so the input file can be released."""
+        # depth images and thumbnails that were not accessed before would keep the input file alive
+        if self._info is None:
+            self._read_depth_images = False
+        if self._thumbnails is None:
+            self._thumbnails = []
+        self.info = self.info
+        self._c_image = MimCImage(self.mode, self.size, self._data, stride=self._c_image.stride)
+        self._ctx_file = None
+
+    def _read_info(self) -> dict:
+        c_image = self._c_image
+        _metadata: List[dict] = c_image.metadata
+        _exif = _retrieve_exif(_metadata)
+        _xmp = _retrieve_xmp(_metadata)
+        _thumbnails: List[Optional[int]] = (
+            [i for i in c_image.thumbnails if i is not None] if self._read_thumbnails else []
+        )
+        _depth_images: List[Optional[HeifDepthImage]] = (
+            [HeifDepthImage(i) for i in c_image.depth_image_list if i is not None] if self._read_depth_images else []
+        )
+        _heif_meta = _get_heif_meta(c_image)
+        info = {
+            "primary": bool(c_image.primary),
+            "bit_depth": int(c_image.bit_depth),
+            "exif": _exif,
+            "metadata": _metadata,
+            "thumbnails": _thumbnails,
+            "depth_images": _depth_images,
+        }
+        if _xmp:
+            info["xmp"] = _xmp
+        if _heif_meta:
+            info["heif"] = _heif_meta
+        save_colorspace_chroma(c_image, info)
+        _color_profile: Dict[str, Any] = c_image.color_profile
+        if _color_profile:
+            if _color_profile["type"] in ("rICC", "prof"):
+                info["icc_profile"] = _color_profile["data"]
+                info["icc_profile_type"] = _color_profile["type"]
+            else:
+                info["nclx_profile"] = _color_profile["data"]
+        return info
+
+    def __repr__(self):
+        _bytes = f"{len(self.data)} bytes" if self._data or isinstance(self._c_image, MimCImage) else "no"
+        return (
+            f"<{self.__class__.__name__} {self.size[0]}x{self.size[1]} {self.mode} "
+            f"with {_bytes} image data and {len(self.info.get('thumbnails', []))} thumbnails>"
+        )
+
+    @property
+    def has_alpha(self) -> bool:
+        """``True`` for images with the ``alpha`` channel, ``False`` otherwise."""
+        return self.mode.split(sep=";")[0][-1] in ("A", "a")
+
+    @property
+    def premultiplied_alpha(self) -> bool:
+        """``True`` for images with ``premultiplied alpha`` channel, ``False`` otherwise."""
+        return bool(self.mode.split(sep=";")[0][-1] == "a")
+
+    @premultiplied_alpha.setter
+    def premultiplied_alpha(self, value: bool):
+        if self.has_alpha:
+            self.mode = self.mode.replace("A" if value else "a", "a" if value else "A")
+
+    def to_pillow(self) -> Image.Image:
+        """Helper method to create :external:py:class:`~PIL.Image.Image` class.
+
+        :returns: :external:py:class:`~PIL.Image.Image` class created from an image.
+        """
+        image = super().to_pillow()
+        image.info = self.info.copy()
+        image.info["original_orientation"] = set_orientation(image.info)
+        return image
+
+    def get_thumbnail(self, min_size: Union[int, Tuple[int, int]]) -> BaseImage:
+        """Returns the smallest embedded thumbnail that is not smaller than the requested size.
+
+        When there is no such thumbnail, a new image with the same content is returned,
+        configured to be decoded with a reduced size, see :py:meth:`~pillow_heif.image.BaseImage.draft`.
+
+        :param min_size: Minimal size of the bounding box of the thumbnail as ``int``,
+            or minimal ``(width, height)`` as ``tuple``.
+
+        :returns: :py:class:`~pillow_heif.HeifThumbnailImage` or :py:class:`~pillow_heif.HeifImage` object.
+        """
+        if isinstance(min_size, int):
+            if self.size[0] >= self.size[1]:
+                min_size = (min_size, min_size * self.size[1] // self.size[0])
+            else:
+                min_size = (min_size * self.size[0] // self.size[1], min_size)
+        thumbnails = [i for i in self.thumbnails if i.size[0] >= min_size[0] and i.size[1] >= min_size[1]]
+        if thumbnails:
+            return min(thumbnails, key=lambda x: x.size[0] * x.size[1])
+        if isinstance(self._c_image, MimCImage) or self._data:
+            return self
+        image = HeifImage(self._c_image.clone())
+        # pylint: disable=protected-access
+        image._read_thumbnails, image._read_depth_images = self._read_thumbnails, self._read_depth_images
+        image._decoded_images = self._decoded_images
+        image._ctx_file = self._ctx_file
+        image.draft(None, min_size)
+        return image
+
+    def decode_region(self, box: Tuple[int, int, int, int]) -> "HeifImage":
+        """Decodes only the rectangular region of the image.
+
+        For grid images(most photos from phones) only the tiles that intersect the region are decoded,
+        for other images the region is cropped before any postprocessing, so the full image is never copied.
+
+        .. note:: Current image is not changed and is not decoded, the region is decoded into a new image.
+
+        :param box: The region as a ``(left, upper, right, lower)`` tuple in the coordinates of the original image.
+
+        :returns: :py:class:`~pillow_heif.HeifImage` object with the decoded region.
+        """
+        if isinstance(self._c_image, MimCImage):
+            left, top, right, bottom = box
+            if not (0 <= left < right <= self.size[0] and 0 <= top < bottom <= self.size[1]):
+                raise ValueError(f"invalid region {box} for image with size {self.size}")
+            pixel_size = MODE_INFO[self.mode][0] * ceil(MODE_INFO[self.mode][1] / 8)
+            data = memoryview(self.data)
+            region_data = b"".join(
+                data[y * self.stride + left * pixel_size : y * self.stride + right * pixel_size]
+                for y in range(top, bottom)
+            )
+            return HeifImage(MimCImage(self.mode, (right - left, bottom - top), region_data))
+        c_image = self._c_image.clone()
+        c_image.region = tuple(box)
+        image = HeifImage(c_image)
+        image._ctx_file = self._ctx_file  # pylint: disable=protected-access
+        image.load()
+        return image
+
+    def iter_tiles(self) -> Iterator[Tuple[Tuple[int, int], "HeifImage"]]:
+        """Decodes the grid image tile by tile.
+
+        Each tile is decoded only when the iteration reaches it, so the peak memory usage is about the size of
+        one tile instead of the whole image, as long as the caller does not keep references to previous tiles.
+
+        .. note:: For images that are not plain grids(have no tiles, have transformations or alpha channel),
+            the only yielded tile is the whole image.
+
+        :returns: Generator of ``((left, upper), tile)`` tuples,
+            where ``tile`` is a :py:class:`~pillow_heif.HeifImage` object.
+        """
+        if isinstance(self._c_image, MimCImage):
+            yield (0, 0), self
+            return
+        c_image = self._c_image.clone()
+        (width, height), _ = c_image.size_mode
+        grid_layout = c_image.grid_layout
+        if grid_layout is None:
+            yield (0, 0), self.decode_region((0, 0, width, height))
+            return
+        columns, rows, tile_width, tile_height = grid_layout
+        for row in range(rows):
+            for column in range(columns):
+                left, top = column * tile_width, row * tile_height
+                box = (left, top, min(left + tile_width, width), min(top + tile_height, height))
+                yield (left, top), self.decode_region(box)
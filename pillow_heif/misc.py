@@ -4,17 +4,24 @@ Mostly for internal use, so prototypes can change between versions.
 """
 
 import builtins
+import mmap
+import os
 import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from enum import IntEnum
+from io import SEEK_CUR, SEEK_END, SEEK_SET, BufferedRandom, BufferedWriter, BytesIO, FileIO
 from math import ceil
 from pathlib import Path
 from struct import pack, unpack
-from typing import List, Optional, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from PIL import Image
 
 from . import options
+from ._lib_info import _get_lib_info
 from .constants import HeifChannel, HeifChroma, HeifColorspace, HeifCompressionFormat
 
 try:
@@ -212,9 +219,180 @@ def _get_bytes(fp, length=None) -> bytes:
         if offset is not None and hasattr(fp, "seek"):
             fp.seek(offset)
         return result
+    if length is not None:
+        try:
+            return bytes(memoryview(fp).cast("B")[:length])
+        except TypeError:
+            pass
     return bytes(fp)[:length]
 
 
+def _get_data(fp, use_mmap: bool = False):
+    """Returns input data for ``load_file``: bytes, a C-contiguous buffer object or a reader object."""
+    if isinstance(fp, RangeReader):
+        return fp
+    if isinstance(fp, (str, Path)):
+        if use_mmap:
+            with builtins.open(fp, "rb") as file:
+                try:
+                    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:  # empty files can not be mapped
+                    return file.read()
+        return _get_bytes(fp)
+    if hasattr(fp, "read"):
+        return _get_bytes(fp)
+    try:
+        data = memoryview(fp)
+        if data.c_contiguous:
+            return data
+    except TypeError:
+        pass
+    return bytes(fp)
+
+
+class RangeReader:
+    """Random-access reader that fetches from the source only the byte ranges requested by ``libheif``.
+
+    Can be passed to :py:func:`~pillow_heif.open_heif` or to Pillow's ``Image.open`` instead of a file object.
+    Then only ``ftyp``/``meta`` boxes are read during opening, and image data is read only when it is decoded.
+
+    Requests are aligned to ``block_size``, neighbouring requests are merged into one read from the source,
+    and fetched blocks are kept, so no byte is read from the source twice.
+
+    .. note:: The source must stay available until all images are decoded.
+
+    :param source: A seekable file object opened in binary mode or a callable ``read(offset, size) -> bytes``.
+    :param size: Size of the data in bytes. Determined automatically for file objects, for callables is optional.
+    :param block_size: Minimal size of one read from the source.
+    """
+
+    def __init__(self, source, size: Optional[int] = None, block_size: int = 64 * 1024):
+        if block_size <= 0:
+            raise ValueError("`block_size` must be a positive number.")
+        if callable(source):
+            self._read_source = source
+        elif hasattr(source, "read") and hasattr(source, "seek"):
+            self._source = source
+            self._read_source = self._read_file_object
+            if size is None:
+                size = source.seek(0, SEEK_END)
+        else:
+            raise TypeError("`source` must be a seekable file object or a callable `read(offset, size)`.")
+        self.block_size = block_size
+        self._size = size
+        self._blocks: Dict[int, bytes] = {}
+        self._position = 0
+        self.requests = 0
+        """Number of reads that were made from the source."""
+
+    def _read_file_object(self, offset: int, size: int) -> bytes:
+        self._source.seek(offset, SEEK_SET)
+        return self._source.read(size)
+
+    @property
+    def size(self) -> Optional[int]:
+        """Size of the data or ``None`` if it is not known yet."""
+        return self._size
+
+    @property
+    def bytes_fetched(self) -> int:
+        """Number of bytes that were read from the source."""
+        return sum(len(i) for i in self._blocks.values())
+
+    @property
+    def fetched_ranges(self) -> List[Tuple[int, int]]:
+        """List of ``(start, end)`` byte ranges that were read from the source, with adjacent ranges merged."""
+        ranges: List[Tuple[int, int]] = []
+        for index in sorted(self._blocks):
+            start = index * self.block_size
+            end = start + len(self._blocks[index])
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def _fetch(self, first_block: int, last_block: int) -> None:
+        index = first_block
+        while index <= last_block:
+            if index in self._blocks:
+                index += 1
+                continue
+            run_end = index
+            while run_end + 1 <= last_block and run_end + 1 not in self._blocks:
+                run_end += 1
+            offset = index * self.block_size
+            data = self._read_source(offset, (run_end - index + 1) * self.block_size)
+            self.requests += 1
+            for i in range(index, run_end + 1):
+                block = bytes(data[(i - index) * self.block_size : (i - index + 1) * self.block_size])
+                if not block:
+                    break
+                self._blocks[i] = block
+            if len(data) < (run_end - index + 1) * self.block_size:
+                if data or index == 0 or index - 1 in self._blocks:
+                    self._size = offset + len(data)
+                return
+            index = run_end + 1
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Returns ``size`` bytes starting from ``offset``, fewer if the end of data is reached."""
+        if self._size is not None:
+            size = min(size, self._size - offset)
+        if size <= 0:
+            return b""
+        first_block, last_block = offset // self.block_size, (offset + size - 1) // self.block_size
+        self._fetch(first_block, last_block)
+        result = []
+        for i in range(first_block, last_block + 1):
+            block = self._blocks.get(i)
+            if block is None:
+                break
+            result.append(block)
+        skip = offset - first_block * self.block_size
+        return b"".join(result)[skip : skip + size]
+
+    def wait_for_file_size(self, target_size: int) -> bool:
+        """Returns ``True`` if the data is at least ``target_size`` bytes long."""
+        if self._size is None and target_size > 0:
+            last_block = (target_size - 1) // self.block_size
+            self._fetch(last_block, last_block)
+            if self._size is None:
+                return last_block in self._blocks
+        return self._size is not None and self._size >= target_size
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads ``size`` bytes from the current position, or all remaining data if ``size`` is negative."""
+        if size is None or size < 0:
+            index = self._position // self.block_size
+            while self._size is None:
+                self._fetch(index, index)
+                if index not in self._blocks:
+                    return b""
+                index += 1
+            size = max(self._size - self._position, 0)
+        data = self.read_at(self._position, size)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        """Changes the current position, ``SEEK_END`` requires known ``size``."""
+        if whence == SEEK_CUR:
+            offset += self._position
+        elif whence == SEEK_END:
+            if self._size is None:
+                raise OSError("can not seek from the end of data with unknown size")
+            offset += self._size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return self._position
+
+    def tell(self) -> int:
+        """Returns the current position."""
+        return self._position
+
+
 def _retrieve_exif(metadata: List[dict]) -> Optional[bytes]:
     _result = None
     _purge = []
@@ -324,16 +502,37 @@ def _rotate_pil(img: Image.Image, orientation: int) -> Image.Image:
     return img
 
 
-def _get_primary_index(some_iterator, primary_index: Optional[int]) -> int:
-    primary_attrs = [_.info.get("primary", False) for _ in some_iterator]
+_NO_FRAME = object()
+
+
+def _iter_with_primary(
+    frames: Iterable, primary_index: Optional[int], primary_attrs: List[bool], frames_count: Optional[int]
+) -> Iterator[Tuple[Any, bool]]:
+    """Yields ``(frame, primary)`` for each frame in a single pass, exactly one frame is primary.
+
+    Without ``primary_index`` the primary is the last frame with ``info["primary"]``, or the first frame.
+    ``-1`` or ``primary_index`` out of range - the last frame is primary.
+
+    :param primary_attrs: ``info["primary"]`` values of the frames that are known beforehand. Frames after them
+        (e.g. from generators) are not inspected and can be primary only with ``primary_index``, in which case
+        they are read one frame ahead to find the last frame, so they must be different objects.
+    :param frames_count: total number of the frames, if it is known.
+    """
     if primary_index is None:
-        primary_index = 0
-        for i, v in enumerate(primary_attrs):
-            if v:
-                primary_index = i
-    elif primary_index == -1 or primary_index >= len(primary_attrs):
-        primary_index = len(primary_attrs) - 1
-    return primary_index
+        primary_index = max((i for i, v in enumerate(primary_attrs) if v), default=0)
+    elif frames_count is not None and (primary_index == -1 or primary_index >= frames_count):
+        primary_index = frames_count - 1
+    iterator = iter(frames)
+    frame = next(iterator, _NO_FRAME)
+    index = 0
+    while frame is not _NO_FRAME:
+        read_ahead = (
+            frames_count is None and index >= len(primary_attrs) - 1 and (primary_index == -1 or index < primary_index)
+        )
+        next_frame = next(iterator, _NO_FRAME) if read_ahead else None
+        yield frame, index == primary_index or next_frame is _NO_FRAME
+        frame = next_frame if read_ahead else next(iterator, _NO_FRAME)
+        index += 1
 
 
 def __get_camera_intrinsic_matrix(values: Optional[tuple]):
@@ -361,17 +560,127 @@ def _get_heif_meta(c_image) -> dict:
     return r
 
 
+class _ThreadsBudget:
+    """Process-wide budget of threads shared by all decodes and encodes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.threads = 0
+        self.operations = 0
+
+    @staticmethod
+    def budget() -> int:
+        return options.THREADS_BUDGET if options.THREADS_BUDGET > 0 else os.cpu_count() or 1
+
+    @contextmanager
+    def acquire(self, requested: int) -> Iterator[int]:
+        """Reserves up to ``requested`` threads for one operation, at least one thread is always given."""
+        limit = getattr(self._local, "limit", 0)
+        if limit > 0:
+            requested = min(requested, limit)
+        with self._lock:
+            granted = requested if requested <= 1 else max(1, min(requested, self.budget() - self.threads))
+            self.threads += granted
+            self.operations += 1
+        try:
+            yield granted
+        finally:
+            with self._lock:
+                self.threads -= granted
+                self.operations -= 1
+
+    @contextmanager
+    def limit(self, threads: int) -> Iterator[None]:
+        """Limits the number of threads of the operations started from the current thread, ``0`` - no limit."""
+        previous_limit = getattr(self._local, "limit", 0)
+        self._local.limit = threads
+        try:
+            yield
+        finally:
+            self._local.limit = previous_limit
+
+
+_THREADS_BUDGET = _ThreadsBudget()
+
+
+def threads_usage() -> dict:
+    """Returns the current usage of the process-wide threads budget.
+
+    See :py:attr:`~pillow_heif.options.THREADS_BUDGET`.
+
+    :returns: dictionary with ``budget`` - total number of threads, ``threads`` - number of threads used
+        by the running decodes and encodes, and ``operations`` - number of the running decodes and encodes.
+    """
+    with _THREADS_BUDGET._lock:  # pylint: disable=protected-access
+        return {
+            "budget": _THREADS_BUDGET.budget(),
+            "threads": _THREADS_BUDGET.threads,
+            "operations": _THREADS_BUDGET.operations,
+        }
+
+
+_WRITE_CHUNK_SIZE = 1 << 20  # max size of the encoded data passed to `write` of the output at once
+# outputs that copy the data passed to `write` and never keep references to it
+_ZERO_COPY_WRITERS = (FileIO, BufferedWriter, BufferedRandom, BytesIO)
+
+
+class _EncoderPool:
+    """Idle ``CtxWrite`` objects with the configured encoders, reused by the next saves with the same settings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: OrderedDict = OrderedDict()  # settings -> list of `CtxWrite`, the least recently used first
+        self.size = 0
+
+    def get(self, key: tuple):
+        """Takes an idle ``CtxWrite`` with the ``key`` settings from the pool, ``None`` if there is no such."""
+        with self._lock:
+            idle = self._idle.get(key, None)
+            if not idle:
+                return None
+            ctx_write = idle.pop()
+            if not idle:
+                del self._idle[key]
+            self.size -= 1
+            return ctx_write
+
+    def put(self, key: tuple, ctx_write) -> None:
+        """Returns ``CtxWrite`` to the pool, the least recently used ones are dropped if the pool is full."""
+        if options.ENCODER_POOL_SIZE <= 0:
+            return
+        ctx_write.reset()
+        with self._lock:
+            self._idle.setdefault(key, []).append(ctx_write)
+            self._idle.move_to_end(key)
+            self.size += 1
+            while self.size > options.ENCODER_POOL_SIZE:
+                oldest_key, oldest = next(iter(self._idle.items()))
+                oldest.pop(0)
+                if not oldest:
+                    del self._idle[oldest_key]
+                self.size -= 1
+
+    def clear(self) -> None:
+        """Drops all idle encoders."""
+        with self._lock:
+            self._idle.clear()
+            self.size = 0
+
+
+_ENCODER_POOL = _EncoderPool()
+
+
 class CtxEncode:
     """Encoder bindings from python to python C module."""
 
     def __init__(self, compression_format: HeifCompressionFormat, **kwargs):
         quality = kwargs.get("quality", options.QUALITY)
-        self.ctx_write = _pillow_heif.CtxWrite(
-            compression_format,
-            -2 if quality is None else quality,
-            options.PREFERRED_ENCODER.get("HEIF" if compression_format == HeifCompressionFormat.HEVC else "AVIF", ""),
+        quality = -2 if quality is None else quality
+        encoder_id = options.PREFERRED_ENCODER.get(
+            "HEIF" if compression_format == HeifCompressionFormat.HEVC else "AVIF", ""
         )
-        enc_params = kwargs.get("enc_params", {})
+        enc_params = dict(kwargs.get("enc_params", {}))
         chroma = None
         if "subsampling" in kwargs:
             chroma = SUBSAMPLING_CHROMA_MAP.get(kwargs["subsampling"], None)
@@ -379,30 +688,67 @@ class CtxEncode:
             chroma = kwargs.get("chroma", None)
         if chroma:
             enc_params["chroma"] = chroma
-        for key, value in enc_params.items():
-            _value = value if isinstance(value, str) else str(value)
-            self.ctx_write.set_parameter(key, _value)
+        enc_params = {key: value if isinstance(value, str) else str(value) for key, value in enc_params.items()}
+        self._pool_key = (int(compression_format), quality, encoder_id, tuple(enc_params.items()))
+        self.ctx_write = _ENCODER_POOL.get(self._pool_key)
+        if self.ctx_write is None:
+            self.ctx_write = _pillow_heif.CtxWrite(compression_format, quality, encoder_id)
+            for key, value in enc_params.items():
+                self.ctx_write.set_parameter(key, value)
+        # the number of threads specified in `enc_params` is not limited by the threads budget
+        self._budget_threads = not any(i in enc_params for i in ("threads", "x265:pools"))
+        self.tile_size = _get_tile_size(kwargs.get("tile_size", None))
 
     def add_image(self, size: tuple, mode: str, data, **kwargs) -> None:
         """Adds image to the encoder."""
         if size[0] <= 0 or size[1] <= 0:
             raise ValueError("Empty images are not supported.")
-        bit_depth_in = MODE_INFO[mode][1]
-        bit_depth_out = 8 if bit_depth_in == 8 else kwargs.get("bit_depth", 16)
-        if bit_depth_out == 16:
-            bit_depth_out = 12 if options.SAVE_HDR_TO_12_BIT else 10
-        premultiplied_alpha = int(mode.split(sep=";")[0][-1] == "a")
-        # creating image
-        im_out = self.ctx_write.create_image(size, MODE_INFO[mode][2], MODE_INFO[mode][3], premultiplied_alpha)
-        # image data
-        if MODE_INFO[mode][0] == 1:
-            im_out.add_plane_l(size, bit_depth_out, bit_depth_in, data, kwargs.get("stride", 0), HeifChannel.CHANNEL_Y)
-        elif MODE_INFO[mode][0] == 2:
-            im_out.add_plane_la(size, bit_depth_out, bit_depth_in, data, kwargs.get("stride", 0))
-        else:
-            im_out.add_plane(size, bit_depth_out, bit_depth_in, data, mode.find("BGR") != -1, kwargs.get("stride", 0))
+        tile_size = _get_tile_size(kwargs.get("tile_size", None)) or self.tile_size
+        if (
+            tile_size
+            and (size[0] > tile_size[0] or size[1] > tile_size[1])
+            and MODE_INFO[mode][2] != HeifColorspace.MONOCHROME
+        ):
+            tiles = _iter_tiles_from_data(size, mode, data, kwargs.get("stride", 0), tile_size)
+            self.add_image_tiles(size, mode, tiles, **{**kwargs, "tile_size": tile_size})
+            return
+        im_out = self._create_image(size, mode, data, kwargs.get("stride", 0), kwargs.get("bit_depth", 16))
         self._finish_add_image(im_out, size, **kwargs)
 
+    def add_image_tiles(self, size: tuple, mode: str, tiles: Iterable, **kwargs) -> None:
+        """Adds image, supplied tile by tile in the row-major order, to the encoder as a grid image.
+
+        Tiles in the last column and row can be cropped to the image size, they are padded by repeating edge pixels.
+        """
+        if size[0] <= 0 or size[1] <= 0:
+            raise ValueError("Empty images are not supported.")
+        tile_size = _get_tile_size(kwargs.get("tile_size", None)) or self.tile_size
+        if not tile_size:
+            raise ValueError("`tile_size` is required for the grid images.")
+        if MODE_INFO[mode][2] == HeifColorspace.MONOCHROME:
+            # libheif 1.18 can not determine the size of the monochrome tiles and writes an invalid grid
+            raise ValueError("Grid encoding of monochrome images is not supported.")
+        columns, rows = ceil(size[0] / tile_size[0]), ceil(size[1] / tile_size[1])
+        pixel_size = MODE_INFO[mode][0] * ceil(MODE_INFO[mode][1] / 8)
+        tiles_out = []
+        for i, tile_data in enumerate(tiles):
+            if i >= columns * rows:
+                raise ValueError(f"Too many tiles for the {columns}x{rows} grid.")
+            box_size = (
+                min(tile_size[0], size[0] - (i % columns) * tile_size[0]),
+                min(tile_size[1], size[1] - (i // columns) * tile_size[1]),
+            )
+            tile_out = self._create_image(
+                tile_size, mode, _pad_tile(tile_data, box_size, tile_size, pixel_size), 0, kwargs.get("bit_depth", 16)
+            )
+            self._set_color_profiles(tile_out, **kwargs)
+            tiles_out.append(tile_out)
+        if len(tiles_out) != columns * rows:
+            raise ValueError(f"Not enough tiles for the {columns}x{rows} grid.")
+        with self._threads():
+            im_out = self.ctx_write.encode_grid(tiles_out, columns, rows, size, *self._get_encode_options(**kwargs))
+        self._add_metadata(im_out, **kwargs)
+
     def add_image_ycbcr(self, img: Image.Image, **kwargs) -> None:
         """Adds image in `YCbCR` mode to the encoder."""
         # creating image
@@ -412,7 +758,25 @@ class CtxEncode:
             im_out.add_plane_l(img.size, 8, 8, bytes(img.getdata(i)), kwargs.get("stride", 0), i)
         self._finish_add_image(im_out, img.size, **kwargs)
 
-    def _finish_add_image(self, im_out, size: tuple, **kwargs):
+    def _create_image(self, size: tuple, mode: str, data, stride: int, bit_depth: int):
+        bit_depth_in = MODE_INFO[mode][1]
+        bit_depth_out = 8 if bit_depth_in == 8 else bit_depth
+        if bit_depth_out == 16:
+            bit_depth_out = 12 if options.SAVE_HDR_TO_12_BIT else 10
+        premultiplied_alpha = int(mode.split(sep=";")[0][-1] == "a")
+        # creating image
+        im_out = self.ctx_write.create_image(size, MODE_INFO[mode][2], MODE_INFO[mode][3], premultiplied_alpha)
+        # image data
+        if MODE_INFO[mode][0] == 1:
+            im_out.add_plane_l(size, bit_depth_out, bit_depth_in, data, stride, HeifChannel.CHANNEL_Y)
+        elif MODE_INFO[mode][0] == 2:
+            im_out.add_plane_la(size, bit_depth_out, bit_depth_in, data, stride)
+        else:
+            im_out.add_plane(size, bit_depth_out, bit_depth_in, data, mode.find("BGR") != -1, stride)
+        return im_out
+
+    @staticmethod
+    def _set_color_profiles(im_out, **kwargs) -> None:
         # set ICC color profile
         __icc_profile = kwargs.get("icc_profile", None)
         if __icc_profile is not None:
@@ -425,19 +789,41 @@ class CtxEncode:
                     for i in ("color_primaries", "transfer_characteristics", "matrix_coefficients", "full_range_flag")
                 ]
             )
-        # encode
-        image_orientation = kwargs.get("image_orientation", 1)
-        im_out.encode(
-            self.ctx_write,
+
+    @staticmethod
+    def _get_encode_options(**kwargs) -> tuple:
+        return (
             kwargs.get("primary", False),
             kwargs.get("save_nclx_profile", options.SAVE_NCLX_PROFILE),
             kwargs.get("color_primaries", -1),
             kwargs.get("transfer_characteristics", -1),
             kwargs.get("matrix_coefficients", -1),
             kwargs.get("full_range_flag", -1),
-            image_orientation,
+            kwargs.get("image_orientation", 1),
         )
-        # adding metadata
+
+    def _finish_add_image(self, im_out, size: tuple, **kwargs):
+        self._set_color_profiles(im_out, **kwargs)
+        # encode
+        with self._threads():
+            im_out.encode(self.ctx_write, *self._get_encode_options(**kwargs))
+            self._add_metadata(im_out, **kwargs)
+            # adding thumbnails
+            for thumb_box in kwargs.get("thumbnails", []):
+                if max(size) > thumb_box > 3:
+                    im_out.encode_thumbnail(self.ctx_write, thumb_box, kwargs.get("image_orientation", 1))
+
+    @contextmanager
+    def _threads(self) -> Iterator[None]:
+        """Sets the number of encoder threads from the threads budget for the duration of encoding."""
+        if not self._budget_threads:
+            yield
+            return
+        with _THREADS_BUDGET.acquire(os.cpu_count() or 1) as threads:
+            self.ctx_write.set_threads(threads)
+            yield
+
+    def _add_metadata(self, im_out, **kwargs) -> None:
         exif = kwargs.get("exif", None)
         if exif is not None:
             if isinstance(exif, Image.Exif):
@@ -448,20 +834,68 @@ class CtxEncode:
             im_out.set_xmp(self.ctx_write, xmp)
         for metadata in kwargs.get("metadata", []):
             im_out.set_metadata(self.ctx_write, metadata["type"], metadata["content_type"], metadata["data"])
-        # adding thumbnails
-        for thumb_box in kwargs.get("thumbnails", []):
-            if max(size) > thumb_box > 3:
-                im_out.encode_thumbnail(self.ctx_write, thumb_box, image_orientation)
-
-    def save(self, fp) -> None:
-        """Ask encoder to produce output based on previously added images."""
-        data = self.ctx_write.finalize()
-        if isinstance(fp, (str, Path)):
+
+    def save(self, fp, as_memoryview: bool = False) -> Union[bytes, memoryview, None]:
+        """Ask encoder to produce output based on previously added images.
+
+        Encoded data is passed to ``write`` of the file in chunks of ``bytes``, for the file objects of the ``io``
+        module the chunks are passed straight from the encoder's buffer.
+        When ``fp`` is ``None`` the encoded data is returned as ``bytes``, or as a read-only ``memoryview``
+        without an extra copy with ``as_memoryview``.
+        """
+        result = None
+        if fp is None:
+            result = self.ctx_write.finalize(None, _WRITE_CHUNK_SIZE, as_memoryview)
+            if as_memoryview:
+                result = memoryview(result)
+        elif isinstance(fp, (str, Path)):
+            # the file is created only after a successful encoding, so it is never left truncated
+            data = self.ctx_write.finalize(None, _WRITE_CHUNK_SIZE, True)
             Path(fp).write_bytes(data)
         elif hasattr(fp, "write"):
-            fp.write(data)
+            self.ctx_write.finalize(fp.write, _WRITE_CHUNK_SIZE, type(fp) in _ZERO_COPY_WRITERS)
         else:
-            raise TypeError("`fp` must be a path to file or an object with `write` method.")
+            raise TypeError("`fp` must be a path to file, an object with `write` method or `None`.")
+        _ENCODER_POOL.put(self._pool_key, self.ctx_write)
+        return result
+
+
+def _get_tile_size(tile_size) -> Optional[Tuple[int, int]]:
+    if not tile_size:
+        return None
+    tile_size = (tile_size, tile_size) if isinstance(tile_size, int) else tuple(tile_size)
+    if len(tile_size) != 2 or tile_size[0] <= 0 or tile_size[1] <= 0:
+        raise ValueError("`tile_size` must be a positive integer or a tuple with two positive integers.")
+    return tile_size
+
+
+def _iter_tiles_from_data(size: tuple, mode: str, data, stride: int, tile_size: tuple) -> Iterator[bytes]:
+    pixel_size = MODE_INFO[mode][0] * ceil(MODE_INFO[mode][1] / 8)
+    stride = stride or size[0] * pixel_size
+    data = memoryview(data).cast("B")
+    for top in range(0, size[1], tile_size[1]):
+        bottom = min(top + tile_size[1], size[1])
+        for left in range(0, size[0], tile_size[0]):
+            start = left * pixel_size
+            end = min(left + tile_size[0], size[0]) * pixel_size
+            yield b"".join(data[y * stride + start : y * stride + end] for y in range(top, bottom))
+
+
+def _pad_tile(data, size: tuple, tile_size: tuple, pixel_size: int):
+    """Pads tile of the ``size`` to the ``tile_size`` by repeating the last column and row."""
+    tile_bytes = memoryview(data).cast("B")
+    if len(tile_bytes) >= tile_size[0] * tile_size[1] * pixel_size:
+        return tile_bytes
+    row_size = size[0] * pixel_size
+    if len(tile_bytes) < row_size * size[1]:
+        raise ValueError(f"Not enough data for the tile of size {size}.")
+    pad_size = tile_size[0] - size[0]
+    rows = []
+    for i in range(size[1]):
+        row = tile_bytes[i * row_size : (i + 1) * row_size]
+        rows.append(bytes(row) + bytes(row[row_size - pixel_size :]) * pad_size if pad_size else row)
+    rows += [rows[-1]] * (tile_size[1] - size[1])
+    return b"".join(rows)
 
 
 @dataclass
@@ -477,6 +911,7 @@ class MimCImage:
         self.color_profile = None
         self.thumbnails: List[int] = []
         self.depth_image_list: List = []
+        self.thumbnail_list: List = []
         self.primary = False
         self.chroma = HeifChroma.UNDEFINED.value
         self.colorspace = HeifColorspace.UNDEFINED.value
@@ -497,3 +932,5 @@ class MimCImage:
 def load_libheif_plugin(plugin_path: Union[str, Path]) -> None:
     """Load specified LibHeif plugin."""
     _pillow_heif.load_plugin(plugin_path)
+    _get_lib_info.cache_clear()
+    _ENCODER_POOL.clear()
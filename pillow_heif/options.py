@@ -6,6 +6,36 @@ DECODE_THREADS = 4
 When use pillow_heif as a plugin you can set it with: `register_*_opener(decode_threads=8)`"""
 
 
+THREADS_BUDGET = 0
+"""Maximum number of threads that all decodes and encodes of the process use together
+
+Each decode or encode gets the number of threads it requests, but not more than the budget has free,
+and at least one thread. Set to ``0`` to use the number of CPU cores.
+To get the current usage of the budget use :py:func:`~pillow_heif.threads_usage`.
+
+.. note:: Number of encoder threads set with ``enc_params`` is not limited by the budget.
+
+When use pillow_heif as a plugin you can set it with: `register_*_opener(threads_budget=8)`"""
+
+
+PREFETCH_FRAMES = 0
+"""Number of the next frames that are decoded in background threads, while the current frame is used
+
+Frames are prefetched during iteration over a ``HeifFile`` and when Pillow's ``seek()`` goes to the next frame.
+Set to ``0`` to decode frames only when they are accessed.
+
+When use pillow_heif as a plugin you can set it with: `register_*_opener(prefetch_frames=2)`"""
+
+
+ENCODER_POOL_SIZE = 8
+"""Maximum number of idle encoders that are kept to be reused by the next saves
+
+Saves with the same format, encoder, quality and ``enc_params`` reuse the already configured encoder.
+Set to ``0`` to create a new encoder for every save.
+
+When use pillow_heif as a plugin you can set it with: `register_*_opener(encoder_pool_size=32)`"""
+
+
 THUMBNAILS = True
 """Option to enable/disable thumbnail support
 
@@ -15,6 +15,10 @@ def test_libheif_info():
     info = pillow_heif.libheif_info()
     for key in ("HEIF", "AVIF", "encoders", "decoders"):
         assert key in info
+    # information is cached, changes of the returned dictionary do not affect it
+    info["encoders"].clear()
+    info["HEIF"] = ""
+    assert pillow_heif.libheif_info() == pillow_heif.heif._pillow_heif.get_lib_info()
 
     version = pillow_heif.libheif_version()
     valid_prefixes = ["1.17.", "1.18."]
@@ -121,6 +125,11 @@ def test_light_build():
         assert info["libheif"] == expected_version
 
 
+def test_heif_module_image_classes():
+    for name in ("HeifImage", "HeifDepthImage", "HeifThumbnailImage"):
+        assert getattr(pillow_heif.heif, name) is getattr(pillow_heif, name)
+
+
 @pytest.mark.skipif(not os.getenv("TEST_PLUGIN_LOAD"), reason="Only when plugins present")
 def test_load_plugin():
     pillow_heif.load_libheif_plugin(os.environ["TEST_PLUGIN_LOAD"])
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+
+import helpers
+import pytest
+from PIL import Image
+
+import pillow_heif
+from pillow_heif.misc import _THREADS_BUDGET
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_executor_priority_order():
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def blocker():
+        started.set()
+        release.wait(10)
+
+    with pillow_heif.HeifExecutor(workers=1) as executor:
+        executor.submit(blocker)
+        assert started.wait(10)
+        futures = [executor.submit(order.append, i, priority=i) for i in ("low", "normal", "high", "low", "high")]
+        stats = executor.stats()
+        assert stats["high"]["queued"] == 2
+        assert stats["low"]["queued"] == 2
+        assert stats["normal"]["running"] == 1
+        release.set()
+        for future in futures:
+            future.result()
+    assert order == ["high", "high", "normal", "low", "low"]
+    stats = executor.stats()
+    assert stats["high"]["completed"] == 2
+    assert stats["normal"]["completed"] == 2
+    assert stats["low"]["queued"] == 0
+    assert stats["low"]["max_wait_time"] >= stats["low"]["mean_wait_time"] > 0
+
+
+def test_executor_low_priority_yields():
+    release = threading.Event()
+    with pillow_heif.HeifExecutor(workers=2) as executor:
+        low = [executor.submit(release.wait, 10, priority="low") for _ in range(2)]
+        high = executor.submit(lambda: "done", priority="high")
+        assert high.result(10) == "done"
+        assert executor.stats()["low"]["running"] == 1
+        release.set()
+        for future in low:
+            assert future.result(10)
+
+
+@mock.patch("pillow_heif.options.THREADS_BUDGET", 8)
+def test_executor_threads_limit():
+    def granted_threads():
+        with _THREADS_BUDGET.acquire(6) as threads:
+            return threads
+
+    with pillow_heif.HeifExecutor(workers=4) as executor:
+        for priority, threads in (("high", 6), ("normal", 2), ("low", 1)):
+            assert executor.submit(granted_threads, priority=priority).result() == threads
+        heif_file = executor.open_heif("images/heif_other/arrow.heic").result()
+        assert executor.load(heif_file, priority="low").result() is heif_file
+        assert heif_file[0]._data
+
+
+def test_executor_open_load_save():
+    with pillow_heif.HeifExecutor(workers=2) as executor:
+        heif_file = executor.open_heif("images/heif/zPug_3.heic", priority="high").result()
+        image = executor.load(heif_file[0], priority="low").result()
+        assert image._data
+        out = BytesIO()
+        assert executor.save(heif_file, out, quality=-1).result() is None
+    helpers.compare_heif_files_fields(pillow_heif.open_heif(out), heif_file)
+
+
+def test_executor_errors():
+    with pytest.raises(ValueError):
+        pillow_heif.HeifExecutor(workers=-1)
+    executor = pillow_heif.HeifExecutor(workers=1)
+    with pytest.raises(ValueError):
+        executor.submit(print, priority="urgent")
+    future = executor.open_heif(b"invalid data")
+    with pytest.raises(ValueError):
+        future.result()
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+
+def test_executor_shutdown_cancel():
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(10)
+
+    executor = pillow_heif.HeifExecutor(workers=1)
+    executor.submit(blocker)
+    assert started.wait(10)
+    queued = executor.submit(Image.new, "RGB", (8, 8))
+    executor.shutdown(wait=False, cancel_futures=True)
+    release.set()
+    executor.shutdown()
+    assert queued.cancelled()
+    assert executor.stats()["normal"]["queued"] == 0
+    assert executor.stats()["normal"]["cancelled"] == 1
+    assert executor.stats()["normal"]["completed"] == 1
+
+
+def test_executor_stats_cancelled():
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(10)
+
+    with pillow_heif.HeifExecutor(workers=1) as executor:
+        executor.submit(blocker, priority="high")
+        assert started.wait(10)
+        pending = [executor.submit(Image.new, "RGB", (8, 8), priority="low") for _ in range(3)]
+        assert pending[0].cancel()
+        assert pending[2].cancel()
+        release.set()
+        assert pending[1].result(10)
+    # cancelled tasks that were waiting in the queue are neither completed nor taken into the wait time
+    stats = executor.stats()
+    assert stats["high"]["completed"] == 1
+    assert stats["low"]["queued"] == 0
+    assert stats["low"]["running"] == 0
+    assert stats["low"]["completed"] == 1
+    assert stats["low"]["cancelled"] == 2
+    assert stats["low"]["mean_wait_time"] == stats["low"]["max_wait_time"] > 0
+
+
+def test_async_open_load_save():
+    async def main():
+        heif_file = await pillow_heif.aopen_heif("images/heif/zPug_3.heic")
+        await heif_file[0].aload(priority="high")
+        assert heif_file[0]._data
+        await heif_file.aload()
+        out = BytesIO()
+        await heif_file.asave(out, quality=-1)
+        return heif_file, out
+
+    heif_file, out = asyncio.run(main())
+    helpers.compare_heif_files_fields(pillow_heif.open_heif(out), heif_file)
+
+
+def test_async_custom_executor():
+    async def main(executor):
+        heif_file = await pillow_heif.aopen_heif("images/heif/zPug_3.heic", executor=executor, primary_only=True)
+        await heif_file[0].aload(executor=executor)
+        with pytest.raises(ValueError):
+            await pillow_heif.aopen_heif(b"invalid data", executor=executor)
+        return heif_file
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        heif_file = asyncio.run(main(executor))
+    assert len(heif_file) == 1
+    assert heif_file[0]._data
+
+
+def test_async_bounded():
+    release = threading.Event()
+
+    async def main(executor):
+        with mock.patch("pillow_heif.executor.open_heif", lambda *args, **kwargs: release.wait(10)):
+            tasks = [asyncio.ensure_future(pillow_heif.aopen_heif(b"", executor=executor)) for _ in range(5)]
+            tasks.append(asyncio.ensure_future(pillow_heif.aopen_heif(b"", executor=executor, priority="high")))
+            await asyncio.sleep(0.05)
+            stats = executor.stats()
+            assert stats["normal"]["running"] + stats["normal"]["queued"] == 2
+            assert stats["high"]["queued"] == 1
+            release.set()
+            await asyncio.gather(*tasks)
+
+    with pillow_heif.HeifExecutor(workers=2) as executor:
+        asyncio.run(main(executor))
+    assert executor.stats()["normal"]["completed"] == 5
+    assert executor.stats()["high"]["completed"] == 1
+
+
+def test_async_cancel():
+    release = threading.Event()
+
+    async def main(executor):
+        heif_file = await pillow_heif.aopen_heif("images/heif/zPug_3.heic", executor=executor)
+        executor.submit(release.wait, 10)
+        task = asyncio.ensure_future(heif_file[0].aload(executor=executor))
+        await asyncio.sleep(0.01)
+        assert executor.stats()["normal"]["queued"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+        return heif_file
+
+    with pillow_heif.HeifExecutor(workers=1) as executor:
+        heif_file = asyncio.run(main(executor))
+    assert not heif_file[0]._data
+    assert executor.stats()["normal"]["queued"] == 0
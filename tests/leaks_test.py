@@ -4,12 +4,14 @@ from io import BytesIO
 from os import chdir, path
 from pathlib import Path
 from platform import machine
+from unittest import mock
 
 import helpers
 import pytest
 from PIL import Image, ImageSequence
 
 import pillow_heif
+from pillow_heif.misc import _ENCODER_POOL
 
 pytest.importorskip("pympler", reason="`pympler` not installed")
 pytest.importorskip("numpy", reason="`numpy` not installed")
@@ -18,6 +20,14 @@ chdir(path.join(path.dirname(path.dirname(path.abspath(__file__))), "tests"))
 pillow_heif.register_heif_opener()
 
 
+@pytest.fixture(autouse=True)
+def no_encoder_pool():
+    # idle encoders are kept between the saves and would be counted as the leaked objects
+    _ENCODER_POOL.clear()
+    with mock.patch.object(pillow_heif.options, "ENCODER_POOL_SIZE", 0):
+        yield
+
+
 def perform_open_save(iterations, image_path):
     for _ in range(iterations):
         image = Image.open(image_path)
@@ -64,6 +64,18 @@ def test_pillow_primary_image(save_format):
     assert heif_file_out.tell() == 2
 
 
+@pytest.mark.skipif(not hevc_enc(), reason="Requires HEVC encoder.")
+def test_primary_attrs_lazy():
+    heif_buf = create_heif((64, 64), n_images=3, primary_index=1)
+    heif_file = pillow_heif.open_heif(heif_buf)
+    assert heif_file._get_primary_attrs() == [False, True, False]
+    assert heif_file._images == [None, None, None]
+    heif_file[1].info["primary"] = False
+    heif_file[2].info["primary"] = True
+    assert heif_file._get_primary_attrs() == [False, False, True]
+    assert heif_file._images[0] is None
+
+
 @pytest.mark.skipif(not aom(), reason="Requires AVIF support.")
 @pytest.mark.skipif(not hevc_enc(), reason="Requires HEVC encoder.")
 @pytest.mark.skipif(
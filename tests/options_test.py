@@ -16,7 +16,10 @@ from pillow_heif import (
     read_heif,
     register_avif_opener,
     register_heif_opener,
+    threads_usage,
 )
+from pillow_heif.constants import HeifCompressionFormat
+from pillow_heif.misc import _ENCODER_POOL, _THREADS_BUDGET, CtxEncode
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -35,6 +38,9 @@ def test_options_change_from_plugin_registering(register_opener):
             save_nclx_profile=False,
             preferred_encoder={"HEIF": "id1", "AVIF": "id2"},
             preferred_decoder={"HEIF": "id3", "AVIF": "id4"},
+            threads_budget=6,
+            prefetch_frames=2,
+            encoder_pool_size=3,
         )
         assert not options.THUMBNAILS
         assert options.QUALITY == 69
@@ -44,6 +50,9 @@ def test_options_change_from_plugin_registering(register_opener):
         assert options.SAVE_NCLX_PROFILE is False
         assert options.PREFERRED_ENCODER == {"HEIF": "id1", "AVIF": "id2"}
         assert options.PREFERRED_DECODER == {"HEIF": "id3", "AVIF": "id4"}
+        assert options.THREADS_BUDGET == 6
+        assert options.PREFETCH_FRAMES == 2
+        assert options.ENCODER_POOL_SIZE == 3
     finally:
         options.THUMBNAILS = True
         options.QUALITY = None
@@ -53,6 +62,9 @@ def test_options_change_from_plugin_registering(register_opener):
         options.SAVE_NCLX_PROFILE = True
         options.PREFERRED_ENCODER = {"HEIF": "", "AVIF": ""}
         options.PREFERRED_DECODER = {"HEIF": "", "AVIF": ""}
+        options.THREADS_BUDGET = 0
+        options.PREFETCH_FRAMES = 0
+        options.ENCODER_POOL_SIZE = 8
 
 
 @pytest.mark.skipif(not hevc_enc(), reason="No HEVC encoder.")
@@ -113,6 +125,117 @@ def test_decode_threads():
         options.DECODE_THREADS = 4
 
 
+@mock.patch("pillow_heif.options.THREADS_BUDGET", 3)
+def test_threads_budget():
+    assert threads_usage() == {"budget": 3, "threads": 0, "operations": 0}
+    acquire = _THREADS_BUDGET.acquire
+    with acquire(2) as threads1, acquire(4) as threads2, acquire(4) as threads3:
+        assert (threads1, threads2, threads3) == (2, 1, 1)
+        assert threads_usage() == {"budget": 3, "threads": 4, "operations": 3}
+    assert threads_usage()["threads"] == 0
+    assert threads_usage()["operations"] == 0
+    with mock.patch("pillow_heif.options.THREADS_BUDGET", 0):
+        assert threads_usage()["budget"] == (os.cpu_count() or 1)
+
+
+@mock.patch("pillow_heif.options.THREADS_BUDGET", 3)
+def test_threads_budget_decode():
+    heif_file = open_heif("images/heif_other/arrow.heic", decode_threads=8)
+    with mock.patch.object(_THREADS_BUDGET, "acquire", wraps=_THREADS_BUDGET.acquire) as acquire:
+        heif_file[0].load()
+        heif_file[0].unload()
+        heif_file[0].to_pillow()
+    assert [i.args for i in acquire.call_args_list] == [(8,), (8,)]
+    assert heif_file._ctx_file.decode_threads == 8
+
+
+@mock.patch("pillow_heif.options.THREADS_BUDGET", 3)
+def test_threads_budget_decode_of_image():
+    class CImage:
+        def __init__(self, c_image):
+            object.__setattr__(self, "c_image", c_image)
+            object.__setattr__(self, "decode_threads", [])
+
+        def __getattr__(self, name):
+            return getattr(self.c_image, name)
+
+        def __setattr__(self, name, value):
+            if name == "decode_threads":
+                self.decode_threads.append(value)
+            setattr(self.c_image, name, value)
+
+    heif_file = open_heif("images/heif_other/arrow.heic", decode_threads=8)
+    assert heif_file[0]._c_image.decode_threads == -1
+    c_image = heif_file[0]._c_image = CImage(heif_file[0]._c_image)
+    heif_file[0].load()
+    # the granted threads are set for the one decoding of the image and are reset after it
+    assert c_image.decode_threads == [3, -1]
+    assert c_image.c_image.decode_threads == -1
+    assert heif_file._ctx_file.decode_threads == 8
+    assert not hasattr(heif_file._ctx_file, "set_decoding_threads")
+    with pytest.raises(ValueError):
+        c_image.c_image.decode_threads = -2
+
+
+@pytest.mark.skipif(not hevc_enc(), reason="No HEVC encoder.")
+@pytest.mark.skipif(not aom(), reason="Requires AVIF support.")
+@mock.patch("pillow_heif.options.THREADS_BUDGET", 2)
+def test_threads_budget_encode():
+    im = Image.new("RGB", (64, 64))
+    for compression_format in (HeifCompressionFormat.HEVC, HeifCompressionFormat.AV1):
+        ctx = CtxEncode(compression_format)
+        assert ctx.ctx_write.set_threads(2)
+        with mock.patch.object(_THREADS_BUDGET, "acquire", wraps=_THREADS_BUDGET.acquire) as acquire:
+            ctx.add_image(im.size, im.mode, im.tobytes())
+        acquire.assert_called_once()
+        enc_params = {"x265:pools": 1} if compression_format == HeifCompressionFormat.HEVC else {"threads": 1}
+        ctx = CtxEncode(compression_format, enc_params=enc_params)
+        with mock.patch.object(_THREADS_BUDGET, "acquire", wraps=_THREADS_BUDGET.acquire) as acquire:
+            ctx.add_image(im.size, im.mode, im.tobytes())
+        acquire.assert_not_called()
+
+
+@pytest.mark.skipif(not hevc_enc(), reason="No HEVC encoder.")
+@mock.patch("pillow_heif.options.ENCODER_POOL_SIZE", 2)
+def test_encoder_pool():
+    _ENCODER_POOL.clear()
+    im = Image.new("RGB", (64, 64))
+    ctx = CtxEncode(HeifCompressionFormat.HEVC, quality=90)
+    ctx_write = ctx.ctx_write
+    ctx.add_image(im.size, im.mode, im.tobytes())
+    ctx.save(BytesIO())
+    assert _ENCODER_POOL.size == 1
+    # encoder with the same settings is reused and the new file does not contain images of the previous one
+    ctx = CtxEncode(HeifCompressionFormat.HEVC, quality=90)
+    assert ctx.ctx_write is ctx_write
+    assert _ENCODER_POOL.size == 0
+    for _ in range(2):
+        ctx.add_image(im.size, im.mode, im.tobytes())
+    out = BytesIO()
+    ctx.save(out)
+    assert len(open_heif(out)) == 2
+    assert CtxEncode(HeifCompressionFormat.HEVC, quality=91).ctx_write is not ctx_write
+    assert CtxEncode(HeifCompressionFormat.HEVC, quality=90, chroma=444).ctx_write is not ctx_write
+    # the least recently used encoders are dropped from the full pool
+    for quality in (50, 60, 70):
+        ctx = CtxEncode(HeifCompressionFormat.HEVC, quality=quality)
+        ctx.add_image(im.size, im.mode, im.tobytes())
+        ctx.save(BytesIO())
+    assert _ENCODER_POOL.size == 2
+    assert _ENCODER_POOL.get(_get_pool_key(50)) is None
+    assert _ENCODER_POOL.get(_get_pool_key(70)) is not None
+    with mock.patch("pillow_heif.options.ENCODER_POOL_SIZE", 0):
+        ctx = CtxEncode(HeifCompressionFormat.HEVC, quality=60)
+        ctx.add_image(im.size, im.mode, im.tobytes())
+        ctx.save(BytesIO())
+    assert _ENCODER_POOL.size == 0
+    _ENCODER_POOL.clear()
+
+
+def _get_pool_key(quality: int) -> tuple:
+    return int(HeifCompressionFormat.HEVC), quality, "", ()
+
+
 def test_allow_incorrect_headers():
     test_image = "images/heif_special/L_8__29(255)x100.heif"
     with pytest.raises(expected_exception=(UnidentifiedImageError, ValueError)):  # noqa
@@ -136,3 +259,18 @@ def test_depth_option():
     assert not im.info["depth_images"]
     im = Image.open("images/heif_other/pug.heic")
     assert not im.info["depth_images"]
+
+
+def test_lazy_info_options():
+    with mock.patch("pillow_heif.options.DEPTH_IMAGES", False), mock.patch("pillow_heif.options.THUMBNAILS", False):
+        im = open_heif("images/heif_other/pug.heic")
+        im_thumbnails = open_heif("images/heif/zPug_3.heic")
+    assert im[0]._info is None
+    assert not im.info["depth_images"]
+    assert not im_thumbnails[0].thumbnails
+    assert not im_thumbnails[0].info["thumbnails"]
+    im = open_heif("images/heif_other/pug.heic")
+    im_thumbnails = open_heif("images/heif/zPug_3.heic")
+    assert len(im.info["depth_images"]) == 1
+    assert len(im_thumbnails[0].thumbnails) == 2
+    assert im_thumbnails[0].info["thumbnails"] == [32, 16]
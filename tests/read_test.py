@@ -1,5 +1,7 @@
 import builtins
 import os
+import struct
+from concurrent.futures import wait
 from copy import copy, deepcopy
 from gc import collect
 from io import BytesIO
@@ -13,6 +15,7 @@ from packaging.version import parse as parse_version
 from PIL import Image, ImageCms, ImageSequence, UnidentifiedImageError
 
 import pillow_heif
+from pillow_heif.misc import _THREADS_BUDGET
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -235,11 +238,260 @@ def test_to_from_pillow(image_path):
     helpers.compare_heif_files_fields(heif_file, heif_from_pillow, ignore=["primary_index", "mimetype"])
 
 
+@pytest.mark.parametrize("image_path", dataset.MINIMAL_DATASET)
+def test_probe(image_path):
+    for convert_hdr_to_8bit in (True, False):
+        heif_file = pillow_heif.open_heif(image_path, convert_hdr_to_8bit=convert_hdr_to_8bit)
+        result = pillow_heif.probe(image_path, convert_hdr_to_8bit=convert_hdr_to_8bit)
+        assert result.mimetype == heif_file.mimetype
+        assert result.brand == Path(image_path).read_bytes()[8:12].decode()
+        assert result.primary_index == heif_file.primary_index
+        assert result.size == heif_file.size
+        assert result.mode == heif_file.mode
+        assert len(result.images) == len(heif_file)
+        for probe_image, image in zip(result.images, heif_file):
+            assert probe_image.size == image.size
+            assert probe_image.mode == image.mode
+            assert probe_image.bit_depth == image.info["bit_depth"]
+            assert probe_image.has_alpha == image.has_alpha
+            assert probe_image.primary == image.info["primary"]
+
+
+def test_probe_inputs():
+    data = Path("images/heif/zPug_3.heic").read_bytes()
+    expected = pillow_heif.probe("images/heif/zPug_3.heic")
+    assert expected.primary_index == 1
+    assert [i.size for i in expected.images] == [(64, 64), (64, 64), (96, 64)]
+    assert [i.mode for i in expected.images] == ["RGB", "L", "RGB"]
+    assert pillow_heif.probe(data) == expected
+    assert pillow_heif.probe(BytesIO(data)) == expected
+    assert pillow_heif.probe(Path("images/heif/zPug_3.heic"), mmap=True) == expected
+    assert pillow_heif.probe(lambda offset, size: data[offset : offset + size]) == expected
+    with pytest.raises(ValueError):
+        pillow_heif.probe(b"invalid data")
+
+
+def test_heif_lazy_images():
+    heif_file = pillow_heif.open_heif("images/heif_other/nokia/bird_burst.heic")
+    assert len(heif_file) == 4
+    assert heif_file._images == [None] * 4
+    assert heif_file.size == heif_file[heif_file.primary_index].size
+    assert [i is None for i in heif_file._images] == [i != heif_file.primary_index for i in range(4)]
+    assert heif_file[3] is heif_file[3]
+    assert heif_file.get_by_id(heif_file.item_ids[3]) is heif_file[3]
+    with pytest.raises(KeyError):
+        heif_file.get_by_id(12345)
+    heif_file.add_from_heif(heif_file[0])
+    assert heif_file.item_ids[4] is None
+    del heif_file[1]
+    assert heif_file.get_by_id(heif_file.item_ids[2]) is heif_file[2]
+
+
+def test_heif_open_selected_images():
+    heif_file = pillow_heif.open_heif("images/heif/zPug_3.heic")
+    heif_file_selected = pillow_heif.open_heif("images/heif/zPug_3.heic", images=[2, 1])
+    assert len(heif_file_selected) == 2
+    assert heif_file_selected.item_ids == [heif_file.item_ids[2], heif_file.item_ids[1]]
+    assert heif_file_selected.primary_index == 1
+    helpers.compare_heif_files_fields(heif_file_selected[0], heif_file[2])
+    helpers.compare_heif_files_fields(heif_file_selected[1], heif_file[1])
+    heif_file_primary = pillow_heif.open_heif("images/heif/zPug_3.heic", primary_only=True)
+    assert len(heif_file_primary) == 1
+    assert heif_file_primary.primary_index == 0
+    helpers.compare_heif_files_fields(heif_file_primary[0], heif_file[1])
+    assert pillow_heif.open_heif("images/heif/zPug_3.heic", images=[0]).primary_index == 0
+    assert len(pillow_heif.probe("images/heif/zPug_3.heic", primary_only=True).images) == 1
+    with pytest.raises(IndexError):
+        pillow_heif.open_heif("images/heif/zPug_3.heic", images=[3])
+
+
+def test_heif_unload():
+    heif_file = pillow_heif.open_heif("images/heif/zPug_3.heic")
+    data = heif_file[0].data
+    expected = bytes(data)
+    heif_file[0].unload()
+    assert not heif_file[0]._data
+    assert bytes(data) == expected
+    assert bytes(heif_file[0].data) == expected
+    heif_file[0].unload()
+    heif_file[0].draft("RGB", (32, 32))
+    assert heif_file[0].size == (32, 32)
+    assert len(heif_file[0].data) == 32 * 32 * 3
+    heif_file[0].unload()
+    assert heif_file[0].size == (32, 32)
+    assert len(heif_file[0].data) == 32 * 32 * 3
+    image = pillow_heif.from_bytes("L", (2, 2), b"1234")[0]
+    image.unload()
+    assert image.data == b"1234"
+
+
+@pytest.mark.parametrize("kwargs", ({"max_decoded_images": 2}, {"max_decoded_bytes": 1280 * 720 * 3 * 2}))
+def test_heif_decoded_images_limit(kwargs):
+    heif_file = pillow_heif.open_heif("images/heif_other/nokia/bird_burst.heic", **kwargs)
+    expected = pillow_heif.open_heif("images/heif_other/nokia/bird_burst.heic")
+    for image, image_expected in zip(heif_file, expected):
+        assert bytes(image.data) == bytes(image_expected.data)
+    assert [bool(i._data) for i in heif_file] == [False, False, True, True]
+    assert heif_file[0].data
+    assert [bool(i._data) for i in heif_file] == [True, False, False, True]
+
+
+def test_heif_low_memory():
+    heif_file = pillow_heif.open_heif("images/heif/zPug_3.heic", low_memory=True)
+    expected = pillow_heif.open_heif("images/heif/zPug_3.heic")
+    assert len(heif_file[0].thumbnails) == 2
+    heif_file[0].load()
+    heif_file[1].load()
+    assert heif_file._ctx_file is not None
+    heif_file[2].load()
+    assert heif_file._ctx_file is None
+    assert len(heif_file[0].thumbnails) == 2
+    assert not heif_file[1].thumbnails
+    assert heif_file[1].info["thumbnails"] == expected[1].info["thumbnails"]
+    assert not heif_file[1].info["depth_images"]
+    for image, image_expected in zip(heif_file, expected):
+        assert bytes(image.data) == bytes(image_expected.data)
+        assert image.info["exif"] == image_expected.info["exif"]
+    out_heif = BytesIO()
+    heif_file.save(out_heif, quality=-1)
+    helpers.compare_heif_files_fields(pillow_heif.open_heif(out_heif), expected, ignore=["thumbnails"])
+
+
+def test_heif_prefetch_frames():
+    heif_file = pillow_heif.open_heif("images/heif_other/nokia/bird_burst.heic", prefetch_frames=2)
+    expected = pillow_heif.open_heif("images/heif_other/nokia/bird_burst.heic")
+    for i, image in enumerate(heif_file):
+        assert image._data
+        assert all(heif_file._images[k] is not None for k in range(i, min(i + 3, len(heif_file))))
+        assert bytes(image.data) == bytes(expected[i].data)
+    heif_file = pillow_heif.open_heif("images/heif_other/nokia/bird_burst.heic", prefetch_frames=1)
+    frames = iter(heif_file)
+    image = next(frames)
+    assert image._data
+    frames.close()
+    assert heif_file._images[1]._data
+    assert heif_file._images[2] is None
+
+
+@pytest.mark.parametrize("workers", (None, 1, 3))
+def test_heif_load_all(workers):
+    heif_file = pillow_heif.open_heif("images/heif_other/nokia/bird_burst.heic", decode_threads=2, prefetch_frames=2)
+    expected = pillow_heif.read_heif("images/heif_other/nokia/bird_burst.heic")
+    with mock.patch.object(_THREADS_BUDGET, "acquire", wraps=_THREADS_BUDGET.acquire) as acquire:
+        heif_file.load_all(workers=workers)
+    cpu_count = os.cpu_count() or 1
+    used_workers = min(workers or cpu_count, len(heif_file))
+    decode_threads = 2 if used_workers == 1 else max(1, min(2, cpu_count // used_workers))
+    assert [i.args for i in acquire.call_args_list] == [(decode_threads,)] * len(heif_file)
+    assert heif_file._ctx_file.decode_threads == 2
+    for image, image_expected in zip(heif_file, expected):
+        assert image._data
+        assert bytes(image.data) == bytes(image_expected.data)
+
+
+def test_heif_load_all_invalid():
+    heif_file = pillow_heif.open_heif("images/heif/zPug_3.heic")
+    with pytest.raises(ValueError):
+        heif_file.load_all(workers=-1)
+    with pytest.raises(AttributeError):
+        heif_file._ctx_file.decode_threads = 1
+    pillow_heif.HeifFile().load_all()
+    heif_file = pillow_heif.from_pillow(Image.new("RGB", (64, 64)))
+    heif_file.load_all(workers=2)
+    assert len(heif_file[0].data) == 64 * 64 * 3
+
+
+def test_pillow_prefetch_frames():
+    im_expected = Image.open("images/heif_other/nokia/bird_burst.heic")
+    with mock.patch.object(pillow_heif.options, "PREFETCH_FRAMES", 2):
+        im = Image.open("images/heif_other/nokia/bird_burst.heic")
+        for frame, frame_expected in zip(ImageSequence.Iterator(im), ImageSequence.Iterator(im_expected)):
+            helpers.assert_image_equal(frame, frame_expected)
+        im.seek(0)
+        im.load()
+        im.seek(1)
+        im.draft("RGB", (320, 180))
+        assert im.size[0] < 1280
+        im.load()
+        im.seek(2)
+        im.load()
+        im.close()
+
+
+def test_pillow_prefetch_frames_with_exit():
+    with mock.patch.object(pillow_heif.options, "PREFETCH_FRAMES", 2):
+        with Image.open("images/heif_other/nokia/bird_burst.heic") as im:
+            for frame in ImageSequence.Iterator(im):
+                frame.load()
+                futures = list(im._LibHeifImageFile__prefetched.values())
+                assert futures
+                break
+        assert not im._LibHeifImageFile__prefetched
+        assert im._LibHeifImageFile__prefetch_executor is None
+        # frames that were being decoded are finished, others are cancelled
+        assert not [future for future in futures if not future.running() and not future.done()]
+        wait(futures)
+        assert all(future.cancelled() or future.result() is not None for future in futures)
+
+
 def test_heif_file_to_pillow():
     heif_file = pillow_heif.open_heif(Path("images/heif/zPug_3.heic"))
     helpers.assert_image_equal(heif_file.to_pillow(), heif_file[1].to_pillow())
 
 
+@pytest.mark.parametrize(
+    "img_path",
+    (
+        "images/heif/zPug_3.heic",
+        "images/heif/RGBA_8__29x100.heif",
+        "images/heif/L_10__29x100.heif",
+        "images/heif/RGB_12__29x100.heif",
+    ),
+)
+def test_heif_to_pillow_zero_copy(img_path):
+    heif_file = pillow_heif.open_heif(img_path)
+    for image in heif_file:
+        pillow_image = image.to_pillow()
+        assert not image._data
+        expected = Image.frombytes(image.mode, image.size, image.data, "raw", image.mode, image.stride)
+        helpers.assert_image_equal(pillow_image, expected)
+        assert pillow_image.tobytes() == expected.tobytes()
+        assert not pillow_image.readonly
+        pixel = expected.getpixel((0, 0))
+        pillow_image.putpixel((0, 0), pixel ^ 1 if isinstance(pixel, int) else tuple(i ^ 1 for i in pixel))
+        assert pillow_image.getpixel((0, 0)) != expected.getpixel((0, 0))
+        helpers.assert_image_equal(image.to_pillow(), expected)
+
+
+@pytest.mark.parametrize(
+    "img_path",
+    ("images/heif/zPug_3.heic", "images/heif/RGBA_8__29x100.heif", "images/heif/RGB_12__29x100.heif"),
+)
+def test_heif_to_pillow_without_map_buffer(img_path, monkeypatch):
+    monkeypatch.delattr(Image.core, "map_buffer")
+    heif_file = pillow_heif.open_heif(img_path)
+    for image in heif_file:
+        pillow_image = image.to_pillow()
+        assert not pillow_image.readonly
+        expected = Image.frombytes(image.mode, image.size, image.data, "raw", image.mode, image.stride)
+        helpers.assert_image_equal(pillow_image, expected)
+
+
+def test_pillow_zero_copy():
+    expected = pillow_heif.open_heif("images/heif/zPug_3.heic")[0]
+    im = Image.open("images/heif/zPug_3.heic")
+    im.seek(0)
+    im.load()
+    assert not getattr(im, "_heif_file")[0]._data
+    assert im.tobytes() == bytes(expected.data)
+    helpers.assert_image_equal(im.convert("RGBA").convert("RGB"), im)
+    im.putpixel((0, 0), (1, 2, 3))
+    im.seek(1)
+    im.load()
+    im.seek(0)
+    assert im.tobytes() == bytes(expected.data)
+
+
 def test_heif_zpug_image():
     heif_file = pillow_heif.open_heif(Path("images/heif/zPug_3.heic"))
     assert heif_file[0].mode == "RGB"
@@ -543,3 +795,282 @@ def test_dav1d_decoder():
         Image.open("images/heif/RGB_8__128x128.avif").load()
     finally:
         pillow_heif.options.PREFERRED_DECODER["AVIF"] = ""
+
+
+@pytest.mark.parametrize("reduce", (2, 4, 8))
+@pytest.mark.parametrize("img_path", ("images/heif/RGB_8__29x100.heif", "images/heif/L_8__29x100.heif"))
+def test_heif_draft(img_path, reduce):
+    im_full = pillow_heif.open_heif(img_path)[0]
+    im = pillow_heif.open_heif(img_path)[0]
+    mode, box = im.draft(None, (im_full.size[0] // reduce, im_full.size[1] // reduce))
+    assert mode == im.mode
+    assert box == (0, 0, im_full.size[0] / reduce, im_full.size[1] / reduce)
+    assert im.size == ((im_full.size[0] + reduce - 1) // reduce, (im_full.size[1] + reduce - 1) // reduce)
+    assert im.to_pillow().size == im.size
+    assert im.stride == im.size[0] * len(im.mode)
+    helpers.assert_image_similar(im.to_pillow(), im_full.to_pillow().reduce(reduce), 2)
+    assert im.draft(None, (1, 1)) is None  # already decoded
+
+
+def test_heif_draft_not_reduced():
+    im = pillow_heif.open_heif("images/heif/RGB_8__29x100.heif")[0]
+    assert im.draft(None, (20, 20)) is None
+    assert im.draft(None, None) is None
+    assert im.size == (29, 100)
+
+
+def test_heif_draft_twice():
+    im_full = pillow_heif.open_heif("images/heif/RGB_8__29x100.heif")[0]
+    im = pillow_heif.open_heif("images/heif/RGB_8__29x100.heif")[0]
+    assert im.draft(None, (14, 50))[1] == (0, 0, 14.5, 50.0)
+    assert im.draft(None, (14, 50))[1] == (0, 0, 14.5, 50.0)
+    assert im.size == (15, 50)
+    assert im.draft(None, (7, 25))[1] == (0, 0, 7.25, 25.0)
+    assert im.size == (8, 25)
+    assert im.draft(None, (20, 20)) is None
+    assert im.size == (29, 100)
+    assert im.draft(None, (14, 50))[1] == (0, 0, 14.5, 50.0)
+    im.load()
+    assert im.size == (15, 50)
+    helpers.assert_image_similar(im.to_pillow(), im_full.to_pillow().reduce(2), 2)
+
+
+def test_pillow_draft_twice():
+    im_full = Image.open("images/heif_other/pug.heic")
+    im_full.load()
+    im = Image.open("images/heif_other/pug.heic")
+    size = (im_full.size[0] // 4, im_full.size[1] // 4)
+    assert im.draft(None, size)[0] == im.mode
+    assert im.draft(None, size)[0] == im.mode
+    assert im.size == size
+    im.load()
+    assert im.size == size
+    helpers.assert_image_similar(im, im_full.reduce(4), 1)
+
+
+def test_pillow_draft():
+    im_full = Image.open("images/heif_other/pug.heic")
+    im_full.load()
+    im = Image.open("images/heif_other/pug.heic")
+    assert im.draft(None, (im_full.size[0] // 4, im_full.size[1] // 4))[0] == im.mode
+    assert im.size == (im_full.size[0] // 4, im_full.size[1] // 4)
+    im.load()
+    helpers.assert_image_similar(im, im_full.reduce(4), 1)
+    im = Image.open("images/heif_other/pug.heic")
+    im.thumbnail((64, 64))
+    im_full.thumbnail((64, 64))
+    assert im.size == im_full.size
+    helpers.assert_image_similar(im, im_full, 2)
+
+
+def test_pillow_draft_animated():
+    im = Image.open("images/heif/zPug_3.heic")
+    im.seek(1)
+    assert im.draft(None, (8, 8))[1] == (0, 0, 8.0, 8.0)
+    im.load()
+    assert im.size == (8, 8)
+    im.seek(2)
+    assert im.size == (96, 64)
+    im.load()
+    assert im.draft(None, (16, 16)) is None
+
+
+@pytest.mark.parametrize(
+    "img_path,box",
+    (
+        ("images/heif_other/pug.heic", (1000, 700, 1900, 1500)),  # grid image
+        ("images/heif_other/pug.heic", (4000, 3000, 4032, 3024)),
+        ("images/heif_other/arrow.heic", (100, 200, 1700, 3000)),  # grid image with rotation
+        ("images/heif/RGBA_10__29x100.heif", (3, 4, 20, 90)),
+    ),
+)
+@pytest.mark.parametrize("kwargs", ({}, {"convert_hdr_to_8bit": False, "bgr_mode": True}, {"remove_stride": False}))
+def test_heif_decode_region(img_path, box, kwargs):
+    heif_file = pillow_heif.open_heif(img_path, **kwargs)
+    region = heif_file[0].decode_region(box)
+    assert not heif_file[0]._data
+    assert region.size == (box[2] - box[0], box[3] - box[1])
+    assert region.mode == heif_file[0].mode
+    assert region.stride == region.size[0] * len(region.data) // (region.size[0] * region.size[1])
+    if helpers.np is None:
+        helpers.assert_image_equal(region.to_pillow(), heif_file[0].to_pillow().crop(box))
+    else:
+        region_array = helpers.np.asarray(region)
+        assert (region_array == helpers.np.asarray(heif_file[0])[box[1] : box[3], box[0] : box[2]]).all()
+
+
+def test_heif_decode_region_from_bytes():
+    heif_file = pillow_heif.from_pillow(helpers.gradient_rgba())
+    region = heif_file[0].decode_region((10, 20, 100, 50))
+    helpers.assert_image_equal(region.to_pillow(), helpers.gradient_rgba().crop((10, 20, 100, 50)))
+
+
+@pytest.mark.parametrize("box", ((0, 0, 0, 10), (-1, 0, 10, 10), (0, 0, 30, 10), (10, 10, 5, 20)))
+def test_heif_decode_region_invalid(box):
+    heif_file = pillow_heif.open_heif("images/heif/RGB_8__29x100.heif")
+    with pytest.raises(ValueError):
+        heif_file[0].decode_region(box)
+    with pytest.raises(ValueError):
+        pillow_heif.from_pillow(heif_file[0].to_pillow())[0].decode_region(box)
+
+
+@pytest.mark.skipif(not helpers.hevc_enc(), reason="Requires HEVC encoder.")
+def test_heif_decode_region_overlay():
+    # turn the grid item of a file with two 64x64 tiles into `iovl` overlay of the same images with an offset
+    data = bytearray(
+        pillow_heif.encode(
+            "RGB", (128, 64), helpers.gradient_rgb().resize((128, 64)).tobytes(), None, tile_size=64, quality=-1
+        )
+    )
+    infe = data.index(b"grid", data.index(b"iinf"))
+    data[infe : infe + 4] = b"iovl"
+    overlay_id = struct.unpack(">H", data[infe - 4 : infe - 2])[0]
+    overlay = struct.pack(">BB4H2H4h", 0, 0, 0, 0, 0, 0xFFFF, 128, 64, 0, 0, 32, 0)
+    overlay_offset = len(data) + 8
+    data += struct.pack(">I4s", 8 + len(overlay), b"free") + overlay
+    iloc = data.index(b"iloc") + 4
+    assert data[iloc] == 1 and data[iloc + 4 : iloc + 6] == b"\x44\x40"  # version 1 with 32-bit offsets
+    p = iloc + 8
+    for _ in range(struct.unpack(">H", data[iloc + 6 : iloc + 8])[0]):
+        item_id, extents = struct.unpack(">H8xH", data[p : p + 12])
+        if item_id == overlay_id:
+            data[p + 2 : p + 4] = b"\x00\x00"  # construction method: file offset
+            data[p + 12 : p + 20] = struct.pack(">2I", overlay_offset, len(overlay))
+        p += 12 + 8 * extents
+    heif_file = pillow_heif.open_heif(bytes(data))
+    assert heif_file[0]._c_image.grid_layout is None  # noqa
+    full_image = heif_file[0].to_pillow()
+    assert full_image.getpixel((127, 0)) == (0, 0, 0)
+    box = (20, 10, 120, 50)
+    region = pillow_heif.open_heif(bytes(data))[0].decode_region(box)
+    helpers.assert_image_equal(region.to_pillow(), full_image.crop(box))
+    assert [i[0] for i in pillow_heif.open_heif(bytes(data))[0].iter_tiles()] == [(0, 0)]
+
+
+@pytest.mark.parametrize("img_path", ("images/heif_other/pug.heic", "images/heif/RGBA_10__29x100.heif"))
+def test_heif_iter_tiles(img_path):
+    heif_file = pillow_heif.open_heif(img_path)
+    full_image = pillow_heif.open_heif(img_path)[0].to_pillow()
+    tiles = []
+    for (left, top), tile in heif_file[0].iter_tiles():
+        tiles.append((left, top, *tile.size))
+        helpers.assert_image_equal(
+            tile.to_pillow(), full_image.crop((left, top, left + tile.size[0], top + tile.size[1]))
+        )
+    assert not heif_file[0]._data
+    if img_path.endswith("pug.heic"):
+        assert len(tiles) == 48
+        assert tiles[0] == (0, 0, 512, 512)
+        assert tiles[-1] == (3584, 2560, 448, 464)
+    else:
+        assert tiles == [(0, 0, 29, 100)]
+
+
+def test_heif_iter_tiles_from_bytes():
+    heif_file = pillow_heif.from_pillow(helpers.gradient_rgb())
+    assert [i[0] for i in heif_file[0].iter_tiles()] == [(0, 0)]
+
+
+@pytest.mark.parametrize("workers", (None, 1, 3))
+def test_decode_many(workers):
+    sources = [
+        "images/heif/zPug_3.heic",
+        Path("images/heif/L_10__29x100.heif"),
+        Path("images/heif_other/pug.heic").read_bytes(),
+        "images/heif/RGBA_8__29x100.heif",
+    ] * 2
+    images = list(pillow_heif.decode_many(sources, workers=workers, convert_hdr_to_8bit=False))
+    assert len(images) == len(sources)
+    for image, fp in zip(images, sources):
+        assert image._data
+        heif_file = pillow_heif.open_heif(fp, convert_hdr_to_8bit=False)
+        helpers.assert_image_equal(image.to_pillow(), heif_file[heif_file.primary_index].to_pillow())
+
+
+def test_decode_many_unordered():
+    sources = ["images/heif_other/pug.heic", "images/heif/zPug_3.heic", "images/heif/RGB_8__29x100.heif"]
+    sizes = sorted(i.size for i in pillow_heif.decode_many(sources * 3, workers=2, ordered=False))
+    assert sizes == sorted([(4032, 3024), (64, 64), (29, 100)] * 3)
+
+
+def test_decode_many_errors():
+    with pytest.raises(ValueError):
+        list(pillow_heif.decode_many(["images/heif/zPug_3.heic"], workers=-1))
+    images = pillow_heif.decode_many(["images/heif/zPug_3.heic", b"invalid", "images/heif/zPug_3.heic"], workers=1)
+    assert next(images).size == (64, 64)
+    with pytest.raises(ValueError):
+        next(images)
+
+
+@pytest.mark.parametrize(
+    "img_path", ("images/heif/RGBA_10__29x100.heif", "images/heif/L_12__29x100.heif", "images/heif_other/pug.heic")
+)
+@pytest.mark.parametrize("kwargs", ({}, {"convert_hdr_to_8bit": False, "bgr_mode": True}, {"remove_stride": False}))
+def test_heif_decode_into(img_path, kwargs):
+    image = pillow_heif.open_heif(img_path, **kwargs)[0]
+    expected = pillow_heif.open_heif(img_path, **{**kwargs, "remove_stride": True})[0]
+    row_size = expected.stride
+    buffer = bytearray(row_size * expected.size[1])
+    image.decode_into(buffer)
+    assert not image._data
+    assert buffer == expected.data
+    stride = row_size + 8
+    buffer = bytearray(stride * expected.size[1])
+    image.decode_into(buffer, stride)
+    for i in range(expected.size[1]):
+        assert buffer[i * stride : i * stride + row_size] == expected.data[i * row_size : (i + 1) * row_size]
+    image.load()
+    buffer_decoded = bytearray(stride * expected.size[1])
+    image.decode_into(buffer_decoded, stride)
+    assert buffer_decoded == buffer
+
+
+def test_heif_decode_into_draft_region():
+    heif_file = pillow_heif.open_heif("images/heif_other/pug.heic")
+    region = heif_file[0].decode_region((100, 200, 300, 250))
+    buffer = bytearray(200 * 50 * 3)
+    image = pillow_heif.HeifImage(heif_file[0]._c_image.clone())
+    image._c_image.region = (100, 200, 300, 250)
+    image.decode_into(buffer)
+    assert buffer == region.data
+    image = pillow_heif.open_heif("images/heif_other/pug.heic")[0]
+    image.draft("RGB", (1000, 700))
+    buffer = bytearray(image.size[0] * image.size[1] * 3)
+    image.decode_into(buffer)
+    assert buffer == image.data
+
+
+def test_heif_decode_into_from_bytes():
+    heif_file = pillow_heif.from_pillow(helpers.gradient_rgba())
+    buffer = bytearray(256 * 256 * 4 + 10)
+    heif_file[0].decode_into(buffer)
+    assert buffer[: 256 * 256 * 4] == helpers.gradient_rgba().tobytes()
+    buffer = bytearray(300 * 4 * 256)
+    heif_file[0].decode_into(buffer, 300 * 4)
+    assert buffer[300 * 4 : 300 * 4 + 256 * 4] == helpers.gradient_rgba().tobytes()[256 * 4 : 512 * 4]
+
+
+def test_heif_decode_into_invalid():
+    for image in (
+        pillow_heif.open_heif("images/heif/zPug_3.heic")[0],
+        pillow_heif.from_pillow(helpers.gradient_rgb())[0],
+    ):
+        with pytest.raises(ValueError):
+            image.decode_into(bytearray(10))
+        with pytest.raises(ValueError):
+            image.decode_into(bytearray(image.size[0] * image.size[1] * 3), image.size[0])
+        with pytest.raises(TypeError):
+            image.decode_into(bytes(image.size[0] * image.size[1] * 3))
+    image = pillow_heif.open_heif("images/heif/L_10__29x100.heif", convert_hdr_to_8bit=False)[0]
+    with pytest.raises(ValueError):
+        image.decode_into(bytearray(100 * 100), 59)
+
+
+@pytest.mark.skipif(helpers.np is None, reason="NumPy not installed")
+def test_heif_decode_into_numpy():
+    sources = ("images/heif/RGB_8__128x128.heif", "images/heif/RGB_8__128x128.avif")
+    batch = helpers.np.zeros((len(sources), 128, 128, 3), dtype=helpers.np.uint8)
+    for i, fp in enumerate(sources):
+        pillow_heif.open_heif(fp)[0].decode_into(batch[i])
+    for i, fp in enumerate(sources):
+        assert (batch[i] == helpers.np.asarray(pillow_heif.open_heif(fp)[0])).all()
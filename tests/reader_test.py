@@ -0,0 +1,137 @@
+import builtins
+import os
+from pathlib import Path
+
+import helpers
+import pytest
+from PIL import Image, ImageSequence
+
+import pillow_heif
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+pillow_heif.register_heif_opener()
+
+
+class ObjectStorage:
+    """Local file-backed stand-in for an object storage that supports range requests."""
+
+    def __init__(self, path):
+        self.data = Path(path).read_bytes()
+        self.requests = []
+
+    def __call__(self, offset, size):
+        self.requests.append((offset, size))
+        return self.data[offset : offset + size]
+
+
+@pytest.mark.parametrize("block_size", (1, 7, 4096, 65536))
+def test_range_reader_read(block_size):
+    storage = ObjectStorage("images/heif/zPug_3.heic")
+    reader = pillow_heif.RangeReader(storage, block_size=block_size)
+    assert reader.size is None
+    for offset, size in ((0, 12), (5, 1), (20000, 5000), (0, 30000), (22070, 100), (30000, 5)):
+        assert reader.read_at(offset, size) == storage.data[offset : offset + size]
+    assert reader.size == len(storage.data)
+    assert reader.requests == len(storage.requests)
+    assert reader.bytes_fetched == len(storage.data)
+    assert reader.fetched_ranges == [(0, len(storage.data))]
+    reader.seek(-10, os.SEEK_END)
+    assert reader.read() == storage.data[-10:]
+    assert reader.tell() == len(storage.data)
+
+
+def test_range_reader_merge_requests():
+    storage = ObjectStorage("images/heif_other/pug.heic")
+    reader = pillow_heif.RangeReader(storage, size=len(storage.data), block_size=1024)
+    reader.read_at(0, 100)
+    reader.read_at(100, 100)
+    reader.read_at(5000, 10)
+    assert storage.requests == [(0, 1024), (4096, 1024)]
+    reader.read_at(0, 6000)
+    assert storage.requests[2:] == [(1024, 3072), (5120, 1024)]
+    assert reader.fetched_ranges == [(0, 6144)]
+
+
+def test_range_reader_invalid():
+    with pytest.raises(TypeError):
+        pillow_heif.RangeReader(b"some bytes")
+    with pytest.raises(ValueError):
+        pillow_heif.RangeReader(ObjectStorage("images/heif/zPug_3.heic"), block_size=0)
+    reader = pillow_heif.RangeReader(ObjectStorage("images/heif/zPug_3.heic"))
+    with pytest.raises(OSError):
+        reader.seek(0, os.SEEK_END)
+
+
+@pytest.mark.parametrize("img_path", ("images/heif/zPug_3.heic", "images/heif_other/nokia/bird_burst.heic"))
+def test_heif_range_reader(img_path):
+    storage = ObjectStorage(img_path)
+    reader = pillow_heif.RangeReader(storage, size=len(storage.data), block_size=4096)
+    heif_file = pillow_heif.open_heif(reader)
+    heif_file_bytes = pillow_heif.open_heif(storage.data)
+    assert heif_file.mimetype == heif_file_bytes.mimetype
+    assert reader.bytes_fetched <= len(storage.data)
+    for im1, im2 in zip(heif_file, heif_file_bytes):
+        helpers.compare_heif_files_fields(im1, im2)
+    assert reader.requests == len(storage.requests)
+
+
+def test_heif_range_reader_partial():
+    storage = ObjectStorage("images/heif_other/nokia/bird_burst.heic")
+    heif_file = pillow_heif.open_heif(storage)
+    assert len(heif_file) == 4
+    assert heif_file.size == (1280, 720)
+    assert sum(i[1] for i in storage.requests) < len(storage.data)
+
+
+def test_pillow_range_reader():
+    img_path = "images/heif/zPug_3.heic"
+    with builtins.open(img_path, "rb") as fh:
+        reader = pillow_heif.RangeReader(fh)
+        assert reader.size == Path(img_path).stat().st_size
+        im = Image.open(reader)
+        assert im.n_frames == 3
+        for frame, frame_original in zip(ImageSequence.Iterator(im), ImageSequence.Iterator(Image.open(img_path))):
+            helpers.assert_image_equal(frame, frame_original)
+        assert not fh.closed
+
+
+@pytest.mark.parametrize("img_path", ("images/heif/zPug_3.heic", "images/heif/L_10__29x100.heif"))
+def test_heif_buffer_inputs(img_path):
+    data = Path(img_path).read_bytes()
+    heif_file_bytes = pillow_heif.open_heif(data)
+    inputs = [bytearray(data), memoryview(data), memoryview(bytearray(data))[:]]
+    if helpers.np is not None:
+        inputs.append(helpers.np.frombuffer(data, dtype=helpers.np.uint8))
+    for fp in inputs:
+        heif_file = pillow_heif.open_heif(fp)
+        assert heif_file.mimetype == heif_file_bytes.mimetype
+        for im1, im2 in zip(heif_file, heif_file_bytes):
+            helpers.compare_heif_files_fields(im1, im2)
+
+
+def test_heif_bytearray_locked():
+    data = bytearray(Path("images/heif/zPug_3.heic").read_bytes())
+    heif_file = pillow_heif.open_heif(data)
+    with pytest.raises(BufferError):
+        data.extend(b"0")
+    assert len(heif_file[1].data)
+    heif_file = None  # noqa
+    data.extend(b"0")
+
+
+def test_heif_noncontiguous_input():
+    data = Path("images/heif/zPug_3.heic").read_bytes()
+    buffer = bytearray(len(data) * 2)
+    buffer[::2] = data
+    heif_file = pillow_heif.open_heif(memoryview(buffer)[::2])
+    assert len(heif_file) == 3
+    assert len(heif_file[0].data)
+
+
+def test_heif_mmap():
+    img_path = Path("images/heif/zPug_3.heic")
+    heif_file = pillow_heif.open_heif(img_path, mmap=True)
+    heif_file_bytes = pillow_heif.open_heif(img_path)
+    assert len(heif_file) == 3
+    for im1, im2 in zip(heif_file, heif_file_bytes):
+        helpers.compare_heif_files_fields(im1, im2)
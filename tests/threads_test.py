@@ -0,0 +1,116 @@
+import os
+import sys
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import helpers
+import pytest
+from PIL import Image
+
+import pillow_heif
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+pillow_heif.register_heif_opener()
+
+N_THREADS = 8
+
+try:
+    import _interpreters as subinterpreters
+except ImportError:
+    try:
+        import _xxsubinterpreters as subinterpreters
+    except ImportError:
+        subinterpreters = None
+
+
+def test_gil_not_used():
+    if not getattr(sys, "_is_gil_enabled", lambda: True)():
+        # importing of the extension must not enable the GIL in free-threaded builds
+        assert pillow_heif.libheif_version()
+        assert not sys._is_gil_enabled()
+
+
+def test_objects_not_instantiable():
+    heif_file = pillow_heif.open_heif("images/heif/zPug_3.heic")
+    for obj in (heif_file._ctx_file, heif_file[0]._c_image):
+        with pytest.raises(TypeError):
+            type(obj)()
+    assert type(heif_file[0]._c_image).__module__ == "_pillow_heif"
+
+
+@pytest.mark.skipif(subinterpreters is None, reason="Requires sub-interpreters support.")
+def test_sub_interpreters():
+    script = textwrap.dedent(
+        """
+        import _pillow_heif
+
+        with open("images/heif/zPug_3.heic", "rb") as f:
+            ctx_file = _pillow_heif.load_file(f.read(), 1, 1, 0, 1, 0, 1, "")
+        for item_id in ctx_file.item_ids:
+            c_image = ctx_file.get_image(item_id)
+            assert len(bytes(c_image.data)) == c_image.stride * c_image.size_mode[0][1]
+        """
+    )
+    interpreters = [subinterpreters.create() for _ in range(2)]
+    try:
+        for interp in interpreters:
+            assert not subinterpreters.run_string(interp, script)
+    finally:
+        for interp in interpreters:
+            subinterpreters.destroy(interp)
+    assert len(pillow_heif.open_heif("images/heif/zPug_3.heic")[0].data)
+
+
+def test_threads_decode_same_images():
+    heif_file = pillow_heif.open_heif("images/heif/zPug_3.heic")
+    expected = [bytes(i.data) for i in pillow_heif.open_heif("images/heif/zPug_3.heic")]
+
+    def decode(i):
+        image = heif_file[i % len(heif_file)]
+        if i % 4 == 0:
+            buffer = bytearray(len(expected[i % len(heif_file)]))
+            image.decode_into(buffer)
+            data = bytes(buffer)
+        elif i % 4 == 1:
+            data = image.to_pillow().tobytes()
+        else:
+            data = bytes(image.data)
+        if i % 3 == 0:
+            image.unload()
+        return i % len(heif_file), data
+
+    with ThreadPoolExecutor(max_workers=N_THREADS) as executor:
+        for index, data in executor.map(decode, range(N_THREADS * 6)):
+            assert data == expected[index]
+
+
+@pytest.mark.skipif(not helpers.hevc_enc(), reason="Requires HEVC encoder.")
+def test_threads_open_encode():
+    im = helpers.gradient_rgb()
+
+    def open_encode(i):
+        out = BytesIO()
+        if i % 2:
+            pillow_heif.from_pillow(im).save(out, quality=-1, chroma=444)
+        else:
+            Image.open("images/heif/zPug_3.heic").save(out, format="HEIF", save_all=True, quality=30)
+        return i, pillow_heif.open_heif(out)
+
+    with ThreadPoolExecutor(max_workers=N_THREADS) as executor:
+        for i, heif_file in executor.map(open_encode, range(N_THREADS * 2)):
+            assert len(heif_file) == (1 if i % 2 else 3)
+            assert heif_file[0].data
+            if i % 2:
+                helpers.assert_image_similar(heif_file.to_pillow(), im, 3)
+
+
+@pytest.mark.skipif(not helpers.hevc_enc(), reason="Requires HEVC encoder.")
+def test_threads_stress():
+    with pillow_heif.HeifExecutor(workers=N_THREADS) as executor:
+        futures = [executor.open_heif("images/heif/zPug_3.heic") for _ in range(N_THREADS * 2)]
+        heif_files = [i.result() for i in futures]
+        for future in [executor.load(i) for i in heif_files]:
+            future.result()
+        for future in [executor.save(i, BytesIO(), quality=10) for i in heif_files]:
+            future.result()
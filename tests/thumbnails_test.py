@@ -1,11 +1,14 @@
+import struct
 from io import BytesIO
 from pathlib import Path
+from unittest import mock
 
 import pytest
-from helpers import hevc_enc
+from helpers import assert_image_similar, create_heif, hevc_enc
 from PIL import Image, ImageSequence
 
 import pillow_heif
+from pillow_heif.misc import _THREADS_BUDGET
 
 pillow_heif.register_heif_opener()
 
@@ -27,6 +30,100 @@ def test_pillow_thumbnails_present():
             assert len(img.info["thumbnails"]) == 0
 
 
+def test_heif_thumbnail_images():
+    heif_file = pillow_heif.open_heif(Path("images/heif/zPug_3.heic"))
+    assert [i.size for i in heif_file[0].thumbnails] == [(32, 32), (16, 16)]
+    assert [i.size for i in heif_file[1].thumbnails] == [(32, 32)]
+    assert not heif_file[2].thumbnails
+    thumbnail = heif_file[0].thumbnails[0]
+    assert isinstance(thumbnail, pillow_heif.HeifThumbnailImage)
+    assert str(thumbnail) == "<HeifThumbnailImage 32x32 RGB>"
+    assert not thumbnail._data
+    assert thumbnail.mode == "RGB"
+    assert thumbnail.info["bit_depth"] == 8
+    assert len(thumbnail.data) == 32 * 32 * 3
+    assert not heif_file[0]._data
+    assert thumbnail.to_pillow().size == (32, 32)
+
+
+def test_heif_get_thumbnail():
+    heif_file = pillow_heif.open_heif(Path("images/heif/zPug_3.heic"))
+    assert heif_file[0].get_thumbnail(10) is heif_file[0].thumbnails[1]
+    assert heif_file[0].get_thumbnail(16) is heif_file[0].thumbnails[1]
+    assert heif_file[0].get_thumbnail((17, 16)) is heif_file[0].thumbnails[0]
+    assert heif_file[0].get_thumbnail(32) is heif_file[0].thumbnails[0]
+    # no thumbnail big enough, fallback to the reduced decoding of the image
+    image = heif_file[0].get_thumbnail(33)
+    assert isinstance(image, pillow_heif.HeifImage)
+    assert image is not heif_file[0]
+    assert image.size == (64, 64)
+    image = heif_file[0].get_thumbnail(20)
+    assert image is heif_file[0].thumbnails[0]
+    image = heif_file[2].get_thumbnail(40)
+    assert image.size == (48, 32)
+    assert len(image.data) == 48 * 32 * 3
+    assert not heif_file[2]._data
+    assert heif_file[2].size == (96, 64)
+
+
+def test_heif_get_thumbnail_file_options():
+    heif_file = pillow_heif.open_heif(Path("images/heif/zPug_3.heic"), decode_threads=2, max_decoded_images=1)
+    image = heif_file[2].get_thumbnail(40)
+    assert image._ctx_file is heif_file._ctx_file
+    assert image._decoded_images is heif_file._decoded_images
+    with mock.patch.object(_THREADS_BUDGET, "acquire", wraps=_THREADS_BUDGET.acquire) as acquire:
+        image.load()
+    assert [i.args for i in acquire.call_args_list] == [(2,)]
+    heif_file[1].load()
+    assert not image._data
+
+
+def test_pillow_draft_thumbnail():
+    im = Image.open(Path("images/heif/zPug_3.heic"))
+    assert im.draft(None, (20, 20)) == ("L", (0, 0, 32.0, 32.0))  # primary image is `L`, thumbnail is `RGB`
+    im = Image.open(Path("images/heif/zPug_3.heic"))
+    im.seek(0)
+    assert im.draft(None, (20, 20)) == ("RGB", (0, 0, 32, 32))
+    assert im.size == (32, 32)
+    im.load()
+    assert_image_similar(im, pillow_heif.open_heif(Path("images/heif/zPug_3.heic"))[0].thumbnails[0].to_pillow())
+    im = Image.open(Path("images/heif/zPug_3.heic"))
+    im.seek(0)
+    im.thumbnail((8, 8))
+    assert im.size == (8, 8)
+
+
+@pytest.mark.skipif(not hevc_enc(), reason="Requires HEVC encoder.")
+def test_thumbnail_padded():
+    # thumbnail with the size in header smaller than its coded size, as padded thumbnails of some cameras
+    heif_buf = create_heif((1000, 665), [101]).getvalue()
+    ispe = struct.pack(">4s4xII", b"ispe", 100, 66)
+    assert heif_buf.count(ispe) == 1
+    heif_buf = heif_buf.replace(ispe, struct.pack(">4s4xII", b"ispe", 96, 64))
+    thumbnail = pillow_heif.open_heif(heif_buf)[0].thumbnails[0]
+    assert thumbnail.size == (96, 64)
+    assert thumbnail.to_pillow().size == thumbnail.size
+    thumbnail.load()
+    assert thumbnail.size == (96, 64)
+    assert len(thumbnail.data) == 96 * 64 * len(thumbnail.mode)
+    im = Image.open(BytesIO(heif_buf))
+    im.draft("RGB", (90, 60))
+    im.load()
+    assert im.size == (96, 64)
+    assert len(im.tobytes()) == 96 * 64 * len(im.getbands())
+
+
+def test_pillow_draft_thumbnail_disabled():
+    try:
+        pillow_heif.options.THUMBNAILS = False
+        im = Image.open(Path("images/heif/zPug_3.heic"))
+        im.seek(0)
+        assert im.draft(None, (20, 20)) == ("RGB", (0, 0, 32.0, 32.0))
+        assert not pillow_heif.open_heif(Path("images/heif/zPug_3.heic"))[0].thumbnails
+    finally:
+        pillow_heif.options.THUMBNAILS = True
+
+
 def test_heif_to_pillow_thumbnails():
     heif_file = pillow_heif.open_heif(Path("images/heif/zPug_3.heic"))
     assert heif_file[0].to_pillow().info["thumbnails"] == [32, 16]
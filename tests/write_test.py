@@ -1,5 +1,6 @@
 import builtins
 import os
+import tracemalloc
 from gc import collect
 from io import SEEK_END, BytesIO
 from pathlib import Path
@@ -79,6 +80,64 @@ def test_outputs():
         heif_file.save(bytes(b"1234567890"), quality=10)
 
 
+def test_save_to_bytes():
+    heif_file = pillow_heif.open_heif(helpers.create_heif((64, 64), n_images=2))
+    data = heif_file.save(None, quality=10)
+    assert isinstance(data, bytes)
+    helpers.compare_heif_files_fields(heif_file, pillow_heif.open_heif(data))
+    data = heif_file.save(None, quality=10, as_memoryview=True)
+    assert isinstance(data, memoryview)
+    assert data.readonly
+    helpers.compare_heif_files_fields(heif_file, pillow_heif.open_heif(data))
+    data = pillow_heif.encode("RGB", (64, 64), bytes(64 * 64 * 3), None)
+    assert isinstance(data, bytes)
+    assert pillow_heif.open_heif(data).size == (64, 64)
+    assert heif_file.save(BytesIO()) is None
+
+
+@mock.patch("pillow_heif.misc._WRITE_CHUNK_SIZE", 100)
+def test_save_chunked_write():
+    class Writer:
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, chunk):
+            assert isinstance(chunk, bytes)
+            self.chunks.append(chunk)  # keeping the chunks is allowed for arbitrary writers
+
+    heif_file = pillow_heif.open_heif(helpers.create_heif((64, 64), n_images=2))
+    writer = Writer()
+    heif_file.save(writer, quality=10)
+    assert len(writer.chunks) > 1
+    assert max(len(i) for i in writer.chunks) == 100
+    helpers.compare_heif_files_fields(heif_file, pillow_heif.open_heif(b"".join(writer.chunks)))
+    out = BytesIO()
+    heif_file.save(out, quality=10)
+    assert out.getvalue() == b"".join(writer.chunks)
+
+    class FailingWriter:
+        def write(self, chunk):
+            raise OSError("disk is full")
+
+    with pytest.raises(OSError, match="disk is full"):
+        heif_file.save(FailingWriter(), quality=10)
+
+
+def test_save_to_path_failed(tmp_path):
+    out_path = tmp_path / "out.heic"
+    out_path.write_bytes(b"previous data")
+    heif_file = pillow_heif.open_heif(helpers.create_heif((64, 64)))
+    ctx_write = mock.MagicMock()
+    ctx_write.finalize.side_effect = RuntimeError("encoding failed")
+    with mock.patch.object(pillow_heif.misc._ENCODER_POOL, "get", return_value=ctx_write), pytest.raises(
+        RuntimeError, match="encoding failed"
+    ):
+        heif_file.save(out_path, quality=10)
+    assert out_path.read_bytes() == b"previous data"
+    heif_file.save(out_path, quality=10)
+    helpers.compare_heif_files_fields(heif_file, pillow_heif.open_heif(out_path))
+
+
 def test_heif_save_one_all():
     im = pillow_heif.open_heif(helpers.create_heif((61, 64), n_images=2))
     out_heif = BytesIO()
@@ -101,7 +160,7 @@ def test_heif_no_encoder():
     def get_lib_info():
         return {"libheif": "1.17.5", "HEIF": "", "AVIF": "", "encoders": {}, "decoders": {}}
 
-    with mock.patch("pillow_heif.heif._pillow_heif.get_lib_info", side_effect=get_lib_info):
+    with mock.patch("pillow_heif.heif._get_lib_info", side_effect=get_lib_info):
         im_heif = pillow_heif.from_pillow(Image.new("L", (64, 64)))
         out_buffer = BytesIO()
         with pytest.raises(RuntimeError):
@@ -421,6 +480,55 @@ def test_heif_save_multi_frame():
         assert heif_file[i].info["primary"] == out_heif_file[i].info["primary"]
 
 
+def test_heif_save_releases_frames():
+    heif_file = pillow_heif.open_heif(helpers.create_heif((64, 64), n_images=3))
+    heif_file[1].load()
+    out_buf = BytesIO()
+    heif_file.save(out_buf, quality=10)
+    # images are decoded one by one and the ones that were not decoded before are released after encoding
+    assert [bool(i._data) for i in heif_file] == [False, True, False]
+    helpers.compare_heif_files_fields(heif_file, pillow_heif.open_heif(out_buf))
+
+
+@pytest.mark.parametrize("primary_index", (None, 0, -1, 99))
+def test_heif_save_append_generator(primary_index):
+    heif_file = pillow_heif.open_heif(helpers.create_heif((64, 64), n_images=2))
+    frames = pillow_heif.open_heif(helpers.create_heif((64, 64), n_images=3))
+    out_buf = BytesIO()
+    heif_file.save(out_buf, quality=10, append_images=(i for i in frames), primary_index=primary_index)
+    out_heif = pillow_heif.open_heif(out_buf)
+    assert len(out_heif) == 5
+    # frames of generators are not inspected ahead, without `primary_index` they are never primary
+    assert out_heif.primary_index == {None: 0, 0: 0, -1: 4, 99: 4}[primary_index]
+
+
+@pytest.mark.parametrize("primary_index", (None, -1))
+def test_heif_save_append_generator_overrides(primary_index):
+    heif_file = pillow_heif.open_heif(helpers.create_heif((64, 64), n_images=2))
+    frames = pillow_heif.open_heif(helpers.create_heif((64, 64), n_images=2))
+    assert frames[0].info["primary"]
+    out_buf = BytesIO()
+    heif_file.save(out_buf, quality=10, append_images=(i for i in frames), primary_index=primary_index, xmp=b"xmp")
+    out_heif = pillow_heif.open_heif(out_buf)
+    # overrides from the arguments are applied only to the primary image
+    assert [bool(i.info["primary"]) for i in out_heif] == [i == out_heif.primary_index for i in range(4)]
+    assert [i.info.get("xmp") for i in out_heif] == [b"xmp" if i.info["primary"] else None for i in out_heif]
+
+
+@pytest.mark.parametrize("primary_index", (None, 1, -1))
+def test_pillow_save_append_generator(primary_index):
+    im = Image.open(helpers.create_heif((64, 64), n_images=2))
+    frames = [helpers.gradient_rgb().resize((64, 64)) for _ in range(3)]
+    out_buf = BytesIO()
+    im.save(out_buf, format="HEIF", save_all=True, append_images=iter(frames), primary_index=primary_index)
+    out_heif = pillow_heif.open_heif(out_buf)
+    assert len(out_heif) == 5
+    assert out_heif.primary_index == {None: 0, 1: 1, -1: 4}[primary_index]
+    im.seek(1)
+    im.save(out_buf, format="HEIF", save_all=True, append_images=iter(frames[:1]))
+    assert im.tell() == 1
+
+
 def test_pillow_save_multi_frame():
     im = Image.open(Path("images/heif_other/nokia/alpha.heic"))
     heif_buf = BytesIO()
@@ -657,3 +765,98 @@ def test_rav1e_encoder():
     rav1e_image_data = Image.open(buf_rav1e).tobytes()
     # print(f"AOM size: {len(aom_img_data)} , RAV1E size: {len(rav1e_image_data)}", )
     assert aom_img_data != rav1e_image_data  # Suppose that: different decoders by default will have different results
+
+
+@pytest.mark.parametrize("tile_size", (64, (100, 96), 512))
+@pytest.mark.parametrize("mode", ("RGB", "RGBA"))
+def test_heif_save_tiled(tile_size, mode):
+    im = helpers.gradient_rgba().convert(mode).crop((0, 0, 250, 200))
+    buf = BytesIO()
+    im.save(buf, format="HEIF", quality=-1, chroma=444)
+    buf_tiled = BytesIO()
+    pillow_heif.from_pillow(im).save(buf_tiled, quality=-1, chroma=444, tile_size=tile_size)
+    heif_file = pillow_heif.open_heif(buf_tiled)
+    assert heif_file.size == (250, 200)
+    assert heif_file.mode == mode
+    helpers.assert_image_equal(Image.open(buf), heif_file.to_pillow())
+
+
+@pytest.mark.parametrize("orientation", range(1, 9))
+@pytest.mark.parametrize("size", ((256, 192), (250, 200)))
+def test_pillow_save_tiled_orientation(orientation, size):
+    im = helpers.gradient_rgb().crop((0, 0, *size))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buf = BytesIO()
+    im.save(buf, format="HEIF", quality=-1, chroma=444, exif=exif)
+    buf_tiled = BytesIO()
+    im.save(buf_tiled, format="HEIF", quality=-1, chroma=444, exif=exif, tile_size=64)
+    helpers.assert_image_equal(Image.open(buf), Image.open(buf_tiled))
+
+
+def test_heif_save_tiled_color_profile():
+    im = Image.open(Path("images/heif_other/pug.heic"))
+    buf = BytesIO()
+    im.save(buf, format="HEIF", quality=50, tile_size=1024)
+    heif_file = pillow_heif.open_heif(buf)
+    assert heif_file.info["icc_profile"] == im.info["icc_profile"]
+    assert heif_file[0].decode_region((1000, 1000, 1100, 1050)).size == (100, 50)
+    assert list(heif_file[0].iter_tiles())[5][0] == (1024, 1024)
+
+
+def test_encode_tiles():
+    im = helpers.gradient_rgb().crop((0, 0, 250, 200))
+    buf = BytesIO()
+    pillow_heif.encode(im.mode, im.size, im.tobytes(), buf, quality=-1, chroma=444)
+
+    def tiles(full_size: bool):
+        for top in range(0, im.size[1], 64):
+            for left in range(0, im.size[0], 64):
+                box = (left, top, left + 64, top + 64)
+                if not full_size:
+                    box = (left, top, min(left + 64, im.size[0]), min(top + 64, im.size[1]))
+                yield im.crop(box).tobytes()
+
+    for full_size in (False, True):
+        buf_tiled = BytesIO()
+        pillow_heif.encode_tiles(im.mode, im.size, tiles(full_size), buf_tiled, 64, quality=-1, chroma=444)
+        helpers.assert_image_equal(Image.open(buf), Image.open(buf_tiled))
+
+
+def test_encode_tiles_memory():
+    size, tile_size = (512, 512), 64
+
+    def tiles():
+        for i in range((size[0] // tile_size) * (size[1] // tile_size)):
+            yield bytes([i]) * (tile_size * tile_size * 3)
+
+    tracemalloc.start()
+    try:
+        pillow_heif.encode_tiles("RGB", size, tiles(), BytesIO(), tile_size, quality=10)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # tiles from the generator are copied to the encoder one by one, there is never a buffer for the whole image
+    assert peak < size[0] * size[1] * 3 // 4
+
+
+def test_encode_tiles_invalid():
+    tile = bytes(64 * 64 * 3)
+    with pytest.raises(ValueError):
+        pillow_heif.encode_tiles("RGB", (128, 128), [tile] * 3, BytesIO(), 64)
+    with pytest.raises(ValueError):
+        pillow_heif.encode_tiles("RGB", (128, 128), [tile] * 5, BytesIO(), 64)
+    with pytest.raises(ValueError):
+        pillow_heif.encode_tiles("RGB", (128, 128), [tile] * 3 + [b"123"], BytesIO(), 64)
+    with pytest.raises(ValueError):
+        pillow_heif.encode_tiles("RGB", (128, 128), [tile] * 4, BytesIO(), (64, 0))
+    with pytest.raises(ValueError):
+        pillow_heif.encode_tiles("L", (128, 128), [bytes(64 * 64)] * 4, BytesIO(), 64)
+
+
+def test_heif_save_tiled_monochrome():
+    im = helpers.gradient_rgb().convert("L")
+    buf = BytesIO()
+    im.save(buf, format="HEIF", quality=-1, tile_size=64)
+    assert pillow_heif.open_heif(buf)[0]._c_image.grid_layout is None  # noqa
+    helpers.assert_image_similar(im, Image.open(buf), 1)